@@ -0,0 +1,432 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import zlib
+
+from ladderCodecs import CODECS
+from ladderModels import adopt, to_json
+from ladderStore import MUTATIONS, SEQUENCED, load_data, save_data
+
+
+# File names of each collection inside a data directory
+DATA_FILE_NAMES = {
+    'players': 'players.json',
+    'teams': 'teams.json',
+    'team_comps': 'team_compositions.json',
+    'applications': 'applications.json',
+    'invitations': 'invitations.json',
+    'sequences': 'sequences.json',
+}
+
+def data_files(data_dir):
+    return {name: os.path.join(data_dir, file_name) for name, file_name in DATA_FILE_NAMES.items()}
+
+
+## JOURNAL
+# Append-only log of mutations, one JSON object per line. Every change is appended
+# here before it is applied. When a flush starts, the entries so far are moved
+# aside to <journal>.prev and new ones go to a fresh file; .prev is deleted once the
+# snapshot of the data files that covers it has been written. On startup the last
+# snapshot is loaded and both files are replayed on top of it, .prev first.
+
+class Journal:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.previous_path = f'{file_path}.prev'
+        self._file = None
+
+    def append(self, op, args):
+        if self._file is None:
+            self._file = open(self.file_path, 'a')
+        self._file.write(json.dumps({'op': op, 'args': args}) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def entries(self):
+        for file_path in (self.previous_path, self.file_path):
+            if not os.path.exists(file_path):
+                continue
+            with open(file_path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append; everything before it is good
+                        print(f'Skipping unreadable journal entry: {line[:80]}')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def rotate(self):
+        self.close()
+        if not os.path.exists(self.file_path):
+            return
+        if os.path.exists(self.previous_path):
+            # The last flush failed and kept its entries; these go after them
+            with open(self.file_path, 'rb') as f, open(self.previous_path, 'ab') as previous:
+                shutil.copyfileobj(f, previous)
+                previous.flush()
+                os.fsync(previous.fileno())
+            os.remove(self.file_path)
+        else:
+            os.replace(self.file_path, self.previous_path)
+
+    def drop_previous(self):
+        if os.path.exists(self.previous_path):
+            os.remove(self.previous_path)
+
+
+## ARCHIVE
+# Resolved applications and invitations, gzip-compressed JSON lines per collection
+# (<data dir>/archive/applications.jsonl.gz, ...). Each append is one gzip member,
+# fsynced, so the file stays readable after a crash. A record can be appended twice
+# if a crash lands between the append and the next snapshot; readers keep the last.
+
+class Archive:
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+
+    def path(self, name):
+        return os.path.join(self.archive_dir, f'{name}.jsonl.gz')
+
+    def append(self, name, records):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with open(self.path(name), 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for key, record in records:
+                    f.write((json.dumps({'key': key, 'record': record}) + '\n').encode())
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    def read(self, name):
+        records = {}
+        if os.path.exists(self.path(name)):
+            with gzip.open(self.path(name), 'rt') as f:
+                try:
+                    for line in f:
+                        entry = json.loads(line)
+                        records[entry['key']] = entry['record']
+                except (EOFError, json.JSONDecodeError):
+                    print(f'Skipping the torn end of {self.path(name)}')
+        return records
+
+
+## BACKENDS
+# A backend loads every collection at startup and persists each mutation the
+# DataStore applies:
+#   load()                -> {collection name: {key: record}}
+#   log(op, args)         -> called before the mutation is applied (write-ahead)
+#   write(db, changes)    -> called after, with the (collection, key) records it touched
+#   flush(db)             -> periodic background work
+#   flush_later(db, lock) -> the same, split: called on the loop, it returns a function
+#                            to finish the flush in a worker thread (holding lock while
+#                            it reads records), or None when there is nothing left to do
+#   archive(name, key, record) -> a resolved record leaving the resident data; it is
+#                            stored with the next write()/flush()
+#   archived(name)        -> {key: record} of everything archived so far
+#   close()               -> release open files; called after a final flush()
+
+class StorageBackend:
+    def load(self):
+        raise NotImplementedError
+
+    def log(self, op, args):
+        pass
+
+    def write(self, db, changes):
+        pass
+
+    def flush(self, db):
+        pass
+
+    def flush_later(self, db, lock):
+        self.flush(db)
+        return None
+
+    def archive(self, name, key, record):
+        raise NotImplementedError
+
+    def archived(self, name):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# JSON files on disk: mutations are appended to the journal, and changed files are
+# rewritten atomically by the background flusher, in the given codec. Resolved
+# records are appended to the archive by the same flush, before the files that no
+# longer hold them.
+class JsonBackend(StorageBackend):
+    def __init__(self, files, journal_file, archive_dir=None, codec=CODECS['pretty']):
+        self.files = dict(files)
+        self.codec = codec
+        self.journal = Journal(journal_file)
+        self.archive_store = Archive(archive_dir or os.path.join(os.path.dirname(journal_file), 'archive'))
+        self._dirty = set()
+        self._archived = {}  # name -> [(key, record)] not yet in the archive file
+        self._writing = {}   # the same, being appended by a flush in progress
+        self._failed = None  # (archived, dirty) of a flush that didn't finish, retried by the next
+        self._logged = False
+
+    def load(self):
+        db = adopt({name: load_data(file_path, self.codec) for name, file_path in self.files.items()})
+        self._dirty.clear()
+
+        replayed = 0
+        for entry in self.journal.entries():
+            try:
+                self._dirty.update(name for name, key in MUTATIONS[entry['op']](db, **entry['args']))
+                replayed += 1
+            except Exception as e:
+                print(f"Failed to replay journal entry {entry.get('op')}: {e}")
+        if replayed:
+            print(f'Replayed {replayed} journal entries')
+            self._logged = True
+            self.flush(db)
+        return db
+
+    def log(self, op, args):
+        self.journal.append(op, args)
+        self._logged = True
+
+    def write(self, db, changes):
+        self._dirty.update(name for name, key in changes)
+
+    def archive(self, name, key, record):
+        self._archived.setdefault(name, []).append((key, record))
+        self._logged = True
+
+    def archived(self, name):
+        records = self.archive_store.read(name)
+        records.update(self._writing.get(name, ()))
+        records.update(self._archived.get(name, ()))
+        return records
+
+    def flush(self, db):
+        write = self.flush_later(db, None)
+        if write is not None:
+            write()
+
+    def flush_later(self, db, lock):
+        if self._failed is not None:
+            archived, dirty = self._failed
+            for name, records in self._archived.items():
+                archived.setdefault(name, []).extend(records)
+            self._archived = archived
+            self._dirty |= dirty
+            self._failed = None
+            self._logged = True
+        if not self._logged:
+            return None
+
+        # Everything up to here is in .prev; mutations from now on go to the new journal
+        # and are replayed over the files even if the write below already has them
+        archived, self._archived = self._archived, {}
+        dirty, self._dirty = self._dirty, set()
+        self._writing = archived
+        self.journal.rotate()
+        self._logged = False
+
+        # Pending requests are copied now: a request resolved while the file is being
+        # written leaves it for the archive, and must be in one or the other
+        snapshot = {name: {key: dict(record) for key, record in db[name].items()} if name in SEQUENCED else db[name]
+                    for name in dirty}
+
+        def write():
+            try:
+                for name, records in archived.items():
+                    self.archive_store.append(name, records)
+                for name, records in snapshot.items():
+                    save_data(self.files[name], records, self.codec, lock)
+            except BaseException:
+                self._failed = (archived, dirty)
+                raise
+            self.journal.drop_previous()
+            self._writing = {}
+        return write
+
+    def close(self):
+        self.journal.close()
+
+
+# SQLite database: every mutation upserts the rows it touched in one transaction.
+# Resolved applications and invitations move to the archive table (zlib-compressed
+# JSON) in the same transaction that removes them from their own table, so those
+# tables only ever hold pending rows. The database is a write-only copy of the
+# resident data: it is read whole at startup, and after that only the archive is
+# queried. Every lookup is answered from DataStore's in-memory indexes.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS teams (
+    team_name TEXT PRIMARY KEY,
+    captain_id INTEGER,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS team_comps (
+    team_name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS applications (
+    id TEXT PRIMARY KEY,
+    player_id INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS invitations (
+    id TEXT PRIMARY KEY,
+    player_id INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archive (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+REQUEST_TABLES = ('applications', 'invitations')
+
+class SqliteBackend(StorageBackend):
+    def __init__(self, db_file):
+        self.db_file = db_file
+        # The bot opens and loads the database in its startup thread and uses it from
+        # the event loop afterwards; the lock keeps any two threads off it at once
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')  # WAL keeps this crash-safe; only the last commit can be lost on power failure
+        self.conn.executescript(SQLITE_SCHEMA)
+        self._archived = []
+
+    def is_empty(self):
+        with self.lock:
+            return all(self.conn.execute(f'SELECT COUNT(*) FROM {name}').fetchone()[0] == 0 for name in DATA_FILE_NAMES)
+
+    def load(self):
+        with self.lock:
+            return self._load()
+
+    def _load(self):
+        db = {name: {} for name in DATA_FILE_NAMES}
+        for player_id, data in self.conn.execute('SELECT id, data FROM players'):
+            db['players'][player_id] = json.loads(data)
+        for team_name, data in self.conn.execute('SELECT team_name, data FROM teams'):
+            db['teams'][team_name] = json.loads(data)
+        for team_name, data in self.conn.execute('SELECT team_name, data FROM team_comps'):
+            db['team_comps'][team_name] = json.loads(data)
+        for name in REQUEST_TABLES:
+            for record_id, data in self.conn.execute(f'SELECT id, data FROM {name}'):
+                db[name][record_id] = json.loads(data)
+        for name, value in self.conn.execute('SELECT name, value FROM sequences'):
+            db['sequences'][name] = value
+        return adopt(db)
+
+    def write(self, db, changes):
+        with self.lock, self.conn:
+            self._write_archived()
+            for name, key in changes:
+                self._write_row(name, key, db[name].get(key))
+
+    def archive(self, name, key, record):
+        self._archived.append((name, key, zlib.compress(json.dumps(record).encode())))
+
+    def archived(self, name):
+        with self.lock:
+            return {key: json.loads(zlib.decompress(data)) for key, data in
+                    self.conn.execute('SELECT id, data FROM archive WHERE collection = ?', (name,))}
+
+    def _write_archived(self):
+        if self._archived:
+            self.conn.executemany('INSERT OR REPLACE INTO archive (collection, id, data) VALUES (?, ?, ?)', self._archived)
+            self._archived = []
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def import_all(self, db):
+        with self.lock, self.conn:
+            self._write_archived()
+            for name in DATA_FILE_NAMES:
+                for key, record in db.get(name, {}).items():
+                    self._write_row(name, key, record)
+
+    def _write_row(self, name, key, record):
+        if name == 'players':
+            if record is None:
+                self.conn.execute('DELETE FROM players WHERE id = ?', (int(key),))
+            else:
+                self.conn.execute('INSERT OR REPLACE INTO players (id, data) VALUES (?, ?)', (int(key), json.dumps(record, default=to_json)))
+        elif name == 'teams':
+            if record is None:
+                self.conn.execute('DELETE FROM teams WHERE team_name = ?', (key,))
+            else:
+                self.conn.execute('INSERT OR REPLACE INTO teams (team_name, captain_id, data) VALUES (?, ?, ?)',
+                                  (key, record['captain_id'], json.dumps(record, default=to_json)))
+        elif name == 'team_comps':
+            if record is None:
+                self.conn.execute('DELETE FROM team_comps WHERE team_name = ?', (key,))
+            else:
+                self.conn.execute('INSERT OR REPLACE INTO team_comps (team_name, data) VALUES (?, ?)', (key, json.dumps(record)))
+        elif name in REQUEST_TABLES:
+            if record is None:
+                self.conn.execute(f'DELETE FROM {name} WHERE id = ?', (key,))
+            else:
+                self.conn.execute(f'INSERT OR REPLACE INTO {name} (id, player_id, team_id, status, data) VALUES (?, ?, ?, ?, ?)',
+                                  (key, int(record['player_id']), record['team_id'], record['status'], json.dumps(record)))
+        elif name == 'sequences':
+            self.conn.execute('INSERT OR REPLACE INTO sequences (name, value) VALUES (?, ?)', (key, record))
+        else:
+            raise ValueError(f'Unknown collection: {name}')
+
+
+## MIGRATION
+
+def migrate_json_to_sqlite(files, journal_file, db_file, force=False):
+    backend = SqliteBackend(db_file)
+    if not backend.is_empty() and not force:
+        raise RuntimeError(f'{db_file} already holds data; pass force to overwrite it')
+    json_backend = JsonBackend(files, journal_file)
+    db = json_backend.load()
+    for name in REQUEST_TABLES:
+        for key, record in json_backend.archived(name).items():
+            backend.archive(name, key, record)
+    backend.import_all(db)
+    return {name: len(records) for name, records in db.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ladder data storage tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help='One-shot copy of the JSON data files into an SQLite database')
+    migrate.add_argument('--data-dir', default='data/ladderReset')
+    migrate.add_argument('--db', default=None, help='defaults to <data-dir>/ladder.db')
+    migrate.add_argument('--force', action='store_true', help='overwrite rows in a database that already holds data')
+    args = parser.parse_args()
+
+    db_file = args.db or os.path.join(args.data_dir, 'ladder.db')
+    counts = migrate_json_to_sqlite(data_files(args.data_dir), os.path.join(args.data_dir, 'journal.jsonl'), db_file, args.force)
+    for name, count in counts.items():
+        print(f'{name}: {count} records')
+    print(f'Migrated to {db_file}')
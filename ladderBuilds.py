@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import re
+import time
+
+
+## BUILD CATALOG
+# builds.json compiled once into integer IDs: every class and every (class, build)
+# pair gets an ID, and every name, alias and unambiguous prefix is normalized
+# (lowercase, letters and digits only) into a lookup table, so "sorc", "Sorceress"
+# and "SORC." all resolve to the same class ID with one dict lookup. Select option
+# lists are built once per compile and shared by every select that shows them.
+# The file's mtime is checked at most once per RELOAD_CHECK_INTERVAL and the catalog
+# recompiled when it changes; subscribers are told so they can rebuild anything
+# keyed on the old IDs.
+#
+# builds.json:
+#   {"classes": {"Sorceress": ["Light", "Blizzard", ...], ...},
+#    "class_aliases": {"Sorc": "Sorceress", ...},
+#    "build_aliases": {"Necromancer": {"Poison Nova": "pNova", ...}, ...}}
+
+RELOAD_CHECK_INTERVAL = 2.0  # seconds
+MIN_PREFIX = 2
+
+
+def normalize(value):
+    return re.sub(r'[^a-z0-9]', '', str(value or '').lower())
+
+
+def _lookup_table(names, aliases):
+    # normalized name, alias or unambiguous prefix -> ID. Full names and aliases
+    # always win over prefixes; a prefix shared by two IDs resolves to neither.
+    table, prefixes = {}, {}
+    for key, item_id in list(names.items()) + list(aliases.items()):
+        for length in range(MIN_PREFIX, len(key)):
+            prefixes.setdefault(key[:length], set()).add(item_id)
+    for prefix, item_ids in prefixes.items():
+        if len(item_ids) == 1:
+            table[prefix] = next(iter(item_ids))
+    table.update(aliases)
+    table.update(names)
+    return table
+
+
+class BuildCatalog:
+    def __init__(self, file_path, make_option=None, load=True):
+        self.file_path = file_path
+        self.make_option = make_option  # (label=, description=) -> select option, e.g. discord.SelectOption
+        self.version = 0
+        self._mtime = None
+        self._checked = 0.0
+        self._listeners = []
+        self._compile({})
+        if load:  # Otherwise empty until the first reload_if_changed(force=True)
+            self.reload_if_changed(force=True)
+
+    def subscribe(self, listener):
+        # listener(catalog) after every recompile
+        self._listeners.append(listener)
+
+    def reload_if_changed(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked < RELOAD_CHECK_INTERVAL:
+            return False
+        self._checked = now
+        try:
+            mtime = os.stat(self.file_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        try:
+            data = {}
+            if mtime is not None:
+                with open(self.file_path, 'r') as f:
+                    data = json.load(f)
+            self._compile(data)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            # Keep serving the last good catalog until the file is saved again
+            self._mtime = mtime
+            print(f'Could not load {self.file_path}: {e!r}')
+            return False
+        self._mtime = mtime
+        self.version += 1
+        for listener in self._listeners:
+            listener(self)
+        return True
+
+    def _compile(self, data):
+        # Everything is built into locals first, so a bad file leaves the catalog as it was
+        classes = data.get('classes', {})
+        class_names = tuple(classes)            # class ID -> name
+        build_names, build_class = [], []       # build ID -> name, class ID
+        class_builds = []                       # class ID -> build IDs
+        for class_id, class_name in enumerate(class_names):
+            build_ids = []
+            for build in classes[class_name]:
+                build_ids.append(len(build_names))
+                build_names.append(build)
+                build_class.append(class_id)
+            class_builds.append(tuple(build_ids))
+
+        class_ids = {normalize(name): class_id for class_id, name in enumerate(class_names)}
+        class_aliases = {normalize(alias): class_ids[normalize(name)] for alias, name in data.get('class_aliases', {}).items()}
+
+        build_aliases = data.get('build_aliases', {})
+        build_lookup = []
+        for class_id, class_name in enumerate(class_names):
+            build_ids = {normalize(build_names[build_id]): build_id for build_id in class_builds[class_id]}
+            aliases = {normalize(alias): build_ids[normalize(build)] for alias, build in build_aliases.get(class_name, {}).items()}
+            build_lookup.append(_lookup_table(build_ids, aliases))
+
+        class_options, build_options = (), ()
+        if self.make_option:
+            class_options = tuple(self.make_option(label=name, description=f"{name} class") for name in class_names)
+            build_options = tuple(tuple(self.make_option(label=build_names[build_id], description=f"{build_names[build_id]} build")
+                                        for build_id in build_ids) for build_ids in class_builds)
+        self.class_options = class_options
+        self.build_options = build_options
+        self.class_names = class_names
+        self.build_names = tuple(build_names)
+        self.build_class = tuple(build_class)
+        self.class_builds = tuple(class_builds)
+        self._class_lookup = _lookup_table(class_ids, class_aliases)
+        self._build_lookup = tuple(build_lookup)
+
+    # Lookups. Each takes a name, alias or prefix and returns None if it doesn't resolve.
+
+    def class_id(self, value):
+        return self._class_lookup.get(normalize(value))
+
+    def build_id(self, class_id, value):
+        if class_id is None or not 0 <= class_id < len(self._build_lookup):
+            return None
+        return self._build_lookup[class_id].get(normalize(value))
+
+    def canonical(self, class_value, build_value=None):
+        # (class name, build name) for free text, with None for any part that doesn't resolve
+        class_id = self.class_id(class_value)
+        if class_id is None:
+            return None, None
+        build_id = self.build_id(class_id, build_value) if build_value else None
+        return self.class_names[class_id], self.build_names[build_id] if build_id is not None else None
+
+
+## CHECK
+# Reports stored player and team composition builds the catalog doesn't know, and
+# which of them an alias or prefix would resolve; --fix stores the canonical names.
+
+def check_builds(catalog, db):
+    # [(collection, key, role index or None, field, stored value, canonical value or None)]
+    problems = []
+
+    def check(name, key, index, record):
+        class_value, build_value = record.get('class', ''), record.get('build', '')
+        class_name, build_name = catalog.canonical(class_value, build_value)
+        if class_value and class_value != class_name:
+            problems.append((name, key, index, 'class', class_value, class_name))
+        if class_name and build_value and build_value.lower() != 'any' and build_value != build_name:
+            problems.append((name, key, index, 'build', build_value, build_name))
+
+    for player_id, player in db['players'].items():
+        check('players', player_id, None, player)
+    for team_name, team_comp in db['team_comps'].items():
+        for index, role in enumerate(team_comp.get('roles', [])):
+            check('team_comps', team_name, index, role)
+    return problems
+
+
+if __name__ == '__main__':
+    from ladderBackends import JsonBackend, data_files
+    from ladderStore import DataStore
+
+    parser = argparse.ArgumentParser(description='Check stored classes and builds against builds.json')
+    parser.add_argument('--data-dir', default='data/ladderReset')
+    parser.add_argument('--fix', action='store_true', help='store the canonical name wherever one resolves')
+    args = parser.parse_args()
+
+    catalog = BuildCatalog(os.path.join(args.data_dir, 'builds.json'))
+    files = data_files(args.data_dir)
+    store = DataStore(files, JsonBackend(files, os.path.join(args.data_dir, 'journal.jsonl')))
+    store.load_all()
+
+    problems = check_builds(catalog, {name: store.load(name) for name in files})
+    for name, key, index, field, value, canonical in problems:
+        where = f'{name} {key}' + (f' role {index + 1}' if index is not None else '')
+        print(f'{where}: {field} {value!r} -> {canonical!r}' if canonical else f'{where}: unknown {field} {value!r}')
+    print(f'{len(problems)} problems, {sum(1 for problem in problems if problem[5])} fixable')
+
+    if args.fix:
+        comps = {}
+        for name, key, index, field, value, canonical in problems:
+            if canonical is None:
+                continue
+            if name == 'players':
+                store.apply('set_player_field', player_id=key, field=field, value=canonical)
+            else:
+                roles = comps.setdefault(key, [dict(role) for role in store.load('team_comps')[key]['roles']])
+                roles[index][field] = canonical
+        for team_name, roles in comps.items():
+            store.apply('set_team_comp', team_name=team_name, roles=roles)
+        store.flush()
+        print('Fixed')
@@ -0,0 +1,88 @@
+import contextlib
+import json
+import time
+
+from ladderModels import to_json
+
+try:
+    import orjson
+except ImportError:  # Optional; the 'fast' codec falls back to the standard library
+    orjson = None
+
+
+## JSON CODECS
+# How the data files are encoded (LADDER_JSON_CODEC):
+#   pretty   indent=4, the format the files have always had
+#   compact  no whitespace: a third smaller and a few times quicker to write
+#   fast     compact, encoded and decoded by orjson when it is installed
+# Every codec reads what any of them wrote, so the setting can change between
+# restarts without converting anything.
+# Files are encoded a chunk of records at a time, each chunk under the lock that
+# DataStore.apply holds while it mutates. A flush can then run in a worker thread
+# while the event loop keeps applying mutations: the loop waits for one chunk at
+# most, never for a whole file.
+
+ENCODE_CHUNK = 64  # records encoded per hold of the lock
+
+
+class JsonCodec:
+    name = 'pretty'
+    start, separator, end = b'{\n', b',\n', b'\n}'
+
+    def members(self, chunk):
+        # The members of the {key: record} dict chunk, without the braces around them
+        return json.dumps(chunk, indent=4, default=to_json)[2:-2].encode()
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def iterencode(self, records, lock=None):
+        # Yields the encoded {key: record} dict in pieces; records removed while this
+        # runs are left out, records changed are written as they are when reached
+        lock = lock or contextlib.nullcontext()
+        with lock:
+            keys = list(records)
+        if not keys:
+            yield b'{}'
+            return
+        yield self.start
+        first = True
+        for start in range(0, len(keys), ENCODE_CHUNK):
+            with lock:
+                chunk = {key: records[key] for key in keys[start:start + ENCODE_CHUNK] if key in records}
+                if not chunk:
+                    continue
+                members = self.members(chunk)
+            yield members if first else self.separator + members
+            first = False
+            time.sleep(0)  # Let a mutation waiting on the lock in before the next chunk
+        yield self.end
+
+
+class CompactCodec(JsonCodec):
+    name = 'compact'
+    start, separator, end = b'{', b',', b'}'
+
+    def members(self, chunk):
+        return json.dumps(chunk, separators=(',', ':'), default=to_json)[1:-1].encode()
+
+
+class OrjsonCodec(CompactCodec):
+    name = 'fast'
+
+    def members(self, chunk):
+        return orjson.dumps(chunk, default=to_json, option=orjson.OPT_NON_STR_KEYS)[1:-1]
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+CODECS = {'pretty': JsonCodec(), 'compact': CompactCodec(), 'fast': OrjsonCodec()}
+
+def get_codec(name):
+    if name not in CODECS:
+        raise ValueError(f"Unknown JSON codec {name!r}, expected one of: {', '.join(CODECS)}")
+    if name == 'fast' and orjson is None:
+        print('orjson is not installed; writing compact JSON with the standard library')
+        name = 'compact'
+    return CODECS[name]
@@ -0,0 +1,98 @@
+import re
+
+
+## TEAM COMPOSITION SPECS
+# A whole team composition as compact text, one role per line (or separated by ';'):
+#
+#   Sorceress / Blizzard / Serious
+#   Paladin / Hdin / Casual x2
+#   Barb / any
+#
+# Class, then optional build ("any" or left out for any build) and seriousness, and
+# an optional "xN" for N players in that role. Classes and builds are resolved through
+# the build catalog (names, aliases, unambiguous prefixes) and stored by their
+# canonical names. Parsing checks every line and reports all the problems at once,
+# so a comp is either stored whole or not at all.
+
+COMP_SERIOUSNESS = ['Casual', 'Serious', 'Hardcore']
+MAX_COMP_SLOTS = 8  # A game holds 8 players
+
+_COUNT = re.compile(r'\s*(?:x\s*(\d+)|(\d+)\s*x)\s*$', re.IGNORECASE)
+
+
+def _match(value, choices):
+    # Case-insensitive exact match, else an unambiguous prefix match; None if neither
+    lowered = value.lower()
+    for choice in choices:
+        if choice.lower() == lowered:
+            return choice
+    prefixed = [choice for choice in choices if choice.lower().startswith(lowered)]
+    return prefixed[0] if len(prefixed) == 1 else None
+
+
+def parse_comp_spec(spec, catalog):
+    # Returns the role list or raises ValueError with one line per problem
+    roles, errors = [], []
+    lines = [line.strip() for line in re.split(r'[;\n]', spec or '') if line.strip()]
+    for number, line in enumerate(lines, 1):
+        count = 1
+        found = _COUNT.search(line)
+        if found:
+            count = int(found.group(1) or found.group(2))
+            line = line[:found.start()]
+        parts = [part.strip() for part in line.split('/')]
+        if len(parts) > 3:
+            errors.append(f"Role {number}: expected Class / Build / Seriousness, got {len(parts)} parts")
+            continue
+
+        class_id = catalog.class_id(parts[0])
+        if class_id is None:
+            errors.append(f"Role {number}: unknown class '{parts[0]}' (one of {', '.join(catalog.class_names)})")
+            continue
+        class_name = catalog.class_names[class_id]
+        role = {'class': class_name, 'build': 'Any', 'seriousness': ''}
+
+        if len(parts) > 1 and parts[1] and parts[1].lower() != 'any':
+            build_id = catalog.build_id(class_id, parts[1])
+            if build_id is None:
+                builds = ', '.join(catalog.build_names[build] for build in catalog.class_builds[class_id])
+                errors.append(f"Role {number}: unknown {class_name} build '{parts[1]}' (one of {builds})")
+                continue
+            role['build'] = catalog.build_names[build_id]
+
+        if len(parts) > 2 and parts[2]:
+            seriousness = _match(parts[2], COMP_SERIOUSNESS)
+            if seriousness is None:
+                errors.append(f"Role {number}: unknown seriousness '{parts[2]}' (one of {', '.join(COMP_SERIOUSNESS)})")
+                continue
+            role['seriousness'] = seriousness
+
+        if count < 1:
+            errors.append(f"Role {number}: count must be at least 1")
+            continue
+        if count > 1:
+            role['count'] = count
+        roles.append(role)
+
+    if not lines:
+        errors.append("No roles given")
+    slots = sum(role.get('count', 1) for role in roles)
+    if slots > MAX_COMP_SLOTS:
+        errors.append(f"{slots} roles is more than the {MAX_COMP_SLOTS} a game holds")
+    if errors:
+        raise ValueError("\n".join(errors))
+    return roles
+
+
+def format_comp_spec(roles):
+    # The spec text for a stored composition, e.g. to prefill the editor
+    lines = []
+    for role in roles:
+        parts = [role.get('class', ''), role.get('build') or 'Any']
+        if role.get('seriousness'):
+            parts.append(role['seriousness'])
+        line = ' / '.join(parts)
+        if int(role.get('count', 1) or 1) > 1:
+            line += f" x{role['count']}"
+        lines.append(line)
+    return "\n".join(lines)
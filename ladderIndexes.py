@@ -0,0 +1,101 @@
+from bisect import bisect_left, insort
+
+
+## SORTED INDEXES
+# One sorted index per list_players sort_by field, kept current from store change
+# notifications. A player registering or changing a selection moves one entry in
+# one index instead of list_players rebuilding and re-sorting every player, and a
+# page or top-N of any ordering is a slice.
+
+# Field -> sort value for a player record; mirrors the columns list_players shows.
+# Names sort by the stored username so ordering never needs a guild member lookup.
+SORT_FIELDS = {
+    'name': lambda player, team: player.get('username', 'Unknown'),
+    'class': lambda player, team: player.get('class', 'N/A'),
+    'build': lambda player, team: player.get('build', 'N/A'),
+    'seriousness': lambda player, team: player.get('seriousness', 'N/A'),
+    'team': lambda player, team: team or "No team",
+    'experience': lambda player, team: 'Yes' if player.get('experience') else 'No',
+    'timezone': lambda player, team: player.get('timezone', 'N/A'),
+    'availability': lambda player, team: player.get('availability', 'N/A'),
+}
+
+
+class SortedIndex:
+    def __init__(self):
+        self._entries = []  # (value, player id), kept sorted; ties in player id order
+        self._values = {}   # player id -> value it is indexed under
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set(self, player_id, value):
+        if player_id in self._values and self._values[player_id] == value:
+            return
+        self.discard(player_id)
+        insort(self._entries, (value, player_id))
+        self._values[player_id] = value
+
+    def discard(self, player_id):
+        if player_id not in self._values:
+            return
+        entry = (self._values.pop(player_id), player_id)
+        del self._entries[bisect_left(self._entries, entry)]
+
+    def load(self, values):
+        # Bulk load from {player id: value}: one sort instead of an insort per player
+        self._values = dict(values)
+        self._entries = sorted((value, player_id) for player_id, value in self._values.items())
+
+    def ids(self, start=0, stop=None, reverse=False):
+        entries = self._entries[::-1] if reverse else self._entries
+        return [player_id for _, player_id in entries[start:stop]]
+
+
+class PlayerSortIndexes:
+    def __init__(self, team_of, fields=SORT_FIELDS):
+        self.team_of = team_of  # player id -> team name; the store's player -> team index
+        self.fields = fields
+        self.indexes = {field: SortedIndex() for field in fields}
+        self._players = {}
+        self._team_members = {}  # team name -> member ids, to know whose team column a change affects
+
+    def ordered(self, field, start=0, stop=None, reverse=False):
+        # Player ids in field order
+        return self.indexes[field].ids(start, stop, reverse)
+
+    def update(self, player_id):
+        player = self._players.get(player_id)
+        if player is None:
+            for index in self.indexes.values():
+                index.discard(player_id)
+            return
+        team = self.team_of(player_id)
+        for field, value in self.fields.items():
+            self.indexes[field].set(player_id, value(player, team))
+
+    def rebuild(self):
+        teams = {player_id: self.team_of(player_id) for player_id in self._players}
+        for field, value in self.fields.items():
+            self.indexes[field].load({player_id: value(player, teams[player_id]) for player_id, player in self._players.items()})
+
+    # Store listener
+    def on_change(self, name, key, record):
+        if name == 'players':
+            if key is None:
+                self._players = record
+                self.rebuild()
+            else:
+                self.update(key)
+        elif name == 'teams':
+            if key is None:
+                self._team_members = {team_name: set(team['members']) for team_name, team in record.items()}
+                self.rebuild()
+                return
+            old = self._team_members.pop(key, set())
+            new = set(record['members']) if record else set()
+            if new:
+                self._team_members[key] = new
+            for player_id in old ^ new:
+                if player_id in self._players:
+                    self.update(player_id)
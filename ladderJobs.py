@@ -0,0 +1,155 @@
+import asyncio
+import contextvars
+import functools
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ladderPerf import perf
+
+
+## JOBS
+# Commands whose work can outlast Discord's 3 second window run as jobs. The
+# interaction is deferred straight away ("thinking..."), the heavy synchronous part
+# runs on a small thread pool, and the deferred response is edited with the result
+# back on the event loop. Each user can have a few jobs queued or running at once,
+# the pool has a bounded backlog, and every job has a timeout. Anything else that
+# may wait on Discord (e.g. resolving member names) goes in an async prepare step,
+# awaited on the loop after the defer and before compute. A job can be
+# cancelled: one still queued never starts, and a running one stops at its next
+# job.check() and its result is thrown away.
+# The compute part must not touch anything the event loop mutates while it runs:
+# it gets snapshots or copies taken for it (store.snapshot, match_index.snapshot,
+# member_names.snapshot), never the live store, indexes, caches or tables.
+
+JOB_WORKERS = 2
+JOBS_PER_USER = 2
+MAX_JOBS = 32           # queued + running, across all users
+JOB_TIMEOUT = 60        # seconds
+JOB_HISTORY = 200       # finished jobs kept for /jobs
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, user_id, name):
+        self.id = job_id
+        self.user_id = user_id
+        self.name = name
+        self.status = 'queued'
+        self.created = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.task = None
+        self._cancelled = threading.Event()
+
+    def check(self):
+        # Called by compute between chunks of work
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.created
+
+
+class JobRunner:
+    def __init__(self, workers=JOB_WORKERS, per_user=JOBS_PER_USER, max_jobs=MAX_JOBS, timeout=JOB_TIMEOUT):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ladder-job')
+        self.per_user = per_user
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.active = {}                        # job id -> Job, queued or running
+        self.history = deque(maxlen=JOB_HISTORY)
+        self.stats = {'started': 0, 'done': 0, 'failed': 0, 'cancelled': 0, 'timed_out': 0, 'rejected': 0}
+        self._ids = itertools.count(1)
+
+    def jobs_for(self, user_id):
+        return [job for job in self.active.values() if job.user_id == user_id]
+
+    async def run(self, ctx, name, compute, deliver, ephemeral=False, prepare=None):
+        # prepare() is awaited on the loop once deferred; compute(job) runs in the
+        # pool and returns a result (None for no compute step); deliver(result) is
+        # awaited on the loop and edits the deferred response. Returns the Job, or
+        # None if it was turned away.
+        user_jobs = self.jobs_for(ctx.author.id)
+        if len(user_jobs) >= self.per_user or len(self.active) >= self.max_jobs:
+            self.stats['rejected'] += 1
+            reason = (f"You already have {len(user_jobs)} requests running ({', '.join(f'#{job.id} {job.name}' for job in user_jobs)}). Use /jobs to see or cancel them."
+                      if user_jobs else "The bot is busy with other requests, try again in a moment.")
+            await ctx.respond(reason, ephemeral=True)
+            return None
+
+        job = Job(next(self._ids), ctx.author.id, name)
+        self.active[job.id] = job
+        self.stats['started'] += 1
+        try:
+            await ctx.defer(ephemeral=ephemeral)
+        except Exception:
+            self._finish(job, 'failed')
+            raise
+        job.task = asyncio.get_running_loop().create_task(self._run(job, ctx, prepare, compute, deliver))
+        return job
+
+    async def _run(self, job, ctx, prepare, compute, deliver):
+        loop = asyncio.get_running_loop()
+        message = None
+        try:
+            async with perf.span(f'job:{job.name}'):
+                if prepare is not None:
+                    await prepare()
+                result = None
+                if compute is not None:
+                    # The context copy carries the perf span into the worker thread
+                    call = functools.partial(contextvars.copy_context().run, self._call, job, compute)
+                    result = await asyncio.wait_for(loop.run_in_executor(self.executor, call), self.timeout)
+                job.status = 'delivering'
+                await deliver(result)
+            self._finish(job, 'done')
+        except (asyncio.CancelledError, JobCancelled):
+            self._finish(job, 'cancelled')
+            message = f"Request #{job.id} ({job.name}) was cancelled."
+        except asyncio.TimeoutError:
+            self._finish(job, 'timed_out')
+            message = f"Request #{job.id} ({job.name}) took longer than {self.timeout}s and was stopped."
+        except Exception as e:
+            self._finish(job, 'failed')
+            print(f'Job #{job.id} {job.name} failed: {e!r}')
+            message = f"Request #{job.id} ({job.name}) failed."
+        if message:
+            try:
+                await ctx.interaction.edit_original_response(content=message, embed=None, view=None)
+            except Exception:
+                pass
+
+    def _call(self, job, compute):
+        job.check()  # Cancelled while still queued
+        job.status = 'running'
+        job.started = time.monotonic()
+        return compute(job)
+
+    def _finish(self, job, status):
+        job._cancelled.set()  # Stops a compute that is still running after a timeout
+        job.status = status
+        job.finished = time.monotonic()
+        self.stats[status] += 1
+        if self.active.pop(job.id, None) is not None:
+            self.history.append(job)
+
+    def cancel(self, job_id):
+        # Returns the job if it was still queued or running
+        job = self.active.get(job_id)
+        if job is None:
+            return None
+        job._cancelled.set()
+        if job.task is not None:
+            job.task.cancel()
+        return job
+
+    def shutdown(self):
+        for job in list(self.active.values()):
+            job._cancelled.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,327 @@
+## MATCHING ENGINE
+# Inverted indexes over registered players (class, build, seriousness, timezone,
+# experience) so a team composition role is answered by intersecting a few sets
+# instead of scanning every player, plus a global assignment of candidates to all
+# of a team's roles at once (Hungarian algorithm) instead of greedy first-match.
+# With a build catalog (ladderBuilds.py) classes and builds are compared as catalog
+# IDs, so aliases and abbreviations match exactly; names the catalog doesn't know
+# fall back to comparing lowercased text.
+
+# Player and role seriousness use different scales; both map onto one ladder
+SERIOUSNESS_LEVELS = {
+    'noob': 0,
+    'casual': 1,
+    'serious': 2,
+    'raceto99': 3,
+    'hardcore': 3,
+}
+
+# Fit score weights. Class always has to match; everything else adds to the score.
+BUILD_EXACT = 4
+BUILD_CLOSE = 3         # one build name contains the other ("Conc" / "Concentrate Barb")
+SERIOUSNESS_EXACT = 2
+SERIOUSNESS_CLOSE = 1   # one level apart
+TIMEZONE_MATCH = 1
+EXPERIENCE_BONUS = 1
+MEMBER_BONUS = 10       # current members keep the roles they fit
+MAX_SCORE = BUILD_EXACT + SERIOUSNESS_EXACT + TIMEZONE_MATCH + EXPERIENCE_BONUS + MEMBER_BONUS
+
+ANY_BUILD = ('', 'any')
+
+
+def _key(value):
+    return str(value or '').strip().lower()
+
+def _class_key(value, catalog=None):
+    # Catalog class ID when the name resolves, else the lowercased text
+    if catalog is not None:
+        class_id = catalog.class_id(value)
+        if class_id is not None:
+            return class_id
+    return _key(value)
+
+def _build_key(class_key, value, catalog=None):
+    if catalog is not None and isinstance(class_key, int) and _key(value) not in ANY_BUILD:
+        build_id = catalog.build_id(class_key, value)
+        if build_id is not None:
+            return build_id
+    return _key(value)
+
+def class_matches(role_class, player_class):
+    if isinstance(role_class, int) or isinstance(player_class, int):
+        return role_class == player_class
+    # Prefix match so abbreviations like "Pal" or "Necro" find the full class name
+    return role_class != '' and player_class.startswith(role_class)
+
+def build_score(role_build, player_build):
+    if role_build in ANY_BUILD or player_build == '':
+        return 0
+    if player_build == role_build:
+        return BUILD_EXACT
+    if isinstance(role_build, str) and isinstance(player_build, str) and (player_build in role_build or role_build in player_build):
+        return BUILD_CLOSE
+    return 0
+
+
+# Profiles reduce a player or a role to the keys matching looks at, so many of
+# them can be grouped and compared without going back to the records.
+
+def player_profile(player, catalog=None):
+    class_key = _class_key(player.get('class'), catalog)
+    return (class_key, _build_key(class_key, player.get('build'), catalog), SERIOUSNESS_LEVELS.get(_key(player.get('seriousness'))),
+            _key(player.get('timezone')), bool(player.get('experience')))
+
+def role_profile(role, catalog=None):
+    class_key = _class_key(role.get('class'), catalog)
+    return (class_key, _build_key(class_key, role.get('build'), catalog), SERIOUSNESS_LEVELS.get(_key(role.get('seriousness'))),
+            _key(role.get('timezone')), bool(role.get('experience_required')))
+
+def fit(role_p, player_p):
+    # Same scoring as MatchIndex.rank for a single pair; None if the player can't take the role
+    role_class, role_build, role_level, role_timezone, experience_required = role_p
+    player_class, player_build, player_level, player_timezone, experienced = player_p
+    if not class_matches(role_class, player_class):
+        return None
+    if experience_required and not experienced:
+        return None
+    score = build_score(role_build, player_build)
+    if role_level is not None and player_level is not None:
+        if player_level == role_level:
+            score += SERIOUSNESS_EXACT
+        elif abs(player_level - role_level) == 1:
+            score += SERIOUSNESS_CLOSE
+    if role_timezone and player_timezone == role_timezone:
+        score += TIMEZONE_MATCH
+    if experienced:
+        score += EXPERIENCE_BONUS
+    return score
+
+
+class MatchIndex:
+    def __init__(self, catalog=None):
+        self.catalog = catalog
+        self.by_class = {}      # class -> player ids
+        self.by_build = {}      # (class, build) -> player ids
+        self.by_level = {}      # seriousness level -> player ids
+        self.by_timezone = {}   # timezone -> player ids
+        self.experienced = set()
+        self._keys = {}         # player id -> the keys it is indexed under
+        self._snapshot = None
+
+    def rebuild(self, players):
+        self.__init__(self.catalog)
+        for player_id, player in players.items():
+            self.update(player_id, player)
+
+    def update(self, player_id, player):
+        player_id = int(player_id)
+        self._snapshot = None
+        self._remove(player_id)
+        if not player or not _key(player.get('class')):
+            return  # Not registered yet, or still in the middle of the wizard
+
+        class_key = _class_key(player.get('class'), self.catalog)
+        keys = (class_key, (class_key, _build_key(class_key, player.get('build'), self.catalog)),
+                SERIOUSNESS_LEVELS.get(_key(player.get('seriousness'))), _key(player.get('timezone')))
+        for index, key in zip((self.by_class, self.by_build, self.by_level, self.by_timezone), keys):
+            index.setdefault(key, set()).add(player_id)
+        if player.get('experience'):
+            self.experienced.add(player_id)
+        self._keys[player_id] = keys
+
+    def _remove(self, player_id):
+        keys = self._keys.pop(player_id, None)
+        if keys is None:
+            return
+        for index, key in zip((self.by_class, self.by_build, self.by_level, self.by_timezone), keys):
+            ids = index[key]
+            ids.discard(player_id)
+            if not ids:
+                del index[key]
+        self.experienced.discard(player_id)
+
+    def snapshot(self):
+        # A copy for rank() calls from a worker thread, which must not see the index
+        # change under them; made again only after the index has changed
+        if self._snapshot is None:
+            copy = MatchIndex(self.catalog)
+            copy.by_class = {key: set(ids) for key, ids in self.by_class.items()}
+            copy.by_build = {key: set(ids) for key, ids in self.by_build.items()}
+            copy.by_level = {key: set(ids) for key, ids in self.by_level.items()}
+            copy.by_timezone = {key: set(ids) for key, ids in self.by_timezone.items()}
+            copy.experienced = set(self.experienced)
+            self._snapshot = copy
+        return self._snapshot
+
+    # Store listener: keeps the index current as players register and change selections
+    def on_change(self, name, key, record):
+        if name != 'players':
+            return
+        if key is None:
+            self.rebuild(record)
+        else:
+            self.update(key, record)
+
+    def _class_keys(self, role_class):
+        role_class = _class_key(role_class, self.catalog)
+        if isinstance(role_class, int):
+            return [role_class] if role_class in self.by_class else []
+        return [class_key for class_key in self.by_class if class_matches(role_class, class_key)]
+
+    def rank(self, role, exclude=(), bonus=None):
+        # Returns [(score, player id)] for every player who can fill the role, best first
+        class_keys = self._class_keys(role.get('class'))
+        candidates = set().union(*(self.by_class[class_key] for class_key in class_keys)) if class_keys else set()
+        candidates.difference_update(exclude)
+        if role.get('experience_required'):
+            candidates &= self.experienced
+        if not candidates:
+            return []
+
+        exact_builds, close_builds = set(), set()
+        role_build = _build_key(_class_key(role.get('class'), self.catalog), role.get('build'), self.catalog)
+        if role_build not in ANY_BUILD:
+            for (class_key, build_key), ids in self.by_build.items():
+                if class_key not in class_keys:
+                    continue
+                score = build_score(role_build, build_key)
+                if score == BUILD_EXACT:
+                    exact_builds |= ids
+                elif score == BUILD_CLOSE:
+                    close_builds |= ids
+
+        level = SERIOUSNESS_LEVELS.get(_key(role.get('seriousness')))
+        exact_level = self.by_level.get(level, set()) if level is not None else set()
+        close_level = (self.by_level.get(level - 1, set()) | self.by_level.get(level + 1, set())) if level is not None else set()
+        timezone = self.by_timezone.get(_key(role.get('timezone')), set()) if role.get('timezone') else set()
+
+        scored = []
+        for player_id in candidates:
+            score = 0
+            if player_id in exact_builds:
+                score += BUILD_EXACT
+            elif player_id in close_builds:
+                score += BUILD_CLOSE
+            if player_id in exact_level:
+                score += SERIOUSNESS_EXACT
+            elif player_id in close_level:
+                score += SERIOUSNESS_CLOSE
+            if player_id in timezone:
+                score += TIMEZONE_MATCH
+            if player_id in self.experienced:
+                score += EXPERIENCE_BONUS
+            if bonus:
+                score += bonus.get(player_id, 0)
+            scored.append((score, player_id))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+
+def expand_roles(roles):
+    # A role with 'count' stands for that many slots
+    slots = []
+    for role in roles:
+        for _ in range(max(1, int(role.get('count', 1) or 1))):
+            slots.append(role)
+    return slots
+
+
+def assign_roles(index, roles, members=(), exclude=(), alternates=2):
+    # Fill every slot of a team composition at once. Current members are candidates
+    # with a bonus so they keep the roles they already fit. Returns one entry per
+    # slot: {'role', 'player_id' (or None), 'score', 'member', 'alternates'}.
+    slots = expand_roles(roles)
+    if not slots:
+        return []
+
+    members = {int(member_id) for member_id in members}
+    exclude = {int(player_id) for player_id in exclude} - members
+    bonus = {member_id: MEMBER_BONUS for member_id in members}
+    rankings = [index.rank(role, exclude, bonus) for role in slots]
+
+    # Each slot's best candidates are enough for an optimal assignment: any slot whose
+    # optimal pick falls outside its top len(slots) can swap to one that is free
+    pool_size = len(slots) + alternates
+    pool = []
+    seen = set()
+    for ranking in rankings:
+        for score, player_id in ranking[:pool_size]:
+            if player_id not in seen:
+                seen.add(player_id)
+                pool.append(player_id)
+
+    unfilled = (len(slots) + 1) * (MAX_SCORE + 1)  # leaving a slot empty is worse than any fill
+    infeasible = unfilled * 2
+    cost = []
+    for ranking in rankings:
+        scores = dict((player_id, score) for score, player_id in ranking)
+        row = [MAX_SCORE - scores[player_id] if player_id in scores else infeasible for player_id in pool]
+        row += [unfilled] * len(slots)  # one "nobody" column per slot
+        cost.append(row)
+
+    picks = hungarian(cost)
+    taken = {pool[column] for column in picks if column < len(pool)}
+    result = []
+    for slot, (role, ranking, column) in enumerate(zip(slots, rankings, picks)):
+        player_id, score = None, 0
+        if column < len(pool) and cost[slot][column] < infeasible:
+            player_id = pool[column]
+            score = MAX_SCORE - cost[slot][column] - bonus.get(player_id, 0)
+        spare = [candidate for _, candidate in ranking if candidate not in taken and candidate not in members][:alternates]
+        result.append({
+            'role': role,
+            'player_id': player_id,
+            'score': score,
+            'member': player_id in members,
+            'alternates': spare,
+        })
+    return result
+
+
+def hungarian(cost):
+    # Minimum-cost assignment of every row to a distinct column (rows <= columns).
+    # Returns the column picked for each row.
+    rows, columns = len(cost), len(cost[0])
+    u = [0] * (rows + 1)
+    v = [0] * (columns + 1)
+    match = [0] * (columns + 1)  # column -> row (1-based), 0 = free
+    way = [0] * (columns + 1)
+    for row in range(1, rows + 1):
+        match[0] = row
+        column = 0
+        min_value = [float('inf')] * (columns + 1)
+        used = [False] * (columns + 1)
+        while True:
+            used[column] = True
+            current_row = match[column]
+            delta = float('inf')
+            next_column = 0
+            for j in range(1, columns + 1):
+                if used[j]:
+                    continue
+                reduced = cost[current_row - 1][j - 1] - u[current_row] - v[j]
+                if reduced < min_value[j]:
+                    min_value[j] = reduced
+                    way[j] = column
+                if min_value[j] < delta:
+                    delta = min_value[j]
+                    next_column = j
+            for j in range(columns + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_value[j] -= delta
+            column = next_column
+            if match[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+
+    picks = [0] * rows
+    for j in range(1, columns + 1):
+        if match[j]:
+            picks[match[j] - 1] = j - 1
+    return picks
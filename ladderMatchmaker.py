@@ -0,0 +1,265 @@
+import argparse
+import os
+import time
+from collections import deque
+
+from ladderMatching import MAX_SCORE, class_matches, expand_roles, fit, hungarian, player_profile, role_profile
+
+
+## LEAGUE MATCHMAKER
+# Fills the open roles of every team in one pass instead of captains running
+# suggest_autofill team by team:
+#   1. current members are placed into their own team's roles,
+#   2. players with a pending invitation or application take a fitting open role
+#      on that team,
+#   3. everyone else who is registered and unassigned is matched to the remaining
+#      roles with a min-cost flow that fills as many roles as possible, best fit first.
+# Players and roles are grouped into profile types (class, build, seriousness, ...)
+# so the flow graph is types x types, not players x roles, and stays small at 10k
+# players and 1k teams.
+
+def matchmake(db, catalog=None):
+    players = db['players']
+    teams = db['teams']
+    team_comps = db['team_comps']
+
+    profiles = {int(player_id): player_profile(player, catalog) for player_id, player in players.items() if player.get('class')}
+    assigned = set()
+    for team in teams.values():
+        assigned.update(int(member_id) for member_id in team['members'])
+
+    # 1. Open slots left on each team once its members are placed
+    open_slots = []  # [team name, slot index, role, role profile]
+    for team_name, team_comp in team_comps.items():
+        if team_name not in teams:
+            continue
+        slots = expand_roles(team_comp.get('roles', []))
+        filled = _place_members(slots, [role_profile(slot, catalog) for slot in slots], [profiles[int(member_id)] for member_id in teams[team_name]['members'] if int(member_id) in profiles])
+        for index, role in enumerate(slots):
+            if index not in filled:
+                open_slots.append((team_name, index, role, role_profile(role, catalog)))
+
+    # 2. Pending invitations, then applications, claim a fitting slot on their team
+    results = []
+    slots_by_team = {}
+    for slot in open_slots:
+        slots_by_team.setdefault(slot[0], []).append(slot)
+    for source, name in (('invitation', 'invitations'), ('application', 'applications')):
+        for request in db[name].values():
+            player_id = int(request['player_id'])
+            if request['status'] != 'Pending' or player_id in assigned or player_id not in profiles:
+                continue
+            best = None
+            for slot in slots_by_team.get(request['team_id'], []):
+                score = fit(slot[3], profiles[player_id])
+                if score is not None and (best is None or score > best[0]):
+                    best = (score, slot)
+            if best:
+                score, slot = best
+                slots_by_team[slot[0]].remove(slot)
+                assigned.add(player_id)
+                results.append(_result(slot, player_id, score, source))
+
+    # 3. Everyone else through the flow
+    remaining_slots = [slot for team_slots in slots_by_team.values() for slot in team_slots]
+    free_players = sorted(player_id for player_id in profiles if player_id not in assigned)
+    for slot, player_id, score in _flow_assign(remaining_slots, free_players, profiles):
+        results.append(_result(slot, player_id, score, 'match'))
+
+    filled = {(result['team_name'], result['slot']) for result in results}
+    unfilled = [{'team_name': slot[0], 'slot': slot[1], 'role': slot[2]} for slot in open_slots if (slot[0], slot[1]) not in filled]
+    return results, unfilled
+
+
+def _result(slot, player_id, score, source):
+    return {'team_name': slot[0], 'slot': slot[1], 'role': slot[2], 'player_id': player_id, 'score': score, 'source': source}
+
+
+def _place_members(slots, slot_profiles, member_profiles):
+    # Which slots the team's current members cover (a small assignment per team)
+    if not slots or not member_profiles:
+        return set()
+    unfit = (len(slots) + 1) * (MAX_SCORE + 1)
+    cost = []
+    for profile in member_profiles:
+        row = []
+        for slot_profile in slot_profiles:
+            score = fit(slot_profile, profile)
+            row.append(unfit if score is None else MAX_SCORE - score)
+        row += [unfit] * len(member_profiles)  # a member may not fit any slot
+        cost.append(row)
+    if len(cost) > len(cost[0]):
+        return set()
+    return {column for row, column in enumerate(hungarian(cost)) if column < len(slots) and cost[row][column] < unfit}
+
+
+def _flow_assign(slots, player_ids, profiles):
+    # Group identical player profiles and identical role profiles into types, then
+    # solve one min-cost max-flow per group of classes that can match each other.
+    player_types = {}
+    for player_id in player_ids:
+        player_types.setdefault(profiles[player_id], []).append(player_id)
+    role_types = {}
+    for slot in slots:
+        role_types.setdefault(slot[3], []).append(slot)
+
+    # Role classes can be prefixes ("pal" -> "paladin"), so group classes that overlap
+    player_classes = {profile[0] for profile in player_types}
+    groups = _UnionFind()
+    for role_p in role_types:
+        groups.add(('role', role_p[0]))
+        for player_class in player_classes:
+            if class_matches(role_p[0], player_class):
+                groups.union(('role', role_p[0]), ('player', player_class))
+
+    by_group = {}
+    for player_p in player_types:
+        if groups.has(('player', player_p[0])):
+            by_group.setdefault(groups.find(('player', player_p[0])), ([], []))[0].append(player_p)
+    for role_p in role_types:
+        by_group.setdefault(groups.find(('role', role_p[0])), ([], []))[1].append(role_p)
+
+    assignments = []
+    for group_players, group_roles in by_group.values():
+        if not group_players or not group_roles:
+            continue
+        for player_p, role_p, amount in _min_cost_flow(group_players, group_roles, player_types, role_types):
+            score = fit(role_p, player_p)
+            for _ in range(amount):
+                assignments.append((role_types[role_p].pop(), player_types[player_p].pop(), score))
+    return assignments
+
+
+def _min_cost_flow(player_types, role_types, player_members, role_members):
+    # Successive shortest paths on source -> player type -> role type -> sink.
+    # Returns [(player type, role type, amount)].
+    source, sink = 0, 1
+    nodes = 2 + len(player_types) + len(role_types)
+    graph = [[] for _ in range(nodes)]  # edges as [to, capacity, cost, reverse index]
+
+    def add_edge(a, b, capacity, cost):
+        graph[a].append([b, capacity, cost, len(graph[b])])
+        graph[b].append([a, 0, -cost, len(graph[a]) - 1])
+
+    player_node = {profile: 2 + i for i, profile in enumerate(player_types)}
+    role_node = {profile: 2 + len(player_types) + i for i, profile in enumerate(role_types)}
+    pair_edges = []
+    for player_p in player_types:
+        add_edge(source, player_node[player_p], len(player_members[player_p]), 0)
+    for role_p in role_types:
+        add_edge(role_node[role_p], sink, len(role_members[role_p]), 0)
+    for player_p in player_types:
+        for role_p in role_types:
+            score = fit(role_p, player_p)
+            if score is not None:
+                add_edge(player_node[player_p], role_node[role_p], len(player_members[player_p]), MAX_SCORE - score)
+                pair_edges.append((player_p, role_p, player_node[player_p], len(graph[player_node[player_p]]) - 1))
+
+    while True:
+        # Shortest path by cost in the residual graph (SPFA, residual edges can be negative)
+        distance = [float('inf')] * nodes
+        previous = [None] * nodes
+        in_queue = [False] * nodes
+        distance[source] = 0
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            in_queue[node] = False
+            for index, (to, capacity, cost, _) in enumerate(graph[node]):
+                if capacity > 0 and distance[node] + cost < distance[to]:
+                    distance[to] = distance[node] + cost
+                    previous[to] = (node, index)
+                    if not in_queue[to]:
+                        in_queue[to] = True
+                        queue.append(to)
+        if distance[sink] == float('inf'):
+            break
+
+        amount = float('inf')
+        node = sink
+        while node != source:
+            parent, index = previous[node]
+            amount = min(amount, graph[parent][index][1])
+            node = parent
+        node = sink
+        while node != source:
+            parent, index = previous[node]
+            edge = graph[parent][index]
+            edge[1] -= amount
+            graph[node][edge[3]][1] += amount
+            node = parent
+
+    flows = []
+    for player_p, role_p, node, index in pair_edges:
+        edge = graph[node][index]
+        used = len(player_members[player_p]) - edge[1]
+        if used > 0:
+            flows.append((player_p, role_p, used))
+    return flows
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def add(self, item):
+        self.parent.setdefault(item, item)
+
+    def has(self, item):
+        return item in self.parent
+
+    def find(self, item):
+        self.add(item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+
+def summarize(results, unfilled):
+    counts = {}
+    for result in results:
+        counts[result['source']] = counts.get(result['source'], 0) + 1
+    return (f"Filled {len(results)} of {len(results) + len(unfilled)} open roles: "
+            f"{counts.get('match', 0)} new invitations, {counts.get('invitation', 0)} already invited, "
+            f"{counts.get('application', 0)} pending applications to accept.")
+
+
+if __name__ == '__main__':
+    from ladderBackends import JsonBackend, SqliteBackend, data_files
+    from ladderBuilds import BuildCatalog
+    from ladderStore import DataStore
+
+    parser = argparse.ArgumentParser(description='Fill every team composition from the registered player pool in one pass')
+    parser.add_argument('--data-dir', default='data/ladderReset')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--write', action='store_true', help='create the new invitations (default is a dry run)')
+    args = parser.parse_args()
+
+    files = data_files(args.data_dir)
+    if args.backend == 'sqlite':
+        backend = SqliteBackend(os.path.join(args.data_dir, 'ladder.db'))
+    else:
+        backend = JsonBackend(files, os.path.join(args.data_dir, 'journal.jsonl'))
+    store = DataStore(files, backend)
+    store.load_all()
+
+    start = time.perf_counter()
+    catalog = BuildCatalog(os.path.join(args.data_dir, 'builds.json'))
+    results, unfilled = matchmake({name: store.load(name) for name in files}, catalog)
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        print(f"{result['team_name']} role {result['slot'] + 1} ({result['role'].get('class')}): {result['player_id']} "
+              f"fit {result['score']} [{result['source']}]")
+    print(summarize(results, unfilled))
+    print(f'Matched in {elapsed:.2f}s')
+
+    if args.write:
+        invitations = [{'team_id': result['team_name'], 'player_id': result['player_id']} for result in results if result['source'] == 'match']
+        store.apply('invite_many', invitations=invitations, ids=store.next_ids('invitations', len(invitations)))
+        store.flush()
+        print(f'Created {len(invitations)} invitations')
@@ -0,0 +1,147 @@
+import asyncio
+from collections import OrderedDict
+
+
+## MEMBER NAMES
+# Names for player IDs without a guild lookup per table row. Handlers call
+# resolve(guild, ids) once before rendering: IDs already known are skipped, the
+# rest are read from the guild's member cache, and whatever is still missing is
+# fetched in one go (the whole member list, chunked, the first time for a guild
+# that was never chunked; a user_ids query for a few stragglers after that).
+# Names live in a bounded LRU kept current from member and user update events;
+# name() falls back to the username stored with the player for anyone who
+# couldn't be found, e.g. because they left the server.
+
+MEMBER_NAMES_SIZE = 20000
+QUERY_BATCH = 100    # Discord's limit on user_ids in one member request
+QUERY_TIMEOUT = 2.0  # seconds for a whole resolve; commands must answer within 3
+RESOLVED_STAMPS = 256
+
+
+class MemberNames:
+    def __init__(self, max_entries=MEMBER_NAMES_SIZE):
+        self.max_entries = max_entries
+        self.version = 0                # Bumped whenever a name that tables show changes
+        self.stats = {'cached': 0, 'fetched': 0, 'absent': 0, 'fetches': 0}
+        self._names = OrderedDict()     # user id -> name, least recently used first
+        self._absent = OrderedDict()    # user ids not in the guild when last looked for
+        self._chunked = set()           # guild ids whose member list was fetched whole
+        self._resolved = OrderedDict()  # (guild id, stamp) already resolved
+
+    def __len__(self):
+        return len(self._names)
+
+    def name(self, user_id, fallback='Unknown'):
+        name = self._names.get(int(user_id))
+        if name is None:
+            return fallback
+        self._names.move_to_end(int(user_id))
+        return name
+
+    def snapshot(self):
+        # Every known name, for rendering in a job thread
+        return dict(self._names)
+
+    def _store(self, user_id, name):
+        if self._names.get(user_id) != name:
+            self.version += 1
+        self._names[user_id] = name
+        self._names.move_to_end(user_id)
+        self._absent.pop(user_id, None)
+        while len(self._names) > self.max_entries:
+            self._names.popitem(last=False)
+
+    def _mark_absent(self, user_id):
+        self._absent[user_id] = None
+        while len(self._absent) > self.max_entries:
+            self._absent.popitem(last=False)
+
+    async def resolve(self, guild, user_ids, stamp=None):
+        # Makes name() answer for every ID in user_ids. With a stamp (e.g. the data
+        # version the IDs came from), a second call with the same stamp does nothing.
+        if guild is None:
+            return
+        if stamp is not None:
+            if (guild.id, stamp) in self._resolved:
+                return
+            self._resolved[guild.id, stamp] = None
+            while len(self._resolved) > RESOLVED_STAMPS:
+                self._resolved.popitem(last=False)
+
+        missing = self._from_cache(guild, user_ids)
+        if not missing or guild.chunked:
+            for user_id in missing:  # The cache holds every member; these aren't in the guild
+                self._mark_absent(user_id)
+            self.stats['absent'] += len(missing)
+            return
+
+        self.stats['fetches'] += 1
+        try:
+            # One deadline for the whole lookup, however many requests it takes
+            missing = await asyncio.wait_for(self._fetch(guild, missing), QUERY_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Shown with stored usernames this time; the next resolve tries again
+            self._resolved.pop((guild.id, stamp), None)
+            return
+        for user_id in missing:
+            self._mark_absent(user_id)
+        self.stats['absent'] += len(missing)
+
+    async def _fetch(self, guild, missing):
+        # Asks Discord for the missing IDs; returns those it didn't know either
+        if len(missing) > QUERY_BATCH and guild.id not in self._chunked:
+            await guild.chunk()
+            self._chunked.add(guild.id)  # Only once the member list really came in
+            return self._from_cache(guild, missing)
+        for start in range(0, len(missing), QUERY_BATCH):
+            batch = missing[start:start + QUERY_BATCH]
+            for member in await guild.query_members(user_ids=batch, limit=len(batch), cache=True):
+                self._store(member.id, member.name)
+                self.stats['fetched'] += 1
+        return [user_id for user_id in missing if user_id not in self._names]
+
+    def _from_cache(self, guild, user_ids):
+        # IDs neither known nor in the guild's member cache
+        missing = []
+        for user_id in user_ids:
+            user_id = int(user_id)
+            if user_id in self._names or user_id in self._absent:
+                continue
+            member = guild.get_member(user_id)
+            if member is not None:
+                self._store(user_id, member.name)
+                self.stats['cached'] += 1
+            else:
+                missing.append(user_id)
+        return missing
+
+    # Gateway events
+
+    def on_member_update(self, before, after):
+        if after.id in self._names:
+            self._store(after.id, after.name)
+
+    def on_user_update(self, before, after):
+        if after.id in self._names:
+            self._store(after.id, after.name)
+
+    def on_member_join(self, member):
+        if member.id in self._absent:
+            self._store(member.id, member.name)
+
+
+## DM TARGETS
+# The notification dispatcher needs something with .id and .send(). For a member
+# who isn't in the guild cache, DMTarget stands in and only looks the user up when
+# the DM is actually delivered, in a dispatcher worker.
+
+class DMTarget:
+    __slots__ = ('id', '_client')
+
+    def __init__(self, client, user_id):
+        self.id = int(user_id)
+        self._client = client
+
+    async def send(self, content):
+        user = self._client.get_user(self.id) or await self._client.fetch_user(self.id)
+        return await user.send(content)
@@ -0,0 +1,193 @@
+## RECORDS
+# Resident players and teams are slotted objects instead of dicts. Players are keyed
+# by their integer Discord ID everywhere (the JSON files keep string keys, which is
+# all JSON allows). Class, build, seriousness and timezone are stored as small
+# integer codes into shared per-field tables, so 10k players naming "Sorceress"
+# share one string instead of holding 10k copies.
+# Both types still read and write like the dicts they replace (record['class'],
+# record.get('plan'), record['members'].append(...)), so handlers don't change,
+# and to_dict() gives back the on-disk format.
+
+
+class CodeTable:
+    # Interns the values of one field: value <-> small integer code
+    def __init__(self):
+        self.values = ['']
+        self.codes = {'': 0}
+
+    def code(self, value):
+        value = '' if value is None else value
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+CODED_FIELDS = ('class', 'build', 'seriousness', 'timezone')
+CODES = {field: CodeTable() for field in CODED_FIELDS}
+
+
+class Player:
+    __slots__ = ('id', 'username', 'class_code', 'build_code', 'seriousness_code', 'timezone_code',
+                 'first_reset', 'experience', 'availability', 'extra')
+
+    _ATTRS = {'username': 'username', 'first_reset': 'first_reset', 'experience': 'experience', 'availability': 'availability'}
+    FIELDS = ('discord_id', 'username') + CODED_FIELDS + ('first_reset', 'experience', 'availability')
+
+    def __init__(self, player_id, username, fields=None):
+        self.id = int(player_id)
+        self.username = username
+        self.class_code = self.build_code = self.seriousness_code = self.timezone_code = 0
+        self.first_reset = False
+        self.experience = False
+        self.availability = ''
+        self.extra = None  # Any other fields, rarely used
+        for field, value in (fields or {}).items():
+            self[field] = value
+
+    @classmethod
+    def from_dict(cls, player_id, data):
+        data = dict(data)
+        data.pop('discord_id', None)
+        return cls(player_id, data.pop('username', ''), data)
+
+    def __getitem__(self, field):
+        if field in CODES:
+            return CODES[field].values[getattr(self, field + '_code')]
+        if field in self._ATTRS:
+            return getattr(self, field)
+        if field == 'discord_id':
+            return str(self.id)
+        if self.extra and field in self.extra:
+            return self.extra[field]
+        raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        if field in CODES:
+            setattr(self, field + '_code', CODES[field].code(value))
+        elif field in self._ATTRS:
+            setattr(self, field, value)
+        elif field == 'discord_id':
+            pass  # Always the player's ID
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[field] = value
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def __contains__(self, field):
+        return field in self.FIELDS or bool(self.extra and field in self.extra)
+
+    def keys(self):
+        return list(self.FIELDS) + list(self.extra or ())
+
+    def items(self):
+        return [(field, self[field]) for field in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, Player):
+            return self.id == other.id and self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    def __repr__(self):
+        return f'Player({self.id}, {self.username!r})'
+
+
+class Team:
+    __slots__ = ('team_name', 'captain_id', 'captain_name', 'members', 'plan', 'extra')
+
+    FIELDS = ('team_name', 'captain_id', 'captain_name', 'members')
+
+    def __init__(self, team_name, captain_id, captain_name, members=(), fields=None):
+        self.team_name = team_name
+        self.captain_id = int(captain_id)
+        self.captain_name = captain_name
+        self.members = [int(member_id) for member_id in members]
+        self.plan = None
+        self.extra = None
+        for field, value in (fields or {}).items():
+            self[field] = value
+
+    @classmethod
+    def from_dict(cls, team_name, data):
+        data = dict(data)
+        return cls(data.pop('team_name', team_name), data.pop('captain_id', 0), data.pop('captain_name', ''),
+                   data.pop('members', ()), data)
+
+    def __getitem__(self, field):
+        if field in self.FIELDS or (field == 'plan' and self.plan is not None):
+            return getattr(self, field)
+        if self.extra and field in self.extra:
+            return self.extra[field]
+        raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        if field == 'members':
+            self.members = [int(member_id) for member_id in value]
+        elif field == 'captain_id':
+            self.captain_id = int(value)
+        elif field in self.FIELDS or field == 'plan':
+            setattr(self, field, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[field] = value
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def __contains__(self, field):
+        return field in self.FIELDS or (field == 'plan' and self.plan is not None) or bool(self.extra and field in self.extra)
+
+    def keys(self):
+        return list(self.FIELDS) + (['plan'] if self.plan is not None else []) + list(self.extra or ())
+
+    def items(self):
+        return [(field, self[field]) for field in self.keys()]
+
+    def to_dict(self):
+        data = dict(self.items())
+        data['members'] = list(self.members)
+        return data
+
+    def __eq__(self, other):
+        if isinstance(other, Team):
+            return self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    def __repr__(self):
+        return f'Team({self.team_name!r}, {len(self.members)} members)'
+
+
+def adopt(db):
+    # Turns freshly loaded players and teams (plain JSON dicts) into records, in place
+    if 'players' in db:
+        db['players'] = {int(player_id): player if isinstance(player, Player) else Player.from_dict(player_id, player)
+                         for player_id, player in db['players'].items()}
+    if 'teams' in db:
+        db['teams'] = {team_name: team if isinstance(team, Team) else Team.from_dict(team_name, team)
+                       for team_name, team in db['teams'].items()}
+    return db
+
+
+def to_json(value):
+    # json.dump(..., default=to_json) writes records in the on-disk format
+    if isinstance(value, (Player, Team)):
+        return value.to_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
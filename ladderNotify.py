@@ -0,0 +1,127 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+
+## NOTIFICATIONS
+# Commands hand DMs to the dispatcher and answer the interaction straight away;
+# a few background workers deliver them. Identical messages to the same user that
+# are still queued are coalesced, each DM route (one per recipient) backs off on its
+# own when Discord rate-limits it, failures are retried with exponential backoff,
+# and anything that still can't be delivered ends up in a bounded dead-letter list.
+
+NOTIFY_WORKERS = 4
+NOTIFY_QUEUE_SIZE = 5000
+NOTIFY_MAX_ATTEMPTS = 4
+NOTIFY_BACKOFF = 1.0        # seconds before the first retry, doubled each time
+DEAD_LETTER_SIZE = 500
+
+
+class Notification:
+    __slots__ = ('target', 'content', 'attempts')
+
+    def __init__(self, target, content):
+        self.target = target
+        self.content = content
+        self.attempts = 0
+
+
+class NotificationDispatcher:
+    def __init__(self, workers=NOTIFY_WORKERS, queue_size=NOTIFY_QUEUE_SIZE, max_attempts=NOTIFY_MAX_ATTEMPTS,
+                 backoff=NOTIFY_BACKOFF, dead_letter_size=DEAD_LETTER_SIZE):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dead_letters = deque(maxlen=dead_letter_size)
+        self.stats = {'queued': 0, 'sent': 0, 'coalesced': 0, 'retried': 0, 'rate_limited': 0, 'dead': 0}
+        self._pending = {}          # (recipient id, content) -> Notification, while queued or retrying
+        self._route_until = {}      # recipient id -> monotonic time its DM route is usable again
+        self._global_until = 0.0
+        self._tasks = []
+
+    def start(self):
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def notify(self, target, content):
+        # Queue a DM to a user or member; returns False if it was dropped
+        if target is None:
+            return False
+        key = (target.id, content)
+        if key in self._pending:
+            self.stats['coalesced'] += 1
+            return True
+        notification = Notification(target, content)
+        if not self._enqueue(notification):
+            return False
+        self._pending[key] = notification
+        self.stats['queued'] += 1
+        return True
+
+    def _enqueue(self, notification):
+        try:
+            self.queue.put_nowait(notification)
+            return True
+        except asyncio.QueueFull:
+            self._dead(notification, 'queue full')
+            return False
+
+    async def _worker(self):
+        while True:
+            notification = await self.queue.get()
+            try:
+                await self._deliver(notification)
+            except Exception as e:
+                # Never let one bad notification kill the worker
+                self._dead(notification, f'unexpected error: {e}')
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, notification):
+        route = notification.target.id
+        wait = max(self._route_until.get(route, 0.0), self._global_until) - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        notification.attempts += 1
+        try:
+            await notification.target.send(notification.content)
+        except Exception as e:
+            status = getattr(e, 'status', None)
+            if status == 403:
+                self._dead(notification, 'DMs disabled')  # Retrying won't help
+                return
+            if status == 429:
+                self.stats['rate_limited'] += 1
+                retry_after = getattr(e, 'retry_after', None) or self.backoff
+                until = time.monotonic() + retry_after
+                if getattr(e, 'is_global', False):
+                    self._global_until = max(self._global_until, until)
+                else:
+                    self._route_until[route] = max(self._route_until.get(route, 0.0), until)
+                self._retry(notification, retry_after, e)
+            else:
+                self._retry(notification, self.backoff * 2 ** (notification.attempts - 1), e)
+            return
+
+        self._route_until.pop(route, None)
+        self._pending.pop((route, notification.content), None)
+        self.stats['sent'] += 1
+
+    def _retry(self, notification, delay, error):
+        if notification.attempts >= self.max_attempts:
+            self._dead(notification, f'gave up after {notification.attempts} attempts: {error}')
+            return
+        self.stats['retried'] += 1
+        delay *= 1 + random.random() * 0.1  # Jitter so retries don't land together
+        asyncio.get_running_loop().call_later(delay, self._enqueue, notification)
+
+    def _dead(self, notification, reason):
+        self._pending.pop((notification.target.id, notification.content), None)
+        self.dead_letters.append((notification.target.id, notification.content, reason))
+        self.stats['dead'] += 1
+        print(f'Notification to {notification.target.id} dropped ({reason})')
@@ -0,0 +1,151 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import time
+
+
+## PERFORMANCE HISTOGRAMS
+# Every slash command, routed component and ui callback runs inside a span. The
+# store and the Discord HTTP layers add the time they take to the current span's
+# phases, so each handler's latency is split into:
+#   storage_read   DataStore.load / archived reads
+#   storage_write  DataStore.apply and flushes (journal append, rows, files)
+#   api_send       REST calls to Discord: responses, followups, messages, fetches
+#   compute        everything else
+# Spans end in fixed-bucket histograms per (handler, phase), cheap enough to stay on
+# in production. summary() feeds /perf; prometheus() is the text exposition format.
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+PHASES = ('storage_read', 'storage_write', 'api_send')
+
+_span = contextvars.ContextVar('perf_span', default=None)
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else float('inf')
+        return float('inf')
+
+
+class Span:
+    __slots__ = ('name', 'start', 'phases')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+
+class Perf:
+    def __init__(self):
+        self.histograms = {}  # (handler, phase) -> Histogram
+        self.errors = {}      # handler -> count of spans that raised
+        self._stats = []      # () -> {name: number}, extra counters for the dump
+
+    def histogram(self, handler, phase):
+        key = (handler, phase)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        return self.histograms[key]
+
+    @contextlib.asynccontextmanager
+    async def span(self, name):
+        span = Span(name)
+        token = _span.set(span)
+        try:
+            yield span
+        except BaseException:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        finally:
+            _span.reset(token)
+            total = time.perf_counter() - span.start
+            self.histogram(name, 'total').observe(total)
+            for phase, seconds in span.phases.items():
+                self.histogram(name, phase).observe(seconds)
+            self.histogram(name, 'compute').observe(max(0.0, total - sum(span.phases.values())))
+
+    def timed(self, name):
+        # Decorator for ui callbacks: the whole call is one span
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                async with self.span(name):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        # Adds the block's time to the current span; free outside one
+        span = _span.get()
+        if span is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            span.phases[phase] += time.perf_counter() - start
+
+    def add_stats(self, source):
+        self._stats.append(source)
+
+    def stats(self):
+        values = {}
+        for source in self._stats:
+            values.update(source())
+        return values
+
+    def summary(self, limit=15):
+        # (handler, count, p50, p95, p99, mean seconds per phase) for the busiest handlers
+        rows = []
+        for (handler, phase), histogram in self.histograms.items():
+            if phase != 'total':
+                continue
+            means = {name: self.histograms[handler, name].sum / histogram.count for name in PHASES + ('compute',)}
+            rows.append((handler, histogram.count, histogram.quantile(0.5), histogram.quantile(0.95), histogram.quantile(0.99), means))
+        rows.sort(key=lambda row: -row[1])
+        return rows[:limit]
+
+    def prometheus(self):
+        lines = ['# HELP ladder_handler_seconds Handler latency by phase',
+                 '# TYPE ladder_handler_seconds histogram']
+        for (handler, phase), histogram in sorted(self.histograms.items()):
+            labels = f'handler="{handler}",phase="{phase}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'ladder_handler_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'ladder_handler_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+            lines.append(f'ladder_handler_seconds_count{{{labels}}} {histogram.count}')
+        lines += ['# HELP ladder_handler_errors_total Handler runs that raised',
+                  '# TYPE ladder_handler_errors_total counter']
+        lines += [f'ladder_handler_errors_total{{handler="{handler}"}} {count}' for handler, count in sorted(self.errors.items())]
+        lines += ['# HELP ladder_stat Counters and sizes from the bot\'s caches and queues',
+                  '# TYPE ladder_stat gauge']
+        lines += [f'ladder_stat{{name="{name}"}} {value}' for name, value in sorted(self.stats().items())]
+        return '\n'.join(lines) + '\n'
+
+
+perf = Perf()
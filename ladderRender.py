@@ -0,0 +1,116 @@
+from collections import OrderedDict
+
+
+## RENDER CACHE
+# Rendered tables (list_players, list_teams / the Show Teams button) keyed on the
+# versions of the data they were built from plus the flags they were built with.
+# A key only changes when one of those collections changes, so repeated requests
+# for the same view are a dict lookup instead of a rebuild.
+
+RENDER_CACHE_SIZE = 64
+
+class RenderCache:
+    def __init__(self, max_entries=RENDER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        value = render()
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)  # Oldest entries are for data versions that are gone
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+
+## TABLE FORMATS
+
+PLAYER_ROW = "| {:<15} | {:<5} | {:<5} | {:<10} | {:<10} | {:<3} | {:<3} | {:<12} |"
+PLAYER_TITLE_ROW = "| {:<15} | {:<5} | {:<5} | {:<10} | {:<10} | {:<3} | {:<3} | {:<10} |".format(
+    "Name", "Class", "Build", "Serious", "Team", "Exp", "Loc", "Availability"
+)
+PLAYER_SEPARATOR = "+{:-<17}+{:-<7}+{:-<7}+{:-<12}+{:-<12}+{:-<5}+{:-<5}+{:-<14}+".format('', '', '', '', '', '', '', '')
+TEAM_SEPARATOR = "-" * 60
+
+def player_row(name, player_info, team_name):
+    return PLAYER_ROW.format(
+        name,
+        player_info.get('class', 'N/A'),
+        player_info.get('build', 'N/A'),
+        player_info.get('seriousness', 'N/A'),
+        team_name,
+        'Yes' if player_info.get('experience') else 'No',
+        player_info.get('timezone', 'N/A'),
+        player_info.get('availability', 'N/A')
+    )
+
+
+## PAGINATION
+# Tables are cut into pages that fit in one Discord message. A PagedTable holds the
+# pre-sorted row keys and renders a page only when it is asked for; rendered pages
+# are kept, so paging back and forth (or several users paging the same cached
+# table) costs nothing after the first view.
+
+MESSAGE_LIMIT = 2000
+
+class PagedTable:
+    def __init__(self, keys, render_row, header=(), footer=(), limit=MESSAGE_LIMIT):
+        self.keys = keys                # row keys, already in display order
+        self.render_row = render_row    # key -> list of lines
+        self.header = list(header)
+        self.footer = list(footer)
+        self.budget = limit - len("```\n```") - sum(len(line) + 1 for line in self.header + self.footer) - len("Page 999/999")
+        self._starts = [0]              # index in keys where each page starts
+        self._pages = {}
+
+    def page(self, number):
+        # Returns the page text, or None past the last page. Pages are packed
+        # greedily, so page N needs where page N-1 ended.
+        if number < 0:
+            return None
+        while len(self._starts) <= number:
+            if not self._build(len(self._starts) - 1):
+                return None
+        if number not in self._pages and not self._build(number):
+            return None
+        return self._pages[number]
+
+    def _build(self, number):
+        start = self._starts[number]
+        if start >= len(self.keys) and not (number == 0 and not self.keys):
+            return False
+        lines, used, end = [], 0, start
+        while end < len(self.keys):
+            row = "\n".join(self.render_row(self.keys[end]))
+            if len(row) > self.budget:
+                row = row[:self.budget - 1] + "…"
+            if lines and used + len(row) + 1 > self.budget:
+                break
+            lines.append(row)
+            used += len(row) + 1
+            end += 1
+        self._pages[number] = "```" + "\n".join(self.header + lines + self.footer) + "```"
+        if len(self._starts) == number + 1:
+            self._starts.append(end)
+        return True
+
+    def has_next(self, number):
+        return self.page(number + 1) is not None
+
+    def pages(self):
+        number = 0
+        while True:
+            text = self.page(number)
+            if text is None:
+                return
+            yield text
+            number += 1
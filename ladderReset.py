@@ -1,9 +1,32 @@
+from ladderStartup import ReadinessGate, StartupTimer
+startup = StartupTimer()  # Phase timings from here until the bot is serving commands
+
 import discord
 from discord.ext import commands
 from discord.utils import get
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
 import asyncio
-import json
+import io
 import os
+import sys
+import traceback
+
+from ladderBackends import JsonBackend, SqliteBackend, migrate_json_to_sqlite
+from ladderBuilds import BuildCatalog
+from ladderCodecs import get_codec
+from ladderComps import format_comp_spec, parse_comp_spec
+from ladderIndexes import PlayerSortIndexes
+from ladderJobs import JobRunner
+from ladderMatching import MatchIndex, assign_roles, expand_roles
+from ladderMatchmaker import matchmake, summarize
+from ladderMembers import DMTarget, MemberNames
+from ladderNotify import NotificationDispatcher
+from ladderPerf import perf
+from ladderRender import PLAYER_ROW, PLAYER_SEPARATOR, PLAYER_TITLE_ROW, TEAM_SEPARATOR, PagedTable, RenderCache, player_row
+from ladderRoutes import Router, custom_id
+from ladderSeasons import SeasonManager
+from ladderSessions import REGISTRATION_STEPS, RegistrationSessions
+from ladderStore import DataStore, load_data
 
 intents = discord.Intents.default()
 intents.messages = True
@@ -11,80 +34,230 @@ intents.members = True
 intents.guilds = True
 intents.reactions = True
 
-bot = discord.Bot(intents=intents)
+# Slash commands run inside a perf span (see ladderPerf.py), and every REST call to
+# Discord counts as api_send time: bot.http for messages and fetches, the webhook
+# adapter for interaction responses and followups
+class LadderBot(discord.Bot):
+    def __init__(self, **options):
+        super().__init__(**options)
+        request = self.http.request
+
+        async def timed_request(*args, **kwargs):
+            with perf.phase('api_send'):
+                return await request(*args, **kwargs)
+        self.http.request = timed_request
 
-# Helper functions to read/write JSON data
-def load_data(file_path):
-    if not os.path.exists(file_path):
-        return {}
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    async def invoke_application_command(self, ctx):
+        async with perf.span(f'command:{ctx.command.qualified_name}'):
+            await super().invoke_application_command(ctx)
 
-def save_data(file_path, data):
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=4)
+class TimedWebhookAdapter(AsyncWebhookAdapter):
+    async def request(self, *args, **kwargs):
+        with perf.phase('api_send'):
+            return await super().request(*args, **kwargs)
 
+async_context.set(TimedWebhookAdapter())
+
+bot = LadderBot(intents=intents)
 
 # Data storage files
 DATA_DIR = 'data/ladderReset'
-if not os.path.exists(DATA_DIR):    # Ensure data directory exists
-    os.makedirs(DATA_DIR)
-    
+
 PLAYERS_FILE = os.path.join(DATA_DIR, 'players.json')
 TEAMS_FILE = os.path.join(DATA_DIR, 'teams.json')
 TEAM_COMPS_FILE = os.path.join(DATA_DIR, 'team_compositions.json')
 APPLICATIONS_FILE = os.path.join(DATA_DIR, 'applications.json')
 INVITATIONS_FILE = os.path.join(DATA_DIR, 'invitations.json')
+SEQUENCES_FILE = os.path.join(DATA_DIR, 'sequences.json')
+JOURNAL_FILE = os.path.join(DATA_DIR, 'journal.jsonl')
+DB_FILE = os.path.join(DATA_DIR, 'ladder.db')
 BUILDS_FILE = os.path.join(DATA_DIR, 'builds.json')
 
-build_data = load_data(BUILDS_FILE)
-secret = load_data('secret.json')
+# Classes and builds, compiled to IDs and select options; picks up edits to builds.json.
+# Compiled by load_ladder_data() after the bot connects.
+build_catalog = BuildCatalog(BUILDS_FILE, make_option=discord.SelectOption, load=False)
+
+def builds():
+    build_catalog.reload_if_changed()
+    return build_catalog
+
+DATA_FILES = {
+    'players': PLAYERS_FILE,
+    'teams': TEAMS_FILE,
+    'team_comps': TEAM_COMPS_FILE,
+    'applications': APPLICATIONS_FILE,
+    'invitations': INVITATIONS_FILE,
+    'sequences': SEQUENCES_FILE,
+}
+
+# Storage backend: 'json' (data files + journal) or 'sqlite' (one database, written row by row)
+STORAGE_BACKEND = os.environ.get('LADDER_STORAGE', 'json')
+
+# Format of the JSON data files: 'pretty', 'compact' or 'fast' (compact, via orjson if installed)
+JSON_CODEC = get_codec(os.environ.get('LADDER_JSON_CODEC', 'pretty'))
+
+def make_backend():
+    if STORAGE_BACKEND == 'sqlite':
+        if not os.path.exists(DB_FILE):
+            migrate_json_to_sqlite(DATA_FILES, JOURNAL_FILE, DB_FILE)  # One-shot import of the existing JSON data
+        return SqliteBackend(DB_FILE)
+    return JsonBackend(DATA_FILES, JOURNAL_FILE, codec=JSON_CODEC)
+
+# The data directory holds only the active season; past ones are packed under seasons/
+seasons = SeasonManager(DATA_DIR)
+
+# Resident copy of the ladder data, loaded once (see load_ladder_data) and flushed in the background
+store = DataStore(DATA_FILES, None)
+
+# Player indexes for suggest_autofill, kept current as players register and update
+match_index = MatchIndex(build_catalog)
+store.subscribe(match_index.on_change)
+build_catalog.subscribe(lambda catalog: match_index.rebuild(store.load(PLAYERS_FILE)))  # Catalog IDs change on reload
+
+# Sorted player orderings for list_players sort_by, kept current the same way
+player_sort = PlayerSortIndexes(store.team_of)
+store.subscribe(player_sort.on_change)
+
+# Background DM delivery so commands never wait on Discord for notifications
+notifier = NotificationDispatcher(workers=int(os.environ.get('LADDER_NOTIFY_WORKERS', 4)))
+
+# Rendered list_players / list_teams tables, keyed on data version and flags
+render_cache = RenderCache()
+
+# Player names for tables and embeds, resolved in batches and kept current from gateway events
+member_names = MemberNames()
+
+# Cache and queue counters for /perf and the Prometheus dump
+perf.add_stats(lambda: dict(
+    render_cache_hits=render_cache.hits,
+    render_cache_misses=render_cache.misses,
+    notify_queue=notifier.queue.qsize(),
+    member_names=len(member_names),
+    **{f'notify_{name}': value for name, value in notifier.stats.items()},
+    **{f'member_names_{name}': value for name, value in member_names.stats.items()},
+))
+
+# Long-running commands: deferred, computed on a small pool, then the response is edited
+jobs = JobRunner(workers=int(os.environ.get('LADDER_JOB_WORKERS', 2)))
+perf.add_stats(lambda: dict(
+    jobs_active=len(jobs.active),
+    **{f'jobs_{name}': value for name, value in jobs.stats.items()},
+))
+
+def dm_target(guild, user_id):
+    # The cached member, or a stand-in that looks the user up when the DM is sent
+    return guild.get_member(int(user_id)) or DMTarget(bot, user_id)
+
+# Register wizard answers are held per user and written as one player record
+def commit_registration(player_id, username, fields):
+    store.apply('register', player_id=player_id, username=username, fields=fields)
+
+registrations = RegistrationSessions(commit_registration)
+perf.add_stats(lambda: dict(
+    registrations_started=registrations.stats['started'],
+    registrations_completed=registrations.stats['completed'],
+    **{f'registrations_abandoned_{step}': count for step, count in registrations.stats['abandoned'].items()},
+))
+
+def register_step(user, field, value):
+    # Records one wizard answer. Without a live draft (it expired, or the bot restarted
+    # since the select was sent) a new one picks up from what is already saved.
+    if registrations.set(user.id, field, value):
+        return
+    player = store.load(PLAYERS_FILE).get(user.id, {})
+    registrations.start(user.id, user.name, {step: player[step] for step in REGISTRATION_STEPS if player.get(step)})
+    registrations.set(user.id, field, value)
+
+# Handlers for the components the bot sends, looked up by custom_id
+router = Router()
+
+# Commands and components wait here until the data below has loaded
+data_ready = ReadinessGate()
+data_loader = None      # The start_ladder() task, started on the first gateway connect
+connect_started = 0.0   # When bot.run() was called, for the startup report
+
+def load_ladder_data():
+    # Everything that reads the data directory; runs in a worker thread once the bot
+    # has connected. Subscribers above rebuild their indexes as each part loads.
+    with startup.phase('data dir'):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        seasons.load()
+        seasons.recover()  # Finish a rollover a crash interrupted
+    with startup.phase('store'):
+        store.reopen(make_backend())  # Last snapshot plus any journaled changes since
+    with startup.phase('build catalog'):
+        build_catalog.reload_if_changed(force=True)
+
+async def start_ladder():
+    try:
+        with startup.phase('load data (thread)'):
+            await asyncio.to_thread(load_ladder_data)
+    except Exception:
+        await bot.close()  # Serving commands on half-loaded data would be worse than not starting
+        raise
+    data_ready.open()
+    store.start_flusher()  # Persist data changes in the background
+    registrations.start_sweeper()  # Save registrations left unfinished
+    report_startup()
+    for season in seasons.uncompressed():  # Seasons closed right before a restart
+        await asyncio.to_thread(seasons.compress, season)
+
+def report_startup():
+    # Once both the gateway session and the data are ready, whichever comes last
+    if bot.is_ready() and data_ready.is_ready():
+        report = startup.finish()
+        if report:
+            print(report)
+
+async def not_ready(interaction):
+    # Waits briefly for the data to load; if it hasn't, says so and returns True
+    if await data_ready.wait():
+        return False
+    await interaction.response.send_message("The bot is still starting up, try again in a few seconds.", ephemeral=True)
+    return True
 
 ## REGISTER SELECTS ##
 
 class ClassSelect(discord.ui.Select):
     def __init__(self):
         print('Init Class Select')
-        options = [
-            discord.SelectOption(label=class_name, description=f"{class_name} class") 
-            for class_name in build_data['classes'].keys()
-        ]
-        super().__init__(placeholder="Choose your class...", options=options, min_values=1, max_values=1)
-
-    async def callback(self, interaction: discord.Interaction):
-        user_data = load_data(PLAYERS_FILE)
-        player_id = str(interaction.user.id)
+        options = list(builds().class_options)  # Built once per catalog load
+        super().__init__(placeholder="Choose your class...", options=options, min_values=1, max_values=1, custom_id=custom_id('register_class'))
+
+@router.route('register_class')
+async def class_selected(interaction):
+    selected = interaction.data['values'][0]
+    catalog = builds()
+    class_id = catalog.class_id(selected)
+    if class_id is None or not catalog.build_options[class_id]:
+        # builds.json was reloaded since the class list was sent
+        await interaction.response.send_message(f"The class {selected} is no longer available. Please restart registration.", ephemeral=True)
+        return
+    view = BuildSelectView(selected)  # Built now, from the catalog just checked
 
-        # Update only the class field
-        if player_id in user_data:
-            user_data[player_id]['class'] = self.values[0]
-            save_data(PLAYERS_FILE, user_data)
+    # Held in the registration draft until the last step
+    register_step(interaction.user, 'class', selected)
 
-        # Send a follow-up message
-        await interaction.response.send_message(f"Class selected: {self.values[0]}. Now select your build.", ephemeral=True)
+    # Send a follow-up message
+    await interaction.response.send_message(f"Class selected: {selected}. Now select your build.", ephemeral=True)
 
-        # Follow-up: Build selection dropdown
-        await interaction.followup.send(embed=discord.Embed(title="Build Selection"), view=BuildSelectView(self.values[0]), ephemeral=True)
+    # Follow-up: Build selection dropdown
+    await interaction.followup.send(embed=discord.Embed(title="Build Selection"), view=view, ephemeral=True)
 
 class BuildSelect(discord.ui.Select):
     def __init__(self, selected_class):
-        options = [
-            discord.SelectOption(label=build, description=f"{build} build")
-            for build in build_data['classes'][selected_class]
-        ]
-        super().__init__(placeholder="Choose your build...", options=options, min_values=1, max_values=1)
-
-    async def callback(self, interaction: discord.Interaction):
-        user_data = load_data(PLAYERS_FILE)
-        player_id = str(interaction.user.id)
+        catalog = builds()
+        class_id = catalog.class_id(selected_class)
+        options = list(catalog.build_options[class_id]) if class_id is not None else []  # class_selected checks it resolves
+        super().__init__(placeholder="Choose your build...", options=options, min_values=1, max_values=1, custom_id=custom_id('register_build'))
 
-        # Update only the build field
-        if player_id in user_data:
-            user_data[player_id]['build'] = self.values[0]
-            save_data(PLAYERS_FILE, user_data)
+@router.route('register_build')
+async def build_selected(interaction):
+    selected = interaction.data['values'][0]
+    register_step(interaction.user, 'build', selected)
 
-        await interaction.response.send_message(f"Build selected: {self.values[0]}. Now select your seriousness level.", ephemeral=True)
-        await interaction.followup.send(embed=discord.Embed(title="Seriousness Level"), view=SeriousnessSelectView(), ephemeral=True)
+    await interaction.response.send_message(f"Build selected: {selected}. Now select your seriousness level.", ephemeral=True)
+    await interaction.followup.send(embed=discord.Embed(title="Seriousness Level"), view=SeriousnessSelectView(), ephemeral=True)
 
 class SeriousnessSelect(discord.ui.Select):
     def __init__(self):
@@ -94,19 +267,15 @@ class SeriousnessSelect(discord.ui.Select):
             discord.SelectOption(label="Serious", description="I like to win, but it's not everything"),
             discord.SelectOption(label="RaceTo99", description="All in, ladder reset is serious business!"),
         ]
-        super().__init__(placeholder="Choose your seriousness level...", options=options, min_values=1, max_values=1)
+        super().__init__(placeholder="Choose your seriousness level...", options=options, min_values=1, max_values=1, custom_id=custom_id('register_seriousness'))
 
-    async def callback(self, interaction: discord.Interaction):
-        user_data = load_data(PLAYERS_FILE)
-        player_id = str(interaction.user.id)
+@router.route('register_seriousness')
+async def seriousness_selected(interaction):
+    selected = interaction.data['values'][0]
+    register_step(interaction.user, 'seriousness', selected)
 
-        # Update only the seriousness field
-        if player_id in user_data:
-            user_data[player_id]['seriousness'] = self.values[0]
-            save_data(PLAYERS_FILE, user_data)
-            
-        await interaction.response.send_message(f"Seriousness level: {self.values[0]}. Now select your timezone", ephemeral=True)
-        await interaction.followup.send(embed=discord.Embed(title="Timezone"), view=TimezoneSelectView(), ephemeral=True)
+    await interaction.response.send_message(f"Seriousness level: {selected}. Now select your timezone", ephemeral=True)
+    await interaction.followup.send(embed=discord.Embed(title="Timezone"), view=TimezoneSelectView(), ephemeral=True)
 
 class TimezoneSelect(discord.ui.Select):
     def __init__(self):
@@ -122,149 +291,69 @@ class TimezoneSelect(discord.ui.Select):
             discord.SelectOption(label="JST", description="Japan Standard"),
             discord.SelectOption(label="CHS", description="China Standard")
         ]
-        super().__init__(placeholder="Choose your timezone... (Or closest one)", options=options, min_values=1, max_values=1)
-
-    async def callback(self, interaction: discord.Interaction):
-        user_data = load_data(PLAYERS_FILE)
-        player_id = str(interaction.user.id)
-
-        # Update only the seriousness field
-        if player_id in user_data:
-            user_data[player_id]['timezone'] = self.values[0]
-            save_data(PLAYERS_FILE, user_data)
-
-        await interaction.response.send_message(f"Timezone: {self.values[0]}. Thank you for registering!", ephemeral=True)
-
-
-
-# Team Comp Selects
-class TeamCompClassSelect(discord.ui.Select):
-    def __init__(self, role_index, team_name, num_roles, ctx):
-        self.role_index = role_index
-        self.team_name = team_name
-        self.num_roles = num_roles
-        self.ctx = ctx  # Add ctx here to pass it along for use in callbacks
-        options = [
-            discord.SelectOption(label=class_name, description=f"{class_name} class") 
-            for class_name in build_data['classes'].keys()
-        ]
-        super().__init__(placeholder=f"Choose class for Role {role_index}", options=options, min_values=1, max_values=1)
-
-    async def callback(self, interaction: discord.Interaction):
-        # Load team composition data and update the role class
-        team_comps_data = load_data(TEAM_COMPS_FILE)
-        if self.team_name not in team_comps_data:
-            team_comps_data[self.team_name] = {'team_id': self.team_name, 'roles': []}
-
-        if len(team_comps_data[self.team_name]['roles']) < self.role_index:
-            team_comps_data[self.team_name]['roles'].append({'class': self.values[0]})
-        else:
-            team_comps_data[self.team_name]['roles'][self.role_index - 1]['class'] = self.values[0]
-
-        save_data(TEAM_COMPS_FILE, team_comps_data)
+        super().__init__(placeholder="Choose your timezone... (Or closest one)", options=options, min_values=1, max_values=1, custom_id=custom_id('register_timezone'))
 
-        # Send message and proceed to the build selection
-        await interaction.response.send_message(f"Class for Role {self.role_index} set to: {self.values[0]}. Now select the build.", ephemeral=True)
-        await interaction.followup.send(embed=discord.Embed(title="Build Selection"), view=TeamCompBuildSelectView(self.role_index, self.team_name, self.num_roles, self.ctx), ephemeral=True)
+@router.route('register_timezone')
+async def timezone_selected(interaction):
+    selected = interaction.data['values'][0]
+    register_step(interaction.user, 'timezone', selected)
 
-class TeamCompBuildSelect(discord.ui.Select):
-    def __init__(self, role_index, team_name, num_roles, ctx):
-        self.role_index = role_index
-        self.team_name = team_name
-        self.num_roles = num_roles
-        self.ctx = ctx  # Pass ctx for subsequent steps
-
-        # Load builds based on the previously selected class for this role
-        team_comps_data = load_data(TEAM_COMPS_FILE)
-        selected_class = team_comps_data[self.team_name]['roles'][self.role_index - 1]['class']
-
-        options = [
-            discord.SelectOption(label=build, description=f"{build} build") 
-            for build in build_data['classes'][selected_class]
-        ]
-        super().__init__(placeholder=f"Choose build for Role {role_index}", options=options, min_values=1, max_values=1)
-
-    async def callback(self, interaction: discord.Interaction):
-        # Load team composition data and update the build
-        team_comps_data = load_data(TEAM_COMPS_FILE)
-        team_comps_data[self.team_name]['roles'][self.role_index - 1]['build'] = self.values[0]
-        save_data(TEAM_COMPS_FILE, team_comps_data)
+    await interaction.response.send_message(f"Timezone: {selected}. Thank you for registering!", ephemeral=True)
 
-        await interaction.response.send_message(f"Build for Role {self.role_index} set to: {self.values[0]}. Now select the seriousness level.", ephemeral=True)
-
-        # Proceed to seriousness selection
-        await interaction.followup.send(view=TeamCompSeriousnessSelectView(self.role_index, self.team_name, self.num_roles, self.ctx), ephemeral=True)
-
-class TeamCompSeriousnessSelect(discord.ui.Select):
-    def __init__(self, role_index, team_name, num_roles, ctx):
-        self.role_index = role_index
-        self.team_name = team_name
-        self.num_roles = num_roles
-        self.ctx = ctx
-        options = [
-            discord.SelectOption(label="Casual", description="Just here to have fun"),
-            discord.SelectOption(label="Serious", description="I like to win, but it's not everything"),
-            discord.SelectOption(label="Hardcore", description="All in, ladder reset is serious business!"),
-        ]
-        super().__init__(placeholder=f"Choose seriousness for Role {role_index}", options=options, min_values=1, max_values=1)
-
-    async def callback(self, interaction: discord.Interaction):
-        # Load team composition data and update the seriousness level
-        team_comps_data = load_data(TEAM_COMPS_FILE)
-        team_comps_data[self.team_name]['roles'][self.role_index - 1]['seriousness'] = self.values[0]
-        save_data(TEAM_COMPS_FILE, team_comps_data)
-
-        await interaction.response.send_message(f"Seriousness for Role {self.role_index} set to: {self.values[0]}.", ephemeral=True)
-
-        # Check if we need to move to the next role or complete the process
-        if self.role_index < self.num_roles:
-            # Proceed to the next role selection
-            await start_role_selection(self.ctx, self.team_name, self.role_index, self.num_roles)
-        else:
-            # All roles have been completed
-            await interaction.followup.send(f"Team composition for {self.team_name} has been completed.", ephemeral=True)
 
 
 ## CLASS VIEWS
+# Layout only: store=False keeps py-cord from holding a view object per sent
+# message, the router handles the components instead.
 
 class ClassSelectView(discord.ui.View):
     def __init__(self):
-        super().__init__()
+        super().__init__(timeout=None, store=False)
         self.add_item(ClassSelect())
 
 class BuildSelectView(discord.ui.View):
     def __init__(self, selected_class):
-        super().__init__()
+        super().__init__(timeout=None, store=False)
         self.add_item(BuildSelect(selected_class))  # Pass the selected class to BuildSelect
 
 class SeriousnessSelectView(discord.ui.View):
     def __init__(self):
-        super().__init__()
+        super().__init__(timeout=None, store=False)
         self.add_item(SeriousnessSelect())
 
 class TimezoneSelectView(discord.ui.View):
     def __init__(self):
-        super().__init__()
+        super().__init__(timeout=None, store=False)
         self.add_item(TimezoneSelect())
 
-## TEAM VIEWS
-
-class TeamCompClassSelectView(discord.ui.View):
-    def __init__(self, role_index, team_name, num_roles, ctx):
-        super().__init__()
-        self.add_item(TeamCompClassSelect(role_index, team_name, num_roles, ctx))
-class TeamCompBuildSelectView(discord.ui.View):
-    def __init__(self, role_index, team_name, num_roles, ctx):
-        super().__init__()
-        self.add_item(TeamCompBuildSelect(role_index, team_name, num_roles, ctx))
-class TeamCompSeriousnessSelectView(discord.ui.View):
-    def __init__(self, role_index, team_name, num_roles, ctx):
-        super().__init__()
-        self.add_item(TeamCompSeriousnessSelect(role_index, team_name, num_roles, ctx))
-#class TeamCompTimezoneSelectView(discord.ui.View):
-#    def __init__(self):
-#        super().__init__()
-#        self.add_item(TeamCompTimezoneSelect())
+## TEAM COMP MODAL
+
+# Single-message composition editor: the whole comp as spec text (see ladderComps.py),
+# prefilled with the current one, validated and stored in one write on submit
+class TeamCompModal(discord.ui.Modal):
+    def __init__(self, team_name, spec=''):
+        super().__init__(title=f"Team Composition: {team_name}"[:45])
+        self.team_name = team_name
+        self.add_item(discord.ui.InputText(label="Roles: Class / Build / Seriousness xN", style=discord.InputTextStyle.long,
+                                           value=spec or None, placeholder="Sorceress / Blizzard / Serious\nPaladin / Hdin / Casual x2", max_length=1000))
+
+    @perf.timed('modal:team_comp')
+    async def callback(self, interaction: discord.Interaction):
+        await save_team_comp(interaction.response.send_message, interaction.user, self.team_name, self.children[0].value)
+
+async def save_team_comp(send, user, team_name, spec):
+    try:
+        roles = parse_comp_spec(spec, builds())
+    except ValueError as e:
+        await send(f"Team composition not saved:\n{e}", ephemeral=True)
+        return
+    async with store.locked(('team', team_name)):
+        team = store.load(TEAMS_FILE).get(team_name)
+        if team is None or team['captain_id'] != user.id:
+            await send("You are not the captain of this team.", ephemeral=True)
+            return
+        store.apply('set_team_comp', team_name=team_name, roles=roles)
+    await send(f"Team composition for {team_name} has been set:\n```{format_comp_spec(roles)}```", ephemeral=True)
 
 ## CREATE TEAM MODAL
 
@@ -278,6 +367,7 @@ class CreateTeamModal(discord.ui.Modal):
 
         self.add_item(discord.ui.InputText(label="Do you want to join the team? (yes/no)", placeholder="yes/no", min_length=2, max_length=3))
 
+    @perf.timed('modal:create_team')
     async def callback(self, interaction: discord.Interaction):
         team_name = self.children[0].value  # Get the team name input
         join_decision = self.children[1].value
@@ -298,13 +388,160 @@ class CreateTeamModal(discord.ui.Modal):
 
 
         
+## PAGED TABLES
+
+# Tables that can be paged, by name: guild, *custom_id args -> PagedTable
+PAGED_TABLES = {
+    'players': lambda guild, sort_by: get_players_table(guild, sort_by or None),
+    'teams': lambda guild, show_members, show_member_info: getTeamsList(show_members == '1', show_member_info == '1'),
+}
+
+# Prev/Next buttons over a PagedTable. The buttons carry the table, its flags and
+# the page they lead to, and every click looks up the current table, so a page turn
+# after the data changed (or after a restart) shows the new data.
+class PageView(discord.ui.View):
+    def __init__(self, guild, table, args, number=0, paged=None):
+        super().__init__(timeout=None, store=False)
+        paged = paged or PAGED_TABLES[table](guild, *args)
+        text = paged.page(number)
+        if text is None:  # The table shrank since this page was shown
+            number = 0
+            text = paged.page(0)
+        self.content = f"{text}\nPage {number + 1}"
+        self.single_page = number == 0 and not paged.has_next(0)
+        self.add_item(discord.ui.Button(label="◀ Prev", style=discord.ButtonStyle.secondary,
+                                        custom_id=custom_id('page', table, number - 1, *args), disabled=number == 0))
+        self.add_item(discord.ui.Button(label="Next ▶", style=discord.ButtonStyle.secondary,
+                                        custom_id=custom_id('page', table, number + 1, *args), disabled=not paged.has_next(number)))
+
+async def resolve_table_names(guild, table):
+    # Every name a paged table shows, fetched in one batch before it renders; a
+    # no-op until the players or teams change
+    if table == 'players':
+        await member_names.resolve(guild, store.load(PLAYERS_FILE), stamp=('players', store.version(PLAYERS_FILE)))
+    elif table == 'teams':
+        teams = store.load(TEAMS_FILE)
+        await member_names.resolve(guild, [member_id for team in teams.values() for member_id in team['members']], stamp=('teams', store.version(TEAMS_FILE)))
+
+@router.route('page')
+async def turn_page(interaction, table, number, *args):
+    # Acknowledged first: resolving names can take longer than Discord waits for an answer
+    await interaction.response.defer()
+    await resolve_table_names(interaction.guild, table)
+    view = PageView(interaction.guild, table, args, max(0, int(number)))
+    await interaction.edit_original_response(content=view.content, view=view)
+
+def copied_table(table, args, data, names, order=None):
+    # The PAGED_TABLES table rendered from copies, for a job thread: data from
+    # store.snapshot(), names from member_names.snapshot(), and the players' row
+    # order taken on the loop
+    name_of = lambda user_id, fallback='Unknown': names.get(int(user_id), fallback)
+    players, teams = data[PLAYERS_FILE], data[TEAMS_FILE]
+    if table == 'players':
+        player_teams = {}
+        for team_name, team in teams.items():
+            for member_id in team['members']:
+                player_teams.setdefault(int(member_id), []).append(team_name)
+        return render_players_table(order or list(players), players, lambda player_id: player_teams.get(player_id, ()), name_of)
+    show_members, show_member_info = args
+    return render_teams_list(teams, players, show_members == '1', show_member_info == '1', name_of)
+
+# Sends a paged table either as one message with Prev/Next buttons, or streamed
+# as a sequence of messages, one per page. Names are resolved and the table looked
+# up once the interaction is deferred. A streamed table is rendered whole in a job,
+# from copies of the data; a cancelled stream stops between pages.
+async def send_pages(ctx, table, args, stream=False):
+    paged = names = order = None
+
+    async def prepare():
+        nonlocal paged, names, order
+        await resolve_table_names(ctx.guild, table)
+        if not stream:
+            paged = PAGED_TABLES[table](ctx.guild, *args)
+            return
+        names = member_names.snapshot()
+        if table == 'players' and args[0]:
+            order = player_sort.ordered(args[0])
+
+    def compute(job):
+        paged = copied_table(table, args, store.snapshot(PLAYERS_FILE, TEAMS_FILE), names, order)
+        texts = []
+        for text in paged.pages():
+            job.check()
+            texts.append(text)
+        return texts
+
+    async def deliver(texts):
+        if stream:
+            await ctx.interaction.edit_original_response(content=texts[0])
+            for text in texts[1:]:
+                await ctx.followup.send(text)
+            return
+        view = PageView(ctx.guild, table, args, paged=paged)  # Renders pages 0 and 1 at most
+        # Single page, no buttons needed
+        await ctx.interaction.edit_original_response(content=view.content, view=None if view.single_page else view)
+
+    await jobs.run(ctx, f'{table}_table', compute if stream else None, deliver, prepare=prepare)
+
+
 ## BOT
          
 @bot.event
 async def on_ready():
-    #load_data()  # Ensure that data is loaded from JSON when the bot starts
+    notifier.start()  # Deliver queued DMs
+    bot.add_view(ResetButtons())  # Buttons on every Ladder Season message sent before this start
     #await bot.tree.sync()  # Sync commands with Discord
     print(f'Bot is online as {bot.user}')
+    if startup.finished is None:
+        startup.mark('ready event', since=connect_started)
+        report_startup()
+
+@bot.listen('on_connect')
+async def load_after_connect():
+    # The gateway connection comes up first; data loads while the session finishes starting
+    global data_loader
+    if data_loader is None:  # on_connect fires again on every reconnect
+        startup.mark('login + connect', since=connect_started)
+        data_loader = asyncio.create_task(start_ladder())
+
+# Keep resolved player names current
+@bot.listen('on_member_update')
+async def member_updated(before, after):
+    member_names.on_member_update(before, after)
+
+@bot.listen('on_user_update')
+async def user_updated(before, after):
+    member_names.on_user_update(before, after)
+
+@bot.listen('on_member_join')
+async def member_joined(member):
+    member_names.on_member_join(member)
+
+class DataNotReady(discord.CheckFailure):
+    pass
+
+@bot.check
+async def wait_for_data(ctx):
+    # Global check: no command runs against data that hasn't loaded yet
+    if await not_ready(ctx.interaction):
+        raise DataNotReady()  # The user has been told; dropped quietly below
+    return True
+
+@bot.event
+async def on_application_command_error(ctx, error):
+    # Replaces py-cord's default handler, so other errors are printed the way it did
+    if isinstance(error, DataNotReady):
+        return
+    print(f"Ignoring exception in command {ctx.command}:", file=sys.stderr)
+    traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+
+@bot.listen('on_interaction')
+async def route_interaction(interaction):
+    # Components sent with a routed custom_id (see ladderRoutes.py)
+    if interaction.type == discord.InteractionType.component and router.handles(interaction):
+        if await not_ready(interaction):
+            return
+        await router.dispatch(interaction)
 
 # Custom check for council role
 def is_council():
@@ -318,148 +555,103 @@ def is_council():
 
 @bot.slash_command(name="register", description="Register as a player.")
 async def register(ctx):
-    players_data = load_data(PLAYERS_FILE)
-    player_id = str(ctx.user.id)
-    
     print('Register Command')
-    player_entry = {
-        'discord_id': player_id,   # Store Discord ID
-        'username': ctx.user.name,   # Store Discord Username
-        'class': '',                         # Class to be filled by user
-        'build': '',                         # Build to be filled by user
-        'seriousness': '',                   # Seriousness to be filled by user
-        'timezone': '',                      # Timezone to be filled by user
-        'first_reset': False,                # Default value for first ladder reset
-        'experience': False,                 # Default experience flag
-        'availability': ''                   # Availability to be filled by user
-    }
-
-    players_data[player_id] = player_entry
-    save_data(PLAYERS_FILE, players_data)
+    registrations.start(ctx.user.id, ctx.user.name)
     
     await ctx.respond(embed=discord.Embed(title="Class Selection"), view=ClassSelectView())
     
     
+PLAYER_SORT_FIELDS = ['name', 'class', 'build', 'seriousness', 'team', 'experience', 'timezone', 'availability']
+
+def player_entry(player_id, player_info, teams_of, name_of):
+    return {
+        'name': name_of(player_id, player_info.get('username', 'Unknown')),
+        'class': player_info.get('class', 'N/A'),
+        'build': player_info.get('build', 'N/A'),
+        'seriousness': player_info.get('seriousness', 'N/A'),
+        'team': ', '.join(teams_of(int(player_id))) or "No team",
+        'experience': 'Yes' if player_info.get('experience') else 'No',
+        'timezone': player_info.get('timezone', 'N/A'),
+        'availability': player_info.get('availability', 'N/A')
+    }
+
+def get_players_table(guild, sort_by=None):
+    # Paged table, rebuilt only when players or teams change
+    key = ('players', guild.id, store.version(PLAYERS_FILE, TEAMS_FILE), member_names.version, sort_by)
+    players = store.load(PLAYERS_FILE)
+    # Row order comes straight from the sorted indexes; rows are only rendered for pages that get viewed
+    return render_cache.get(key, lambda: render_players_table(player_sort.ordered(sort_by) if sort_by else list(players),
+                                                              players, store.teams_of, member_names.name))
+
+def render_players_table(player_ids, players, teams_of, name_of):
+    def render_row(player_id):
+        player = player_entry(player_id, players.get(player_id, {}), teams_of, name_of)  # May have left since the order was taken
+        return [PLAYER_ROW.format(player['name'], player['class'], player['build'], player['seriousness'], player['team'], player['experience'], player['timezone'], player['availability'])]
+
+    return PagedTable(player_ids, render_row, header=[PLAYER_SEPARATOR, PLAYER_TITLE_ROW, PLAYER_SEPARATOR], footer=[PLAYER_SEPARATOR])
+
 @bot.slash_command(name="list_players", description="List all registered players with their details in a table.")
-async def list_players(ctx, sort_by: str = None):
-    players = load_data(PLAYERS_FILE)
-    teams = load_data(TEAMS_FILE)
+async def list_players(ctx, sort_by: str = None, stream: bool = False):
+    players = store.load(PLAYERS_FILE)
 
     if not players:
         await ctx.send("No players are registered yet.")
         return
 
-    title_row = "| {:<15} | {:<5} | {:<5} | {:<10} | {:<10} | {:<3} | {:<3} | {:<10} |".format(
-    # Title Row with '|' as separator
-        "Name", "Class", "Build", "Serious", "Team", "Exp", "Loc", "Availability"
-    )
-    # Separator row using '-' for visual separation
-    separator = "+{:-<17}+{:-<7}+{:-<7}+{:-<12}+{:-<12}+{:-<5}+{:-<5}+{:-<14}+".format('', '', '', '', '', '', '', '')
-
-    # Prepare list for sorting
-    player_list = []
-    for player_id, player_info in players.items():
-        member = ctx.guild.get_member(int(player_id))
-        member_name = member.name if member else "Unknown"
-
-        # Determine team membership
-        team_name = "No team"
-        for team, team_data in teams.items():
-            if int(player_id) in team_data['members']:
-                team_name = team
-                break
-
-        # Add player info to the list
-        player_data = {
-            'name': member_name,
-            'class': player_info.get('class', 'N/A'),
-            'build': player_info.get('build', 'N/A'),
-            'seriousness': player_info.get('seriousness', 'N/A'),
-            'team': team_name,
-            'experience': 'Yes' if player_info.get('experience') else 'No',
-            'timezone': player_info.get('timezone', 'N/A'),
-            'availability': player_info.get('availability', 'N/A')
-        }
-        player_list.append(player_data)
-
-    # Sorting Logic
-    if sort_by:
-        if sort_by.lower() in ['name', 'class', 'build', 'seriousness', 'team', 'experience', 'timezone', 'availability']:
-            player_list = sorted(player_list, key=lambda x: x[sort_by.lower()])
-        else:
-            await ctx.send(f"Invalid sort_by value: {sort_by}. Please use one of: Name, Class, Build, Seriousness, Team, Experience, Timezone, Availability.")
-            return
-
-    # Table Body (Rows of Player Data)
-    rows = ""
-    for player in player_list:
-        rows += "| {:<15} | {:<5} | {:<5} | {:<10} | {:<10} | {:<3} | {:<3} | {:<12} |\n".format(
-            player['name'], player['class'], player['build'], player['seriousness'], player['team'], player['experience'], player['timezone'], player['availability']
-        )
-
-    # Combine the table parts
-    table = f"```{separator}\n{title_row}\n{separator}\n{rows}{separator}```"
+    if sort_by and sort_by.lower() not in PLAYER_SORT_FIELDS:
+        await ctx.send(f"Invalid sort_by value: {sort_by}. Please use one of: Name, Class, Build, Seriousness, Team, Experience, Timezone, Availability.")
+        return
+    sort_by = sort_by.lower() if sort_by else None
 
-    # Send the table as a formatted code block
-    await ctx.send(table)
+    # Send the table as formatted code blocks, one page at a time
+    await send_pages(ctx, 'players', [sort_by or ''], stream)
 
 #@bot.slash_command(name="create_team", description="Create a new team.")
 
 @commands.has_role('Captain')
 async def create_team(interaction, team_name, join_decision):
-    teams = load_data(TEAMS_FILE)
+    async with store.locked(('team', team_name)):
+        teams = store.load(TEAMS_FILE)
 
-    if team_name in teams:
-        await interaction.response.send_message("A team with that name already exists.")
-        return
-
-    team_data = {
-        'team_name': team_name,
-        'captain_id': interaction.user.id,
-        'captain_name': interaction.user.name,
-        'members': [interaction.user.id] if join_decision == 'yes' or join_decision == 'Yes' or join_decision == 'YES' else [] # IF JOIN = TRUE SET CAPTAIN AS FIRST MEMBER
-    }
+        if team_name in teams:
+            await interaction.response.send_message("A team with that name already exists.")
+            return
 
-    teams[team_name] = team_data
-    save_data(TEAMS_FILE, teams)
+        store.apply('create_team',
+            team_name=team_name,
+            captain_id=interaction.user.id,
+            captain_name=interaction.user.name,
+            members=[interaction.user.id] if join_decision == 'yes' or join_decision == 'Yes' or join_decision == 'YES' else [] # IF JOIN = TRUE SET CAPTAIN AS FIRST MEMBER
+        )
 
     await interaction.response.send_message(f"Team {team_name} has been created!")
 
-# Slash command for setting team composition
+# Slash command for setting team composition: from a spec, or in the editor
 @bot.slash_command(name="set_team_comp", description="Set your ideal team composition.")
 @commands.has_role('Captain')
-async def set_team_comp(ctx, team_name: str, num_roles: int):
-    teams = load_data(TEAMS_FILE)
+async def set_team_comp(ctx, team_name: str, spec: str = None):
+    teams = store.load(TEAMS_FILE)
     
     if team_name not in teams:
-        await ctx.send("Team not found.")
+        await ctx.respond("Team not found.", ephemeral=True)
         return
     if teams[team_name]['captain_id'] != ctx.author.id:
-        await ctx.send("You are not the captain of this team.")
+        await ctx.respond("You are not the captain of this team.", ephemeral=True)
         return
 
-    # Start the dropdown process for the first role
-    await ctx.respond(f"Setting team composition for {team_name}. Number of roles: {num_roles}.", ephemeral=True)
-    
-    # Start the role selection for the first role
-    await start_role_selection(ctx, team_name, 0, num_roles)
-
-
-# Helper function to handle role selection process
-async def start_role_selection(ctx, team_name: str, role_index: int, num_roles: int):
-    if role_index < num_roles:
-        # Start the class selection for the next role
-        await ctx.send(embed=discord.Embed(title=f"Select Class for Role {role_index + 1}"), view=TeamCompClassSelectView(role_index + 1, team_name, num_roles, ctx), ephemeral=True)
-    else:
-        # All roles have been completed
-        await ctx.send(f"Team composition for {team_name} has been set.")
+    if spec:
+        # Roles separated by ';' on the command line
+        await save_team_comp(ctx.respond, ctx.author, team_name, spec)
+        return
 
+    current = store.load(TEAM_COMPS_FILE).get(team_name, {}).get('roles', [])
+    await ctx.send_modal(TeamCompModal(team_name, format_comp_spec(current)))
 
 
 @bot.slash_command(name="suggest_autofill", description="Get suggested players to fill your team.")
 @commands.has_role('Captain')
 async def suggest_autofill(ctx, team_name):
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
@@ -467,76 +659,66 @@ async def suggest_autofill(ctx, team_name):
         await ctx.send("You are not the captain of this team.")
         return
 
-    team_comps = load_data(TEAM_COMPS_FILE)
+    team_comps = store.load(TEAM_COMPS_FILE)
     if team_name not in team_comps:
         await ctx.send("No team composition found. Please set it using !set_team_comp.")
         return
 
-    players = load_data(PLAYERS_FILE)
-    applications = load_data(APPLICATIONS_FILE)
-    invitations = load_data(INVITATIONS_FILE)
+    players = store.load(PLAYERS_FILE)
 
-    # Exclude players already on a team or with pending invitations
-    team_members = teams[team_name]['members']
-    pending_invites = [inv['player_id'] for inv in invitations.values() if inv['status'] == 'Pending']
-    excluded_players = set(team_members + pending_invites)
+    # Exclude players already on another team or with pending invitations
+    team_members = list(teams[team_name]['members'])
+    pending_invites = [player_id for player_id, _ in store.pending_players('invitations')]
+    excluded_players = (store.assigned_players() - set(team_members)) | set(pending_invites)
+    roles = list(team_comps[team_name]['roles'])
 
-    embed = discord.Embed(title=f"Suggested Autofills for {team_name}")
+    builds()  # Reindexes players first if builds.json changed
+    index = match_index.snapshot()  # The job reads this copy, never the live index
 
-    for role in team_comps[team_name]['roles']:
-        matched_players = []
-        for player_id, player in players.items():
-            if int(player_id) in excluded_players:
-                continue
-            if role['class'].lower() not in player['classes'].lower():
-                continue
-            if role['build'].lower() != 'any' and role['build'].lower() not in player['builds'].lower():
-                continue
-            if role['experience_required'] and not player['experience']:
-                continue
-            if role['seriousness'].lower() != player['seriousness'].lower():
-                continue
-            # Simple availability check (can be improved)
-            if role['availability'].lower() not in player['availability'].lower():
+    # Assigning candidates to every role at once (current members first) is the
+    # slow part at scale, so it runs as a job
+    def compute(job):
+        return assign_roles(index, roles, team_members, excluded_players)
+
+    async def deliver(assignments):
+        # Every name the embed shows, in one batch
+        await member_names.resolve(ctx.guild, [player_id for slot in assignments for player_id in [slot['player_id']] + list(slot['alternates']) if player_id is not None])
+
+        embed = discord.Embed(title=f"Suggested Autofills for {team_name}")
+
+        suggested = []
+        for number, slot in enumerate(assignments, start=1):
+            role = slot['role']
+            field_name = f"Role {number}: {role.get('class', 'N/A')} ({role.get('build', 'Any')})"
+
+            if slot['player_id'] is None:
+                embed.add_field(name=field_name, value="No matching players found.", inline=False)
                 continue
-            matched_players.append(player)
-            if len(matched_players) >= role['count']:
-                break
-
-        if not matched_players:
-            embed.add_field(
-                name=f"{role['class']} ({role['build']}) x{role['count']}",
-                value="No matching players found.",
-                inline=False
-            )
-            continue
 
-        player_list = ""
-        for player in matched_players:
-            member = ctx.guild.get_member(int(player['discord_id']))
-            player_info = f"{member.name if member else 'Unknown'} - Build: {player['builds']}, Exp: {'Yes' if player['experience'] else 'No'}, Avail: {player['availability']}"
-            player_list += player_info + "\n"
-            # Add to excluded players to avoid duplicates
-            excluded_players.add(int(player['discord_id']))
+            player = players.get(slot['player_id'], {})  # Could have gone since the job started
+            member_name = member_names.name(slot['player_id'], player.get('username', 'Unknown'))
+            if slot['member']:
+                value = f"Filled by {member_name}"
+            else:
+                value = f"{member_name} - Build: {player.get('build', 'N/A')}, Serious: {player.get('seriousness', 'N/A')}, Exp: {'Yes' if player.get('experience') else 'No'}, Fit: {slot['score']}"
+                suggested.append(slot['player_id'])
+            if slot['alternates']:
+                alternates = [member_names.name(player_id, players.get(player_id, {}).get('username', 'Unknown')) for player_id in slot['alternates']]
+                value += f"\nAlternates: {', '.join(alternates)}"
+            embed.add_field(name=field_name, value=value, inline=False)
 
-            # Optionally notify the player
-            try:
-                await member.send(f"You have been suggested for a role in team {team_name}. The captain may contact you soon.")
-            except:
-                pass  # Ignore if DM fails
+        await ctx.interaction.edit_original_response(embed=embed)
 
-        embed.add_field(
-            name=f"{role['class']} ({role['build']}) x{role['count']}",
-            value=player_list,
-            inline=False
-        )
+        # Optionally notify the suggested players
+        for player_id in suggested:
+            notifier.notify(dm_target(ctx.guild, player_id), f"You have been suggested for a role in team {team_name}. The captain may contact you soon.")
 
-    await ctx.send(embed=embed)
+    await jobs.run(ctx, 'suggest_autofill', compute, deliver)
 
 @bot.slash_command(name="invite_player", description="Invite player to your team.")
 @commands.has_role('Captain')
 async def invite_player(ctx, member: discord.Member, team_name):
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
@@ -544,214 +726,154 @@ async def invite_player(ctx, member: discord.Member, team_name):
         await ctx.send("You are not the captain of this team.")
         return
 
-    players = load_data(PLAYERS_FILE)
-    if str(member.id) not in players:
+    players = store.load(PLAYERS_FILE)
+    if member.id not in players:
         await ctx.send("This player is not registered.")
         return
 
-    invitations = load_data(INVITATIONS_FILE)
-
-    # Check if player already has a pending invitation or is on a team
-    for inv in invitations.values():
-        if inv['player_id'] == member.id and inv['team_id'] == team_name and inv['status'] == 'Pending':
+    async with store.locked(('player', member.id), ('team', team_name)):
+        # Check if player already has a pending invitation or is on a team
+        if store.find_pending('invitations', member.id, team_name):
             await ctx.send("An invitation has already been sent to this player.")
             return
 
-    if member.id in teams[team_name]['members']:
-        await ctx.send("This player is already on your team.")
-        return
+        if member.id in teams[team_name]['members']:
+            await ctx.send("This player is already on your team.")
+            return
 
-    # Create a pending invitation
-    invitation_id = str(len(invitations) + 1)
-    invitation = {
-        'id': invitation_id,
-        'team_id': team_name,
-        'player_id': member.id,
-        'status': 'Pending'
-    }
-    invitations[invitation_id] = invitation
-    save_data(INVITATIONS_FILE, invitations)
+        # Create a pending invitation
+        invitation_id = store.next_id('invitations')
+        store.apply('invite', invitation_id=invitation_id, team_id=team_name, player_id=member.id)
 
     # Notify the player
-    try:
-        await member.send(f"You have been invited to join team {team_name}. Use !accept_invite {team_name} to accept or !decline_invite {team_name} to decline.")
-        await ctx.send(f"Invitation sent to {member.name}.")
-    except:
-        await ctx.send("Failed to send DM to the player. They may have DMs disabled.")
+    notifier.notify(member, f"You have been invited to join team {team_name}. Use !accept_invite {team_name} to accept or !decline_invite {team_name} to decline.")
+    await ctx.send(f"Invitation sent to {member.name}.")
 
 @bot.slash_command(name="accept_invite", description="Accept invite to team.")
 async def accept_invite(ctx, team_name):
-    players = load_data(PLAYERS_FILE)
-    if str(ctx.author.id) not in players:
+    players = store.load(PLAYERS_FILE)
+    if ctx.author.id not in players:
         await ctx.send("You are not registered.")
         return
 
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
 
-    invitations = load_data(INVITATIONS_FILE)
-
-    # Find the pending invitation
-    invitation_id = None
-    for inv_id, inv in invitations.items():
-        if inv['player_id'] == ctx.author.id and inv['team_id'] == team_name and inv['status'] == 'Pending':
-            invitation_id = inv_id
-            break
-    if not invitation_id:
-        await ctx.send("You do not have a pending invitation from this team.")
-        return
-
-    # Update invitation status and add player to team
-    invitations[invitation_id]['status'] = 'Accepted'
-    save_data(INVITATIONS_FILE, invitations)
+    async with store.locked(('player', ctx.author.id), ('team', team_name)):
+        # Find the pending invitation
+        invitation_id = store.find_pending('invitations', ctx.author.id, team_name)
+        if not invitation_id:
+            await ctx.send("You do not have a pending invitation from this team.")
+            return
 
-    teams[team_name]['members'].append(ctx.author.id)
-    save_data(TEAMS_FILE, teams)
+        # Update invitation status and add player to team
+        store.apply('accept_invite', invitation_id=invitation_id, team_name=team_name, player_id=ctx.author.id)
 
     # Notify the captain
-    captain_member = ctx.guild.get_member(teams[team_name]['captain_id'])
-    if captain_member:
-        try:
-            await captain_member.send(f"{ctx.author.name} has accepted your invitation to join team {team_name}.")
-        except:
-            pass  # Ignore if DM fails
+    notifier.notify(dm_target(ctx.guild, teams[team_name]['captain_id']), f"{ctx.author.name} has accepted your invitation to join team {team_name}.")
 
     await ctx.send(f"You have joined team {team_name}!")
     
 @bot.slash_command(name="decline_invite", description="Decline invite to team.")
 async def decline_invite(ctx, team_name):
-    players = load_data(PLAYERS_FILE)
-    if str(ctx.author.id) not in players:
+    players = store.load(PLAYERS_FILE)
+    if ctx.author.id not in players:
         await ctx.send("You are not registered.")
         return
 
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
 
-    invitations = load_data(INVITATIONS_FILE)
-
-    # Find the pending invitation
-    invitation_id = None
-    for inv_id, inv in invitations.items():
-        if inv['player_id'] == ctx.author.id and inv['team_id'] == team_name and inv['status'] == 'Pending':
-            invitation_id = inv_id
-            break
-    if not invitation_id:
-        await ctx.send("You do not have a pending invitation from this team.")
-        return
+    async with store.locked(('player', ctx.author.id), ('team', team_name)):
+        # Find the pending invitation
+        invitation_id = store.find_pending('invitations', ctx.author.id, team_name)
+        if not invitation_id:
+            await ctx.send("You do not have a pending invitation from this team.")
+            return
 
-    # Update invitation status
-    invitations[invitation_id]['status'] = 'Declined'
-    save_data(INVITATIONS_FILE, invitations)
+        # Update invitation status
+        store.apply('decline_invite', invitation_id=invitation_id)
 
     # Notify the captain
-    captain_member = ctx.guild.get_member(teams[team_name]['captain_id'])
-    if captain_member:
-        try:
-            await captain_member.send(f"{ctx.author.name} has declined your invitation to join team {team_name}.")
-        except:
-            pass  # Ignore if DM fails
+    notifier.notify(dm_target(ctx.guild, teams[team_name]['captain_id']), f"{ctx.author.name} has declined your invitation to join team {team_name}.")
 
     await ctx.send(f"You have declined the invitation to join team {team_name}.")
 
 @bot.slash_command(name="leave_team", description="Leave the current team.")
 async def leave_team(ctx, team_name: str = None):
-    teams = load_data(TEAMS_FILE)
-    players = load_data(PLAYERS_FILE)
+    teams = store.load(TEAMS_FILE)
+    players = store.load(PLAYERS_FILE)
     
-    if str(ctx.user.id) not in players:
+    if ctx.user.id not in players:
         await ctx.send("You are not registered.")
         return
     
-    player_id = str(ctx.user.id)
-    
     if team_name == None:
-        for team, team_data in teams.items():
-            if player_id in team_data['members']:
-                team_name = team['team_name']
-                break
+        player_teams = store.teams_of(ctx.user.id)
+        if len(player_teams) > 1:
+            await ctx.send(f"You are on several teams ({', '.join(player_teams)}). Say which one to leave with team_name.")
+            return
+        team_name = player_teams[0] if player_teams else None
     
     if not team_name:
         await ctx.send("You are not part of any team.")
         return
 
-    team = teams[team_name]
-    members = team['members']
-
-    teams[team_name]['members'].remove(ctx.user.id)
+    async with store.locked(('player', ctx.user.id), ('team', team_name)):
+        team = teams.get(team_name)
+        if team is None:
+            await ctx.send(f"Team {team_name} not found.")
+            return
+        if ctx.user.id not in team['members']:
+            await ctx.send(f"You are not a member of team {team_name}.")
+            return
+        store.apply('leave_team', team_name=team_name, player_id=ctx.user.id)
 
-    save_data(TEAMS_FILE, teams)
-    
-    captain_member = ctx.guild.get_member(teams[team_name]['captain_id'])
-    if captain_member:
-        try:
-            await captain_member.send(f"{ctx.user.name} has left your team {team_name}.")
-        except:
-            print('Alert Captain of Member Leaving failed.')
-            pass  # Ignore if DM fails
+    # Notify the captain
+    notifier.notify(dm_target(ctx.guild, teams[team_name]['captain_id']), f"{ctx.user.name} has left your team {team_name}.")
 
     # Send confirmation to the player
     await ctx.send(f"You have successfully left the team {team_name}.")
 
 def getTeamsList(show_members = True, show_member_info = False):
-    teams = load_data(TEAMS_FILE)
-    players = load_data(PLAYERS_FILE)
+    teams = store.load(TEAMS_FILE)
 
     if not teams:
         return None
 
-    table = ""
-    
-    for team_name, team in teams.items():
-        print(f'Team: {team}')
-        print(f'Team Name: {team_name}')
-        
-        captain_name = team['captain_name']
-        members = team['members']
+    # Paged table, rebuilt only when teams or players change
+    key = ('teams', store.version(TEAMS_FILE, PLAYERS_FILE), member_names.version, show_members, show_member_info)
+    return render_cache.get(key, lambda: render_teams_list(teams, store.load(PLAYERS_FILE), show_members, show_member_info, member_names.name))
 
-       # print(f'Team: {team}')
-        #print(f'members: {members}')
+def render_teams_list(teams, players, show_members, show_member_info, name_of):
+    def render_team(team_name):
+        team = teams[team_name]
+        lines = [f"Team: {team_name} | Captain: {team['captain_name']}"]
 
-        table += f"Team: {team_name} | Captain: {captain_name}\n"
-        
         if show_members:
-            table += "Members:\n"
-
-            for member_id in members:
-                #print(f'Member Id: {member_id}')
-                member = players[str(member_id)]
-                #(f'Member: {member}')
-                member_name = member['username'] if member else 'Unknown'
-                #print(f'Member_name: {member_name}')
-
-                if show_member_info and str(member_id) in players.items():
-                    player_info = players[str(member_id)]
-                    table += "| {:<15} | {:<5} | {:<5} | {:<10} | {:<10} | {:<3} | {:<3} | {:<12} |\n".format(
-                        member_name,
-                        player_info.get('class', 'N/A'),
-                        player_info.get('build', 'N/A'),
-                        player_info.get('seriousness', 'N/A'),
-                        team_name,
-                        'Yes' if player_info.get('experience') else 'No',
-                        player_info.get('timezone', 'N/A'),
-                        player_info.get('availability', 'N/A')
-                    )
+            lines.append("Members:")
+
+            for member_id in team['members']:
+                player_info = players.get(member_id)
+                member_name = name_of(member_id, player_info['username'] if player_info else 'Unknown')
+
+                if show_member_info and player_info:
+                    lines.append(player_row(member_name, player_info, team_name))
                 else:
-                    table += f" - {member_name}\n"
-            
+                    lines.append(f" - {member_name}")
+
             # Add a separator between teams
-            table += "-" * 60 + "\n"
+            lines.append(TEAM_SEPARATOR)
+        return lines
 
-    # Send the table as a formatted code block
-    table = f"```{table}```"
-    return table
+    return PagedTable(list(teams), render_team)
 
 @bot.slash_command(name="list_teams", description="List all current teams")
-async def list_teams(ctx, show_members: bool = True, show_member_info: bool = False):
+async def list_teams(ctx, show_members: bool = True, show_member_info: bool = False, stream: bool = False):
 
     teams = getTeamsList(show_members, show_member_info)
 
@@ -759,12 +881,12 @@ async def list_teams(ctx, show_members: bool = True, show_member_info: bool = Fa
         await ctx.send("No teams have been created yet.")
         return
 
-    await ctx.send(teams)
+    await send_pages(ctx, 'teams', ['1' if show_members else '0', '1' if show_member_info else '0'], stream)
 
 @bot.slash_command(name="show_team", description="Show team by Team Name")
 async def show_team(ctx, team_name: str = '', show_member_info: bool = False):
-    teams = load_data(TEAMS_FILE)
-    players = load_data(PLAYERS_FILE)
+    teams = store.load(TEAMS_FILE)
+    players = store.load(PLAYERS_FILE)
     user = ctx.user
 
     if not teams:
@@ -773,16 +895,16 @@ async def show_team(ctx, team_name: str = '', show_member_info: bool = False):
     
     table = "```"
     if team_name == '':
-        for team in teams.values():
-            members = team['members']
-            if user.id in members:
-                team_name = team['team_name']
-                break
+        player_teams = store.teams_of(user.id)
+        if len(player_teams) > 1:
+            await ctx.send(f"You are on several teams ({', '.join(player_teams)}). Say which one to show with team_name.")
+            return
+        team_name = player_teams[0] if player_teams else ''
 
     if teams[team_name]:
         team = teams[team_name]
-        captain_member = ctx.guild.get_member(team['captain_id'])
-        captain_name = captain_member.name if captain_member else 'Unknown'
+        await member_names.resolve(ctx.guild, [team['captain_id']] + team['members'])
+        captain_name = member_names.name(team['captain_id'], team.get('captain_name') or 'Unknown')
 
         # Start building team details
         table += f"Team: {team_name} | Captain: {captain_name}\n"
@@ -791,12 +913,11 @@ async def show_team(ctx, team_name: str = '', show_member_info: bool = False):
 
         # Show details for each member if requested
         for member_id in team['members']:
-            member = ctx.guild.get_member(member_id)
-            member_name = member.name if member else 'Unknown'
+            member_name = member_names.name(member_id, players[member_id]['username'] if member_id in players else 'Unknown')
             
             # Show member info or just their name
-            if show_member_info and str(member_id) in players:
-                player_info = players[str(member_id)]
+            if show_member_info and member_id in players:
+                player_info = players[member_id]
                 table += "| {:<15} | {:<5} | {:<5} | {:<10} | {:<10} | {:<3} | {:<3} | {:<12} |\n".format(
                     member_name,
                     player_info.get('class', 'N/A'),
@@ -819,49 +940,35 @@ async def show_team(ctx, team_name: str = '', show_member_info: bool = False):
 
 @bot.slash_command(name="apply_team", description="Apply to join a team")
 async def apply_team(ctx, team_name):
-    players = load_data(PLAYERS_FILE)
-    if str(ctx.author.id) not in players:
+    players = store.load(PLAYERS_FILE)
+    if ctx.author.id not in players:
         await ctx.send("You are not registered.")
         return
 
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
 
-    applications = load_data(APPLICATIONS_FILE)
-
-    # Check if application already exists
-    for app in applications.values():
-        if app['player_id'] == ctx.author.id and app['team_id'] == team_name and app['status'] == 'Pending':
+    async with store.locked(('player', ctx.author.id), ('team', team_name)):
+        # Check if application already exists
+        if store.find_pending('applications', ctx.author.id, team_name):
             await ctx.send("You have already applied to this team.")
             return
 
-    # Create a new application
-    application_id = str(len(applications) + 1)
-    application = {
-        'id': application_id,
-        'player_id': ctx.author.id,
-        'team_id': team_name,
-        'status': 'Pending'
-    }
-    applications[application_id] = application
-    save_data(APPLICATIONS_FILE, applications)
+        # Create a new application
+        application_id = store.next_id('applications')
+        store.apply('apply', application_id=application_id, player_id=ctx.author.id, team_id=team_name)
 
     # Notify the captain
-    captain_member = ctx.guild.get_member(teams[team_name]['captain_id'])
-    if captain_member:
-        try:
-            await captain_member.send(f"{ctx.author.name} has applied to join your team {team_name}.")
-        except:
-            pass  # Ignore if DM fails
+    notifier.notify(dm_target(ctx.guild, teams[team_name]['captain_id']), f"{ctx.author.name} has applied to join your team {team_name}.")
 
     await ctx.send(f"You have applied to join team {team_name}.")
 
 @bot.slash_command(name="view_applications", description="View your teams applications")
 @commands.has_role('Captain')
 async def view_applications(ctx, team_name):
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
@@ -869,26 +976,23 @@ async def view_applications(ctx, team_name):
         await ctx.send("You are not the captain of this team.")
         return
 
-    applications = load_data(APPLICATIONS_FILE)
-    players = load_data(PLAYERS_FILE)
+    players = store.load(PLAYERS_FILE)
 
-    pending_apps = [app for app in applications.values() if app['team_id'] == team_name and app['status'] == 'Pending']
+    pending_apps = store.pending_for_team('applications', team_name)
 
     if not pending_apps:
         await ctx.send("No pending applications.")
         return
 
+    await member_names.resolve(ctx.guild, [app['player_id'] for app in pending_apps])
     embed = discord.Embed(title=f"Pending Applications for {team_name}")
     for app in pending_apps:
-        player = players.get(str(app['player_id']))
+        player = players.get(app['player_id'])
         if not player:
             continue
-        member = ctx.guild.get_member(player.get('discord_id', 0))
-
         # Use get method to safely access fields, provide default values if they are missing
         embed.add_field(
-            #name=member.name if member else "Unknown",
-            name=player.get('username', 'N/A'),
+            name=member_names.name(app['player_id'], player.get('username', 'N/A')),
             value=(
                 f"Classes: {player.get('class', 'N/A')}\n"
                 f"Builds: {player.get('build', 'N/A')}\n"
@@ -906,7 +1010,7 @@ async def view_applications(ctx, team_name):
 @bot.slash_command(name="accept_member", description="Accept member to your team")
 @commands.has_role('Captain')
 async def accept_member(ctx, member: discord.Member, team_name):
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
@@ -914,42 +1018,30 @@ async def accept_member(ctx, member: discord.Member, team_name):
         await ctx.send("You are not the captain of this team.")
         return
 
-    players = load_data(PLAYERS_FILE)
-    if str(member.id) not in players:
+    players = store.load(PLAYERS_FILE)
+    if member.id not in players:
         await ctx.send("Player is not registered.")
         return
 
-    applications = load_data(APPLICATIONS_FILE)
-
-    # Find the application
-    application_id = None
-    for app_id, app in applications.items():
-        if app['player_id'] == member.id and app['team_id'] == team_name and app['status'] == 'Pending':
-            application_id = app_id
-            break
-    if not application_id:
-        await ctx.send("This player has not applied to your team.")
-        return
-
-    # Accept the application
-    applications[application_id]['status'] = 'Accepted'
-    save_data(APPLICATIONS_FILE, applications)
+    async with store.locked(('player', member.id), ('team', team_name)):
+        # Find the application
+        application_id = store.find_pending('applications', member.id, team_name)
+        if not application_id:
+            await ctx.send("This player has not applied to your team.")
+            return
 
-    teams[team_name]['members'].append(member.id)
-    save_data(TEAMS_FILE, teams)
+        # Accept the application and add player to team
+        store.apply('accept_member', application_id=application_id, team_name=team_name, player_id=member.id)
 
     # Notify the player
-    try:
-        await member.send(f"Your application to join team {team_name} has been accepted!")
-    except:
-        pass  # Ignore if DM fails
+    notifier.notify(member, f"Your application to join team {team_name} has been accepted!")
 
     await ctx.send(f"{member.name} has been added to your team.")
 
 @bot.slash_command(name="decline_member", description="Decline a members team application")
 @commands.has_role('Captain')
 async def decline_member(ctx, member: discord.Member, team_name):
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
@@ -957,32 +1049,23 @@ async def decline_member(ctx, member: discord.Member, team_name):
         await ctx.send("You are not the captain of this team.")
         return
 
-    players = load_data(PLAYERS_FILE)
-    if str(member.id) not in players:
+    players = store.load(PLAYERS_FILE)
+    if member.id not in players:
         await ctx.send("Player is not registered.")
         return
 
-    applications = load_data(APPLICATIONS_FILE)
-
-    # Find the application
-    application_id = None
-    for app_id, app in applications.items():
-        if app['player_id'] == member.id and app['team_id'] == team_name and app['status'] == 'Pending':
-            application_id = app_id
-            break
-    if not application_id:
-        await ctx.send("This player has not applied to your team.")
-        return
+    async with store.locked(('player', member.id), ('team', team_name)):
+        # Find the application
+        application_id = store.find_pending('applications', member.id, team_name)
+        if not application_id:
+            await ctx.send("This player has not applied to your team.")
+            return
 
-    # Decline the application
-    applications[application_id]['status'] = 'Declined'
-    save_data(APPLICATIONS_FILE, applications)
+        # Decline the application
+        store.apply('decline_member', application_id=application_id)
 
     # Notify the player
-    try:
-        await member.send(f"Your application to join team {team_name} has been declined.")
-    except:
-        pass  # Ignore if DM fails
+    notifier.notify(member, f"Your application to join team {team_name} has been declined.")
 
     await ctx.send(f"{member.name}'s application has been declined.")
 
@@ -991,7 +1074,7 @@ async def decline_member(ctx, member: discord.Member, team_name):
 @bot.slash_command(name="set_team_plan", description="Set your teams plan for ladder reset")
 @commands.has_role('Captain')
 async def set_team_plan(ctx, team_name):
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
@@ -1017,32 +1100,26 @@ async def set_team_plan(ctx, team_name):
             await ctx.send("Added to plan. Type 'done' when finished or continue typing.")
 
     plan_text = "\n".join(plan_messages)
-    teams[team_name]['plan'] = plan_text
-    save_data(TEAMS_FILE, teams)
+    store.apply('set_team_plan', team_name=team_name, plan=plan_text)
     await ctx.send(f"Team plan for {team_name} has been set.")
     
      # Notify team members
+    member_ids = teams[team_name]['members']
     for member_id in member_ids:
         if member_id != ctx.author.id:
-            member = ctx.guild.get_member(member_id)
-            if member:
-                try:
-                    await member.send(f"The team plan for {team_name} has been updated by your captain.")
-                except:
-                    pass  # Ignore if DM fails
+            notifier.notify(dm_target(ctx.guild, member_id), f"The team plan for {team_name} has been updated by your captain.")
 
 
 @bot.slash_command(name="view_team_plan", description="View your teams plan for ladder reset")
 async def view_team_plan(ctx, team_name):
-    teams = load_data(TEAMS_FILE)
+    teams = store.load(TEAMS_FILE)
     if team_name not in teams:
         await ctx.send("Team not found.")
         return
 
     team = teams[team_name]
-    member_ids = team['members']
     captain_id = team['captain_id']
-    member_ids.append(captain_id)  # Include captain in team members
+    member_ids = team['members'] + [captain_id]  # Include captain in team members (copy, the list is the resident one)
 
     if ctx.author.id not in member_ids:
         await ctx.send("You are not a member of this team.")
@@ -1059,7 +1136,7 @@ async def view_team_plan(ctx, team_name):
 @bot.slash_command(name="view_team_comp", description="View the current team composition.")
 @commands.has_role('Captain')
 async def view_team_comp(ctx, team_name: str):
-    team_comps = load_data(TEAM_COMPS_FILE)
+    team_comps = store.load(TEAM_COMPS_FILE)
     
     if team_name not in team_comps:
         await ctx.send(f"Team {team_name} does not have a composition set yet.")
@@ -1070,8 +1147,9 @@ async def view_team_comp(ctx, team_name: str):
     embed = discord.Embed(title=f"Current Team Composition for {team_name}")
     
     for index, role in enumerate(roles, start=1):
+        count = int(role.get('count', 1) or 1)
         embed.add_field(
-            name=f"Role {index}",
+            name=f"Role {index}" + (f" (x{count})" if count > 1 else ""),
             value=f"Class: {role['class']}\nBuild: {role['build']}\nSeriousness: {role['seriousness']}",
             inline=False
         )
@@ -1081,8 +1159,8 @@ async def view_team_comp(ctx, team_name: str):
 @bot.slash_command(name="compare_team_comp", description="Compare the current team composition and see which slots are filled or empty.")
 @commands.has_role('Captain')
 async def compare_team_comp(ctx, team_name: str):
-    teams = load_data(TEAMS_FILE)
-    team_comps = load_data(TEAM_COMPS_FILE)
+    teams = store.load(TEAMS_FILE)
+    team_comps = store.load(TEAM_COMPS_FILE)
 
     if team_name not in team_comps:
         await ctx.send(f"No team composition set for {team_name}.")
@@ -1092,60 +1170,231 @@ async def compare_team_comp(ctx, team_name: str):
         await ctx.send(f"No team found for {team_name}.")
         return
 
-    # Get roles and members
-    roles = team_comps[team_name]['roles']
-    team_members = teams[team_name]['members']
+    # Get roles (one per slot) and members
+    roles = expand_roles(team_comps[team_name]['roles'])
+    team_members = list(teams[team_name]['members'])
 
-    # Prepare embed for comparison
-    embed = discord.Embed(title=f"Team Composition Comparison for {team_name}")
+    names = {}
 
-    # Step 1: Compare roles and team members
-    filled_roles = []
-    unfilled_roles = []
-    extra_players = []
+    async def prepare():
+        players = store.load(PLAYERS_FILE)
+        await member_names.resolve(ctx.guild, team_members)
+        names.update((member_id, member_names.name(member_id, players[member_id]['username'] if member_id in players else 'Unknown')) for member_id in team_members)
 
-    # Match players to roles
-    for index, role in enumerate(roles, start=1):
-        if index - 1 < len(team_members):  # If a member exists for this role slot
-            member = ctx.guild.get_member(team_members[index - 1])
-            if member:
-                filled_roles.append(f"**Role {index}:** {role['class']} - {role['build']} - {role['seriousness']} - Filled by: {member.name}")
+    # Laying each slot against the comp runs as a job, like the other team reports
+    def compute(job):
+        # Step 1: Compare roles and team members
+        filled_roles = []
+        unfilled_roles = []
+        extra_players = []
+
+        # Match players to roles
+        for index, role in enumerate(roles, start=1):
+            if index - 1 < len(team_members):  # If a member exists for this role slot
+                filled_roles.append(f"**Role {index}:** {role['class']} - {role['build']} - {role['seriousness']} - Filled by: {names[team_members[index - 1]]}")
             else:
                 unfilled_roles.append(f"**Role {index}:** {role['class']} - {role['build']} - {role['seriousness']} - No player assigned")
-        else:
-            unfilled_roles.append(f"**Role {index}:** {role['class']} - {role['build']} - {role['seriousness']} - No player assigned")
 
-    # Step 2: Extra members not fitting into the defined roles
-    if len(team_members) > len(roles):
-        for extra_index in range(len(roles), len(team_members)):
-            member = ctx.guild.get_member(team_members[extra_index])
-            if member:
-                extra_players.append(f"Extra Player: {member.name} (No defined role)")
+        # Step 2: Extra members not fitting into the defined roles
+        if len(team_members) > len(roles):
+            for extra_index in range(len(roles), len(team_members)):
+                extra_players.append(f"Extra Player: {names[team_members[extra_index]]} (No defined role)")
 
-    # Add filled roles to the embed
-    if filled_roles:
-        embed.add_field(name="Filled Roles", value="\n".join(filled_roles), inline=False)
+        return filled_roles, unfilled_roles, extra_players
 
-    # Add unfilled roles to the embed
-    if unfilled_roles:
-        embed.add_field(name="Unfilled Roles", value="\n".join(unfilled_roles), inline=False)
+    async def deliver(result):
+        filled_roles, unfilled_roles, extra_players = result
 
-    # Add extra players to the embed
-    if extra_players:
-        embed.add_field(name="Extra Players", value="\n".join(extra_players), inline=False)
+        # Prepare embed for comparison
+        embed = discord.Embed(title=f"Team Composition Comparison for {team_name}")
 
-    await ctx.send(embed=embed)
+        # Add filled roles to the embed
+        if filled_roles:
+            embed.add_field(name="Filled Roles", value="\n".join(filled_roles), inline=False)
+
+        # Add unfilled roles to the embed
+        if unfilled_roles:
+            embed.add_field(name="Unfilled Roles", value="\n".join(unfilled_roles), inline=False)
+
+        # Add extra players to the embed
+        if extra_players:
+            embed.add_field(name="Extra Players", value="\n".join(extra_players), inline=False)
+
+        await ctx.interaction.edit_original_response(embed=embed)
 
+    await jobs.run(ctx, 'compare_team_comp', compute, deliver, prepare=prepare)
+
+
+@bot.slash_command(name="auto_matchmake", description="Council: fill every team's open roles from the registered players in one pass.")
+@commands.has_role('Council')
+async def auto_matchmake(ctx, send_invites: bool = False):
+    catalog = builds()
 
+    # The solve runs as a job over a copy of the data
+    def compute(job):
+        return matchmake(store.snapshot('players', 'teams', 'team_comps', 'applications', 'invitations'), catalog)
 
+    async def deliver(result):
+        results, unfilled = result
+        new_matches = [result for result in results if result['source'] == 'match']
 
+        skipped = 0
+        if send_invites and new_matches:
+            # The data may have changed while the job ran: only players still registered,
+            # on no team and not already invited there, to teams that still exist. No
+            # await between these checks and the apply.
+            players = store.load(PLAYERS_FILE)
+            teams = store.load(TEAMS_FILE)
+            assigned = store.assigned_players()
+            invited = store.pending_players('invitations')
+            still_open = [result for result in new_matches if result['player_id'] in players and result['team_name'] in teams
+                          and result['player_id'] not in assigned and (result['player_id'], result['team_name']) not in invited]
+            skipped = len(new_matches) - len(still_open)
+            new_matches = still_open
+            if new_matches:
+                invitations = [{'team_id': result['team_name'], 'player_id': result['player_id']} for result in new_matches]
+                store.apply('invite_many', invitations=invitations, ids=store.next_ids('invitations', len(invitations)))
 
+        embed = discord.Embed(title="League Matchmaking", description=summarize(results, unfilled))
+        per_team = {}
+        for result in results:
+            per_team.setdefault(result['team_name'], []).append(result)
+        for team_name, team_results in list(per_team.items())[:20]:  # Embeds are limited to 25 fields
+            lines = [f"Role {result['slot'] + 1} {result['role'].get('class')}: <@{result['player_id']}> ({result['source']})" for result in team_results]
+            embed.add_field(name=team_name, value="\n".join(lines)[:1024], inline=False)
+        if not send_invites:
+            embed.set_footer(text="Dry run. Run with send_invites:True to create the invitations.")
+        elif skipped:
+            embed.set_footer(text=f"{skipped} matches were skipped: the player or team changed while matching ran.")
+        await ctx.interaction.edit_original_response(embed=embed)
 
+        if send_invites:
+            for result in new_matches:
+                notifier.notify(dm_target(ctx.guild, result['player_id']), f"You have been invited to join team {result['team_name']}. Use /accept_invite {result['team_name']} to accept or /decline_invite {result['team_name']} to decline.")
 
+    await jobs.run(ctx, 'auto_matchmake', compute, deliver, ephemeral=True)
 
 
 
 
+
+
+
+
+
+
+
+@bot.slash_command(name="new_season", description="Council: archive this season's players, teams and requests and start an empty one.")
+@commands.has_role('Council')
+async def new_season(ctx, confirm: bool = False):
+    counts = {name: len(store.load(file_path)) for name, file_path in DATA_FILES.items() if name != 'sequences'}
+    summary = ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+    if not confirm:
+        await ctx.respond(f"Season {seasons.current} holds {summary}. Run with confirm:True to archive it and start Season {seasons.current + 1}.", ephemeral=True)
+        return
+
+    # Writing the season's files can take a while at scale; answer "thinking..." first
+    await ctx.defer()
+    season = await seasons.rollover(store, make_backend)
+    registrations.clear()  # Unfinished registrations belong to the old season
+    await ctx.respond(f"Season {season} archived ({summary}). Ladder Season {seasons.current} has started; everyone needs to /register again.")
+    await asyncio.to_thread(seasons.compress, season)
+
+
+@bot.slash_command(name="past_season", description="Look up a team or player from a past ladder season.")
+async def past_season(ctx, season: int, team_name: str = '', member: discord.Member = None):
+    if season >= seasons.current:
+        await ctx.respond(f"Season {season} isn't over yet; the current season is {seasons.current}.", ephemeral=True)
+        return
+    archive = seasons.season(season)
+    if archive is None:
+        if season in seasons.uncompressed():
+            await ctx.respond(f"Season {season} is still being archived, try again in a moment.", ephemeral=True)
+        else:
+            await ctx.respond(f"There is no archive for season {season}. Archived seasons: {', '.join(map(str, seasons.past_seasons())) or 'none'}.", ephemeral=True)
+        return
+
+    if member is not None or team_name:
+        # Only the collections the answer needs are decompressed, the first time in a thread
+        for name in ('players', 'teams'):
+            await asyncio.to_thread(archive.collection, name)
+
+    if member is not None:
+        player = archive.collection('players').get(str(member.id))
+        if player is None:
+            await ctx.respond(f"{member.name} wasn't registered in season {season}.", ephemeral=True)
+            return
+        team = archive.team_of(member.id)
+        await ctx.respond(f"Season {season}: {member.name} played {player.get('class', 'N/A')} {player.get('build', 'N/A')} ({player.get('seriousness', 'N/A')}, {player.get('timezone', 'N/A')}), team: {team or 'none'}", ephemeral=True)
+        return
+
+    if team_name:
+        team = archive.collection('teams').get(team_name)
+        if team is None:
+            await ctx.respond(f"There was no team {team_name} in season {season}.", ephemeral=True)
+            return
+        players = archive.collection('players')
+        lines = [f"Season {season} team: {team_name} | Captain: {team.get('captain_name', 'Unknown')}", "Members:"]
+        for member_id in team.get('members', []):
+            player = players.get(str(member_id), {})
+            lines.append(f" - {player.get('username', member_id)} {player.get('class', '')} {player.get('build', '')}".rstrip())
+        await ctx.respond("```" + "\n".join(lines)[:1990] + "```", ephemeral=True)
+        return
+
+    counts = ', '.join(f"{archive.count(name)} {name.replace('_', ' ')}" for name in ('players', 'teams', 'team_comps', 'applications', 'invitations'))
+    await ctx.respond(f"Season {season}: {counts}.", ephemeral=True)
+
+
+def perf_ms(seconds):
+    return '>10s' if seconds == float('inf') else f"{seconds * 1000:.0f}"
+
+@bot.slash_command(name="perf", description="Council: handler latency by phase, from the in-process histograms.")
+@commands.has_role('Council')
+async def perf_report(ctx, export: bool = False):
+    rows = perf.summary()
+    if not rows:
+        await ctx.respond("Nothing has been timed yet.", ephemeral=True)
+        return
+    lines = ["{:<26} {:>5} {:>5} {:>5} {:>5} | {:>5} {:>5} {:>5} {:>5}".format('Handler', 'n', 'p50', 'p95', 'p99', 'read', 'write', 'api', 'cpu')]
+    for handler, count, p50, p95, p99, means in rows:
+        lines.append("{:<26} {:>5} {:>5} {:>5} {:>5} | {:>5} {:>5} {:>5} {:>5}".format(
+            handler[:26], count, perf_ms(p50), perf_ms(p95), perf_ms(p99),
+            *(perf_ms(means[phase]) for phase in ('storage_read', 'storage_write', 'api_send', 'compute'))))
+    stats = perf.stats()
+    lines.append("")
+    lines.append(f"render cache {stats['render_cache_hits']}/{stats['render_cache_hits'] + stats['render_cache_misses']} hits, "
+                 f"DMs queued {stats['notify_queue']}, sent {stats['notify_sent']}, dead {stats['notify_dead']}, "
+                 f"names cached {stats['member_names']}")
+    content = "Latency in ms: quantiles are histogram bucket bounds, phases are means.\n```" + "\n".join(lines)[:1900] + "```"
+    if export:
+        await ctx.respond(content, file=discord.File(io.BytesIO(perf.prometheus().encode()), filename='ladder_perf.prom'), ephemeral=True)
+    else:
+        await ctx.respond(content, ephemeral=True)
+
+
+@bot.slash_command(name="jobs", description="Your running and recent requests (tables, autofill suggestions, comparisons).")
+async def list_jobs(ctx):
+    active = jobs.jobs_for(ctx.author.id)
+    recent = [job for job in reversed(jobs.history) if job.user_id == ctx.author.id][:5]
+    if not active and not recent:
+        await ctx.respond("You have no requests running.", ephemeral=True)
+        return
+    lines = [f"#{job.id} {job.name}: {job.status}, {job.elapsed():.1f}s" for job in active + recent]
+    await ctx.respond("```" + "\n".join(lines) + "```" + ("\nUse /cancel_job to stop one." if active else ""), ephemeral=True)
+
+@bot.slash_command(name="cancel_job", description="Cancel one of your running requests (Council can cancel anyone's).")
+async def cancel_job(ctx, job_id: int):
+    job = jobs.active.get(job_id)
+    if job is None:
+        await ctx.respond(f"Request #{job_id} is not running.", ephemeral=True)
+        return
+    if job.user_id != ctx.author.id and not discord.utils.get(ctx.author.roles, name='Council'):
+        await ctx.respond("You can only cancel your own requests.", ephemeral=True)
+        return
+    jobs.cancel(job_id)
+    await ctx.respond(f"Cancelled request #{job_id} ({job.name}).", ephemeral=True)
+
+
 @bot.slash_command(name="helpme", description="Get help with how to use this bot")
 async def helpme(ctx):
     embed = discord.Embed(title="Bot Commands", description="List of available commands:", color=0x3498db)
@@ -1157,11 +1406,14 @@ async def helpme(ctx):
     embed.add_field(name="/accept_invite [team_name]", value="Accept an invitation to join a team.", inline=False)
     embed.add_field(name="/decline_invite [team_name]", value="Decline an invitation to join a team.", inline=False)
     embed.add_field(name="/view_team_plan [team_name]", value="View your team's ladder reset plan.", inline=False)
+    embed.add_field(name="/past_season [season] [team_name] [@player]", value="Look up a team or player from a past season.", inline=False)
+    embed.add_field(name="/jobs", value="See your running and recent requests.", inline=False)
+    embed.add_field(name="/cancel_job [job_id]", value="Cancel a request that is still running.", inline=False)
 
     # Captain Commands
     embed.add_field(name="\u200b", value="**Captain Commands**", inline=False)
     embed.add_field(name="/create_team [team_name]", value="Create a new team.", inline=False)
-    embed.add_field(name="/set_team_comp [team_name] [num_roles]", value="Set your team's ideal composition.", inline=False)
+    embed.add_field(name="/set_team_comp [team_name] [spec]", value="Set your team's ideal composition, e.g. `Sorc / Blizzard / Serious; Pal / Hdin x2`. Leave out spec to open the editor.", inline=False)
     embed.add_field(name="/set_team_plan [team_name]", value="Set or update your team's plan.", inline=False)
     embed.add_field(name="/suggest_autofill [team_name]", value="Get suggested players to fill your team.", inline=False)
     embed.add_field(name="/invite_player [@player] [team_name]", value="Invite a player to your team.", inline=False)
@@ -1174,6 +1426,12 @@ async def helpme(ctx):
     embed.add_field(name="/view_team_comp [team_name]", value="View your team's current composition.", inline=False)
     embed.add_field(name="/compare_team_comp [team_name]", value="Compare the current team composition and see which slots are filled or empty.", inline=False)
 
+    # Council Commands
+    embed.add_field(name="\u200b", value="**Council Commands**", inline=False)
+    embed.add_field(name="/auto_matchmake [send_invites]", value="Fill every team's open roles in one pass (dry run unless send_invites is set).", inline=False)
+    embed.add_field(name="/perf [export]", value="Command latency by phase; export attaches a Prometheus text dump.", inline=False)
+    embed.add_field(name="/new_season [confirm]", value="Archive the current season and start an empty one (dry run unless confirm is set).", inline=False)
+
     await ctx.send(embed=embed)
 
     
@@ -1215,44 +1473,38 @@ async def create_team_channels(guild, team_name, member_ids):
 
 
 
+# Persistent: registered with bot.add_view on startup, so the pinned button
+# messages keep working across restarts
 class ResetButtons(discord.ui.View):
     def __init__(self):
-        super().__init__()
+        super().__init__(timeout=None)
 
+    async def interaction_check(self, interaction):
+        return not await not_ready(interaction)
 
     @discord.ui.button(label="Register", style=discord.ButtonStyle.primary, custom_id="register")
+    @perf.timed('button:register')
     async def register(self, button: discord.ui.Button, interaction: discord.Interaction):
-        players_data = load_data(PLAYERS_FILE)
-        player_id = str(interaction.user.id)
-        
         print('Register Command')
-        player_entry = {
-            'discord_id': player_id,   # Store Discord ID
-            'username': interaction.user.name,   # Store Discord Username
-            'class': '',                         # Class to be filled by user
-            'build': '',                         # Build to be filled by user
-            'seriousness': '',                   # Seriousness to be filled by user
-            'timezone': '',                      # Timezone to be filled by user
-            'first_reset': False,                # Default value for first ladder reset
-            'experience': False,                 # Default experience flag
-            'availability': ''                   # Availability to be filled by user
-        }
-
-        players_data[player_id] = player_entry
-        save_data(PLAYERS_FILE, players_data)
+        registrations.start(interaction.user.id, interaction.user.name)
         await interaction.response.send_message("Fill out everything to register for Ladder Reset.", ephemeral=True)
         await interaction.followup.send(view=ClassSelectView(), ephemeral=True)
 
     @discord.ui.button(label="Show Teams", style=discord.ButtonStyle.primary, custom_id="show_teams")
+    @perf.timed('button:show_teams')
     async def show_teams(self, button: discord.ui.Button, interaction: discord.Interaction):
         
-        teams = getTeamsList()
-        if not teams:
+        if not store.load(TEAMS_FILE):
             await interaction.response.send_message("No teams have been created yet.", ephemeral=True)
             return
-        await interaction.response.send_message(teams, ephemeral=True)
+        # Acknowledged first: resolving names can take longer than Discord waits for an answer
+        await interaction.response.defer(ephemeral=True, invisible=False)
+        await resolve_table_names(interaction.guild, 'teams')
+        view = PageView(interaction.guild, 'teams', ['1', '0'])
+        await interaction.followup.send(view.content, view=view, ephemeral=True)
 
     @discord.ui.button(label="Create Team", style=discord.ButtonStyle.primary, custom_id="create_team_button")
+    @perf.timed('button:create_team')
     async def create_team_button(self, button: discord.ui.Button, interaction: discord.Interaction):
         modal = CreateTeamModal()
         await interaction.response.send_modal(modal)
@@ -1260,7 +1512,16 @@ class ResetButtons(discord.ui.View):
 
 @bot.slash_command(name="show_reset_buttons", description="Show the ladder reset related buttons")
 async def show_reset_buttons(ctx):
-    await ctx.send("Ladder Season 9:", view=ResetButtons())
+    await ctx.send(f"Ladder Season {seasons.current}:", view=ResetButtons())
 
 
-bot.run(secret['token'])
\ No newline at end of file
+if __name__ == '__main__':
+    startup.mark('imports')
+    secret = load_data('secret.json')
+    connect_started = startup.elapsed()
+    try:
+        bot.run(secret['token'])
+    finally:
+        # Before the interpreter joins the pool's threads: queued jobs never start and
+        # running ones stop at their next check. The store's last flush runs at exit.
+        jobs.shutdown()
\ No newline at end of file
@@ -0,0 +1,58 @@
+from ladderPerf import perf
+
+
+## COMPONENT ROUTES
+# Selects and buttons on the messages the bot sends carry everything their handler
+# needs in the custom_id ("hr:<route>:<arg>:<arg>..."), so no view object is kept in
+# memory per message and components on old messages keep working after a restart
+# or a view timeout. One on_interaction listener parses the custom_id and calls the
+# handler registered for the route.
+
+ROUTE_PREFIX = 'hr'
+CUSTOM_ID_LIMIT = 100  # Discord's maximum custom_id length
+
+
+def _escape(value):
+    return str(value).replace('%', '%25').replace(':', '%3A')
+
+def _unescape(value):
+    return value.replace('%3A', ':').replace('%25', '%')
+
+
+def custom_id(route, *args):
+    value = ':'.join([ROUTE_PREFIX, route] + [_escape(arg) for arg in args])
+    if len(value) > CUSTOM_ID_LIMIT:
+        raise ValueError(f'custom_id for {route} is longer than {CUSTOM_ID_LIMIT} characters')
+    return value
+
+def parse_custom_id(value):
+    # (route, [args]) for ids made by custom_id(), None for anything else
+    parts = (value or '').split(':')
+    if len(parts) < 2 or parts[0] != ROUTE_PREFIX:
+        return None
+    return parts[1], [_unescape(part) for part in parts[2:]]
+
+
+class Router:
+    def __init__(self):
+        self.routes = {}  # route -> async handler(interaction, *args)
+
+    def route(self, name):
+        def decorator(func):
+            self.routes[name] = func
+            return func
+        return decorator
+
+    def handles(self, interaction):
+        parsed = parse_custom_id((interaction.data or {}).get('custom_id'))
+        return parsed is not None and parsed[0] in self.routes
+
+    async def dispatch(self, interaction):
+        # Returns False if the interaction isn't one of ours
+        parsed = parse_custom_id((interaction.data or {}).get('custom_id'))
+        if parsed is None or parsed[0] not in self.routes:
+            return False
+        route, args = parsed
+        async with perf.span(f'component:{route}'):
+            await self.routes[route](interaction, *args)
+        return True
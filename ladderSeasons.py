@@ -0,0 +1,224 @@
+import argparse
+import collections
+import json
+import mmap
+import os
+import shutil
+import struct
+import time
+import zlib
+
+from ladderBackends import DATA_FILE_NAMES, JsonBackend, SqliteBackend, data_files
+from ladderModels import to_json
+from ladderStore import SEQUENCED, save_data
+
+
+## SEASONS
+# The data directory only ever holds the active season. A rollover flushes the
+# store in the background, renames the season's files (data files, journal,
+# archive, database) into seasons/<n>/ and reopens the store on the now empty
+# directory; past the flush, starting a new season costs a handful of renames
+# however much data the old one holds.
+# The moved files are then packed, off the event loop, into one compressed
+# seasons/season-<n>.hrs file and the raw directory removed. Past seasons are only
+# opened when something asks about them: the file is memory-mapped, its small
+# header read, and a collection decompressed the first time it is used.
+# A crash partway through a rollover is finished by recover() on the next start.
+#
+# season-<n>.hrs:
+#   b'HRSEASON', header length (uint32 LE), header JSON, then one zlib-compressed
+#   JSON blob per collection; the header maps each collection to [offset, length, count],
+#   offsets counted from the end of the header
+
+FIRST_SEASON = 9  # The season running when season.json was introduced
+SEASON_MAGIC = b'HRSEASON'
+SEASON_FILE = 'season.json'
+SEASONS_DIR = 'seasons'
+OPEN_ARCHIVES = 4  # Past seasons kept mapped at once
+
+# Everything in the data directory that belongs to one season (builds.json doesn't)
+SEASON_FILES = set(DATA_FILE_NAMES.values()) | {'journal.jsonl', 'journal.jsonl.prev', 'archive', 'ladder.db', 'ladder.db-wal', 'ladder.db-shm'}
+
+
+class SeasonArchive:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._map[:len(SEASON_MAGIC)] != SEASON_MAGIC:
+                raise ValueError(f'{file_path} is not a season archive')
+            start = len(SEASON_MAGIC) + 4
+            (header_length,) = struct.unpack('<I', self._map[len(SEASON_MAGIC):start])
+            self.header = json.loads(self._map[start:start + header_length])
+            self._data_start = start + header_length
+        except Exception:
+            self.close()
+            raise
+        self.season = self.header['season']
+        self.closed_at = self.header.get('closed_at')
+        self._collections = {}
+
+    def count(self, name):
+        # Without decompressing anything
+        return self.header['collections'].get(name, [0, 0, 0])[2]
+
+    def collection(self, name):
+        if name not in self._collections:
+            entry = self.header['collections'].get(name)
+            if entry is None:
+                self._collections[name] = {}
+            else:
+                offset, length, count = entry
+                offset += self._data_start
+                self._collections[name] = json.loads(zlib.decompress(self._map[offset:offset + length]))
+        return self._collections[name]
+
+    def team_of(self, player_id):
+        for team_name, team in self.collection('teams').items():
+            if int(player_id) in [int(member_id) for member_id in team.get('members', [])]:
+                return team_name
+        return None
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+def write_season_archive(file_path, season, db):
+    blobs, collections_header, offset = [], {}, 0
+    for name, records in db.items():
+        blob = zlib.compress(json.dumps(records, default=to_json).encode(), 9)
+        collections_header[name] = [offset, len(blob), len(records)]
+        blobs.append(blob)
+        offset += len(blob)
+    header = {'season': season, 'closed_at': int(time.time()), 'collections': collections_header}
+    header_bytes = json.dumps(header).encode()
+
+    tmp_path = f'{file_path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SEASON_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        for blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def read_season_dir(season_dir):
+    # Every record of a season moved out by a rollover, with resolved requests back in
+    # their collections
+    if os.path.exists(os.path.join(season_dir, 'ladder.db')):
+        backend = SqliteBackend(os.path.join(season_dir, 'ladder.db'))
+    else:
+        backend = JsonBackend(data_files(season_dir), os.path.join(season_dir, 'journal.jsonl'))
+    try:
+        db = backend.load()
+        for name in SEQUENCED:
+            db[name] = dict(backend.archived(name), **db.get(name, {}))
+    finally:
+        backend.close()
+    return {name: {str(key): record for key, record in db.get(name, {}).items()} for name in DATA_FILE_NAMES}
+
+
+class SeasonManager:
+    def __init__(self, data_dir, first_season=FIRST_SEASON):
+        self.data_dir = data_dir
+        self.seasons_dir = os.path.join(data_dir, SEASONS_DIR)
+        self.state_file = os.path.join(data_dir, SEASON_FILE)
+        self.current = first_season  # Read from season.json by load()
+        self._open = collections.OrderedDict()  # season -> SeasonArchive, least recently used first
+
+    def raw_dir(self, season):
+        return os.path.join(self.seasons_dir, str(season))
+
+    def archive_path(self, season):
+        return os.path.join(self.seasons_dir, f'season-{season}.hrs')
+
+    def _move_season_files(self, season):
+        raw_dir = self.raw_dir(season)
+        os.makedirs(raw_dir, exist_ok=True)
+        for file_name in os.listdir(self.data_dir):
+            if file_name in SEASON_FILES:
+                os.replace(os.path.join(self.data_dir, file_name), os.path.join(raw_dir, file_name))
+
+    def _set_current(self, season):
+        save_data(self.state_file, {'season': season})
+        self.current = season
+
+    def load(self):
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                self.current = json.load(f)['season']
+
+    def recover(self):
+        # A rollover that stopped after moving some files: finish moving and advance
+        if os.path.isdir(self.raw_dir(self.current)):
+            print(f'Finishing the rollover of season {self.current}')
+            self._move_season_files(self.current)
+            self._set_current(self.current + 1)
+
+    async def rollover(self, store, make_backend):
+        # Closes the active season and opens the next one, empty; returns the closed
+        # season's number. The raw files still need compress() (slow, run it in a thread).
+        # The data files are written in the background first; mutations applied
+        # meanwhile are in the journal, which moves with them. Nothing awaits between
+        # that flush and the reopen, so no other flush or mutation lands in between.
+        season = self.current
+        await store.flush_in_background()
+        store.backend.close()
+        self._move_season_files(season)
+        self._set_current(season + 1)
+        store.reopen(make_backend())
+        return season
+
+    def uncompressed(self):
+        if not os.path.isdir(self.seasons_dir):
+            return []
+        return sorted(int(name) for name in os.listdir(self.seasons_dir)
+                      if name.isdigit() and os.path.isdir(os.path.join(self.seasons_dir, name)))
+
+    def compress(self, season):
+        raw_dir = self.raw_dir(season)
+        write_season_archive(self.archive_path(season), season, read_season_dir(raw_dir))
+        shutil.rmtree(raw_dir)
+
+    def past_seasons(self):
+        if not os.path.isdir(self.seasons_dir):
+            return []
+        return sorted(int(name[len('season-'):-len('.hrs')]) for name in os.listdir(self.seasons_dir)
+                      if name.startswith('season-') and name.endswith('.hrs'))
+
+    def season(self, season):
+        # The SeasonArchive for a past season, or None if it isn't (yet) archived
+        if season in self._open:
+            self._open.move_to_end(season)
+            return self._open[season]
+        if not os.path.exists(self.archive_path(season)):
+            return None
+        archive = SeasonArchive(self.archive_path(season))
+        self._open[season] = archive
+        while len(self._open) > OPEN_ARCHIVES:
+            self._open.popitem(last=False)[1].close()
+        return archive
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Past ladder seasons')
+    parser.add_argument('--data-dir', default='data/ladderReset')
+    parser.add_argument('--compress', action='store_true', help='pack any season directories left by a rollover')
+    args = parser.parse_args()
+
+    manager = SeasonManager(args.data_dir)
+    manager.load()
+    if args.compress:
+        for season in manager.uncompressed():
+            manager.compress(season)
+            print(f'Compressed season {season}')
+    print(f'Active season: {manager.current}')
+    for season in manager.past_seasons():
+        archive = manager.season(season)
+        counts = ', '.join(f'{archive.count(name)} {name}' for name in DATA_FILE_NAMES if name != 'sequences')
+        print(f'Season {season}: {counts} ({os.path.getsize(manager.archive_path(season))} bytes)')
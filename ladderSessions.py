@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+
+## REGISTRATION SESSIONS
+# The register wizard (class -> build -> seriousness -> timezone) keeps its answers
+# in an in-memory draft per user and writes the player record once, when the last
+# step is answered. Drafts nobody touches for REGISTRATION_TTL seconds are swept:
+# whatever was filled in is still saved (one write), and the step the user stopped
+# at is counted so drop-off per step can be seen.
+
+REGISTRATION_STEPS = ('class', 'build', 'seriousness', 'timezone')
+REGISTRATION_TTL = 15 * 60
+SWEEP_INTERVAL = 60
+
+
+class RegistrationDraft:
+    __slots__ = ('player_id', 'username', 'fields', 'expires')
+
+    def __init__(self, player_id, username, expires):
+        self.player_id = player_id
+        self.username = username
+        self.fields = {}
+        self.expires = expires
+
+    @property
+    def step(self):
+        # The first step that hasn't been answered yet, None once all are
+        for field in REGISTRATION_STEPS:
+            if field not in self.fields:
+                return field
+        return None
+
+
+class RegistrationSessions:
+    def __init__(self, commit, ttl=REGISTRATION_TTL, clock=time.monotonic):
+        self.commit = commit  # commit(player_id, username, fields): the one write per registration
+        self.ttl = ttl
+        self.clock = clock
+        self.drafts = {}      # player id -> RegistrationDraft
+        self.stats = {'started': 0, 'completed': 0, 'abandoned': {field: 0 for field in REGISTRATION_STEPS}}
+        self._sweeper = None
+
+    def start(self, player_id, username, fields=None):
+        old = self.drafts.pop(player_id, None)
+        if old is not None:
+            self._abandon(old)  # Started over before finishing
+        draft = RegistrationDraft(player_id, username, self.clock() + self.ttl)
+        draft.fields.update(fields or {})
+        self.drafts[player_id] = draft
+        self.stats['started'] += 1
+
+    def set(self, player_id, field, value):
+        # Record one answer. Returns False if there is no live draft (it expired or
+        # the wizard was never started), True otherwise; the last answer commits it.
+        draft = self.drafts.get(player_id)
+        if draft is None:
+            return False
+        if draft.expires <= self.clock():
+            self._abandon(self.drafts.pop(player_id))
+            return False
+        draft.fields[field] = value
+        draft.expires = self.clock() + self.ttl
+        if draft.step is None:
+            del self.drafts[player_id]
+            self.commit(draft.player_id, draft.username, draft.fields)
+            self.stats['completed'] += 1
+        return True
+
+    def clear(self):
+        # Drops every draft without saving it, e.g. when a new season starts
+        for draft in self.drafts.values():
+            self.stats['abandoned'][draft.step] += 1
+        self.drafts.clear()
+
+    def expire(self):
+        now = self.clock()
+        for player_id in [player_id for player_id, draft in self.drafts.items() if draft.expires <= now]:
+            self._abandon(self.drafts.pop(player_id))
+
+    def _abandon(self, draft):
+        self.stats['abandoned'][draft.step] += 1
+        self.commit(draft.player_id, draft.username, draft.fields)
+
+    def start_sweeper(self):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self.expire()
@@ -0,0 +1,71 @@
+import asyncio
+import contextlib
+import time
+
+
+## STARTUP
+# The bot connects to the gateway before it loads anything large: ladder data,
+# builds.json and the indexes built from them are loaded in a worker thread once
+# the connection is up, and commands or components that arrive before that wait on
+# the readiness gate. Every phase is timed from process start, so a slow restart
+# shows where the time went.
+
+READY_WAIT = 2.5  # seconds a command waits for data; Discord drops interactions unanswered after 3
+
+
+class StartupTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []  # (name, started at, seconds), both relative to start
+        self.finished = None  # Seconds from start to serving commands, once known
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, started - self.start, time.perf_counter() - started))
+
+    def mark(self, name, since=0.0):
+        # A phase that ran outside our code (e.g. the gateway connection), from `since` until now
+        elapsed = time.perf_counter() - self.start
+        self.phases.append((name, since, elapsed - since))
+        return elapsed
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def finish(self):
+        # The report the first time startup completes, None after that
+        if self.finished is not None:
+            return None
+        self.finished = self.elapsed()
+        return self.report()
+
+    def report(self):
+        lines = [f'Startup took {self.elapsed():.3f}s:']
+        for name, started, seconds in sorted(self.phases, key=lambda phase: phase[1]):
+            lines.append(f'  {name:<24} at {started:7.3f}s  {seconds * 1000:8.1f} ms')
+        return '\n'.join(lines)
+
+
+class ReadinessGate:
+    def __init__(self):
+        self._ready = asyncio.Event()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def open(self):
+        self._ready.set()
+
+    async def wait(self, timeout=READY_WAIT):
+        # True once ready, False if it still isn't after timeout seconds
+        if self._ready.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
@@ -0,0 +1,452 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import contextvars
+import copy
+import os
+import sqlite3
+import threading
+
+from ladderCodecs import CODECS
+from ladderModels import Player, Team
+from ladderPerf import perf
+
+
+# Helper functions to read/write JSON data (see ladderCodecs.py for the formats)
+def load_data(file_path, codec=CODECS['pretty']):
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path, 'rb') as f:
+        return codec.loads(f.read())
+
+def save_data(file_path, data, codec=CODECS['pretty'], lock=None):
+    # Write to a temp file next to the target and rename it over the original, so a
+    # crash mid-write leaves the previous file intact instead of a truncated one
+    tmp_path = f'{file_path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for chunk in codec.iterencode(data, lock):
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+# Collections whose records get IDs from DataStore.next_ids
+SEQUENCED = ('applications', 'invitations')
+
+
+## MUTATIONS
+# Every change to the ladder data goes through one of these. They set absolute
+# values (add a member if missing, set a status, ...) rather than applying deltas,
+# so replaying a journal over a snapshot that already contains some of its entries
+# ends in the same state. Each returns the (collection, key) records it touched.
+
+MUTATIONS = {}
+
+def mutation(name):
+    def decorator(func):
+        MUTATIONS[name] = func
+        return func
+    return decorator
+
+@mutation('register')
+def _register(db, player_id, username, fields=None):
+    # A blank player (see ladderModels.Player for the fields) with the register wizard's answers
+    db['players'][int(player_id)] = Player(player_id, username, fields)
+    return [('players', int(player_id))]
+
+@mutation('set_player_field')
+def _set_player_field(db, player_id, field, value):
+    player = db['players'].get(int(player_id))
+    if player is None:
+        return []
+    player[field] = value
+    return [('players', int(player_id))]
+
+@mutation('create_team')
+def _create_team(db, team_name, captain_id, captain_name, members):
+    db['teams'][team_name] = Team(team_name, captain_id, captain_name, members)
+    return [('teams', team_name)]
+
+@mutation('set_team_plan')
+def _set_team_plan(db, team_name, plan):
+    db['teams'][team_name]['plan'] = plan
+    return [('teams', team_name)]
+
+@mutation('set_team_comp')
+def _set_team_comp(db, team_name, roles):
+    # The whole composition at once, from the comp editor
+    db['team_comps'][team_name] = {'team_id': team_name, 'roles': list(roles)}
+    return [('team_comps', team_name)]
+
+def _advance_sequence(db, name, record_id):
+    # Records the highest ID used in a collection, in the same mutation as the record,
+    # so an ID handed out before a crash is never handed out again after it
+    sequences = db['sequences']
+    if int(record_id) <= sequences.get(name, 0):
+        return []
+    sequences[name] = int(record_id)
+    return [('sequences', name)]
+
+@mutation('invite')
+def _invite(db, invitation_id, team_id, player_id):
+    db['invitations'][invitation_id] = {
+        'id': invitation_id,
+        'team_id': team_id,
+        'player_id': player_id,
+        'status': 'Pending'
+    }
+    return [('invitations', invitation_id)] + _advance_sequence(db, 'invitations', invitation_id)
+
+@mutation('invite_many')
+def _invite_many(db, invitations, ids):
+    # Bulk invitations from the league matchmaker, with IDs from DataStore.next_ids
+    changes = []
+    for invitation_id, invitation in zip(ids, invitations):
+        changes += _invite(db, invitation_id, invitation['team_id'], invitation['player_id'])
+    return changes
+
+def _resolve(db, name, record_id, status):
+    # The record may already have moved to the archive when a journal is replayed
+    record = db[name].get(record_id)
+    if record is not None:
+        record['status'] = status
+
+@mutation('accept_invite')
+def _accept_invite(db, invitation_id, team_name, player_id):
+    _resolve(db, 'invitations', invitation_id, 'Accepted')
+    members = db['teams'][team_name]['members']
+    if int(player_id) not in members:
+        members.append(int(player_id))
+    return [('invitations', invitation_id), ('teams', team_name)]
+
+@mutation('decline_invite')
+def _decline_invite(db, invitation_id):
+    _resolve(db, 'invitations', invitation_id, 'Declined')
+    return [('invitations', invitation_id)]
+
+@mutation('apply')
+def _apply(db, application_id, player_id, team_id):
+    db['applications'][application_id] = {
+        'id': application_id,
+        'player_id': player_id,
+        'team_id': team_id,
+        'status': 'Pending'
+    }
+    return [('applications', application_id)] + _advance_sequence(db, 'applications', application_id)
+
+@mutation('accept_member')
+def _accept_member(db, application_id, team_name, player_id):
+    _resolve(db, 'applications', application_id, 'Accepted')
+    members = db['teams'][team_name]['members']
+    if int(player_id) not in members:
+        members.append(int(player_id))
+    return [('applications', application_id), ('teams', team_name)]
+
+@mutation('decline_member')
+def _decline_member(db, application_id):
+    _resolve(db, 'applications', application_id, 'Declined')
+    return [('applications', application_id)]
+
+@mutation('leave_team')
+def _leave_team(db, team_name, player_id):
+    members = db['teams'][team_name]['members']
+    if int(player_id) in members:
+        members.remove(int(player_id))
+    return [('teams', team_name)]
+
+
+## LOCKS
+# One asyncio lock per entity (a player, a team, ...) instead of one global lock,
+# so interactions only wait on each other when they touch the same records. Locks
+# for several keys are always taken in sorted order so two handlers locking the
+# same pair can't deadlock, and a key's lock is dropped once nobody holds or waits on it.
+
+class KeyedLocks:
+    def __init__(self):
+        self._locks = {}  # key -> [lock, holders + waiters]
+
+    @contextlib.asynccontextmanager
+    async def __call__(self, *keys):
+        held = []
+        try:
+            for key in sorted(set(keys), key=repr):
+                entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+                entry[1] += 1
+                try:
+                    await entry[0].acquire()
+                except BaseException:
+                    self._forget(key)
+                    raise
+                held.append(key)
+            yield
+        finally:
+            for key in reversed(held):
+                self._locks[key][0].release()
+                self._forget(key)
+
+    def _forget(self, key):
+        entry = self._locks[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+## DATA STORE
+# Keeps every collection resident in memory. Handlers read the dicts returned by
+# load() and change them only through apply(), which hands the mutation to the
+# storage backend (see ladderBackends.py) and applies it in memory. Backends persist
+# cheaply per mutation and do any expensive work from a background flusher, so
+# commands never wait on rewriting whole files.
+# Handlers that check something and then change it across an await hold
+# store.locked(('team', name), ('player', id), ...) around the check and the apply().
+# Applications and invitations are split by status: only Pending ones stay resident
+# (and indexed by player and team), resolved ones are handed to the backend's
+# archive as soon as a mutation resolves them.
+# The periodic flush takes what it needs on the loop and encodes and writes the
+# files in a single flush thread; apply() holds the mutation lock while it changes
+# records, and the flush thread takes it for one chunk of records at a time.
+
+FLUSH_INTERVAL = 30  # seconds between background flushes
+SNAPSHOT_CHUNK = 64  # records copied per hold of the mutation lock
+
+class DataStore:
+    def __init__(self, files, backend, flush_interval=FLUSH_INTERVAL):
+        self.files = dict(files)  # collection name -> data file path
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._names = {file_path: name for name, file_path in self.files.items()}
+        self._db = {}
+        self._flusher = None
+        self._flush_thread = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='ladder-flush')
+        self._flushing = None        # Future of the background write in progress, if any
+        self._flush_lock = asyncio.Lock()  # One flush_in_background() at a time
+        self._mutating = threading.Lock()
+        self.locked = KeyedLocks()
+        self._player_teams = {}      # player id -> {team name: None}, in join order
+        self._indexed_members = {}   # team name -> member ids currently in _player_teams
+        self._listeners = []
+        self._versions = {name: 0 for name in self.files}  # bumped on every change, for caches
+        self._issued = {}            # collection -> highest ID handed out by next_ids
+        self._pending = {name: {} for name in SEQUENCED}          # (player id, team id) -> record id
+        self._pending_by_team = {name: {} for name in SEQUENCED}  # team id -> {record id: None}
+        self._indexed_requests = {name: {} for name in SEQUENCED} # record id -> (player id, team id)
+
+    def load_all(self):
+        self._db = self.backend.load()
+        for name in self.files:
+            self._db.setdefault(name, {})
+            self._versions[name] += 1
+
+        # Data from before there were sequences: start after the highest ID in use
+        sequences = self._db['sequences']
+        for name in SEQUENCED:
+            if name in self._db:
+                sequences[name] = max([sequences.get(name, 0)] + [int(key) for key in self._db[name] if str(key).isdigit()])
+
+        # Resolved records left in the hot collections (data from before the split,
+        # or journal entries just replayed) go to the archive
+        changes = [(name, key) for name in SEQUENCED for key, record in self._db[name].items() if record['status'] != 'Pending']
+        if changes:
+            self._archive_resolved(changes)
+            self.backend.write(self._db, changes)
+            print(f'Archived {len(changes)} resolved applications and invitations')
+
+        self._player_teams.clear()
+        self._indexed_members.clear()
+        for team_name in self._db['teams']:
+            self._index_team(team_name)
+        for name in SEQUENCED:
+            self._pending[name].clear()
+            self._pending_by_team[name].clear()
+            self._indexed_requests[name].clear()
+            for key in self._db[name]:
+                self._index_request(name, key)
+        for listener in self._listeners:
+            for name, records in self._db.items():
+                listener(name, None, records)
+
+    def reopen(self, backend):
+        # Swaps in a new backend (e.g. a new season's empty files) and reloads from it;
+        # listeners get the new collections like on any load
+        self.backend = backend
+        self._issued.clear()
+        self.load_all()
+
+    # Listeners keep derived indexes current: listener(name, key, record) is called
+    # with the new record (None if deleted) for every record a mutation touches, and
+    # with key None and the whole collection when it is (re)loaded.
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+        for name, records in self._db.items():
+            listener(name, None, records)
+
+    def load(self, file_path):
+        with perf.phase('storage_read'):
+            return self._db[self._names.get(file_path, file_path)]
+
+    def version(self, *file_paths):
+        # Version stamp of the given collections, changes whenever any of them does
+        return tuple(self._versions[self._names.get(file_path, file_path)] for file_path in file_paths)
+
+    def apply(self, op, **args):
+        with perf.phase('storage_write'):
+            self.backend.log(op, args)
+            with self._mutating:
+                changes = MUTATIONS[op](self._db, **args)
+                self._archive_resolved(changes)
+            self.backend.write(self._db, changes)
+        for name, key in changes:
+            self._versions[name] += 1
+            if name == 'teams':
+                self._index_team(key)
+            elif name in SEQUENCED:
+                self._index_request(name, key)
+            for listener in self._listeners:
+                listener(name, key, self._db[name].get(key))
+        return changes
+
+    # ID allocation for applications and invitations. IDs only ever go up: the
+    # highest one used is stored with each record (see _advance_sequence), and IDs
+    # handed out but not yet applied are remembered, so two commands allocating at
+    # the same time never get the same one.
+
+    def next_ids(self, name, count=1):
+        first = max(self._db['sequences'].get(name, 0), self._issued.get(name, 0)) + 1
+        self._issued[name] = first + count - 1
+        return [str(record_id) for record_id in range(first, first + count)]
+
+    def next_id(self, name):
+        return self.next_ids(name)[0]
+
+    def _archive_resolved(self, changes):
+        for name, key in changes:
+            if name in SEQUENCED:
+                record = self._db[name].get(key)
+                if record is not None and record['status'] != 'Pending':
+                    self.backend.archive(name, key, self._db[name].pop(key))
+
+    # Pending application / invitation index, kept up to date like the team index
+
+    def _index_request(self, name, key):
+        indexed = self._indexed_requests[name].pop(key, None)
+        if indexed is not None:
+            if self._pending[name].get(indexed) == key:
+                del self._pending[name][indexed]
+            team_requests = self._pending_by_team[name][indexed[1]]
+            del team_requests[key]
+            if not team_requests:
+                del self._pending_by_team[name][indexed[1]]
+        record = self._db[name].get(key)
+        if record is not None and record['status'] == 'Pending':
+            pair = (int(record['player_id']), record['team_id'])
+            self._pending[name][pair] = key
+            self._pending_by_team[name].setdefault(record['team_id'], {})[key] = None
+            self._indexed_requests[name][key] = pair
+
+    # Player -> team index, kept up to date from each team a mutation touches
+    # (create_team, accept_invite, accept_member, leave_team, ...) by diffing that
+    # team's members against what was indexed for it, so it never rescans all teams.
+
+    def _index_team(self, team_name):
+        team = self._db['teams'].get(team_name)
+        members = set(team['members']) if team else set()
+        indexed = self._indexed_members.get(team_name, set())
+
+        for player_id in indexed - members:
+            player_teams = self._player_teams[player_id]
+            del player_teams[team_name]
+            if not player_teams:
+                del self._player_teams[player_id]
+        for player_id in members - indexed:
+            self._player_teams.setdefault(player_id, {})[team_name] = None
+
+        if members:
+            self._indexed_members[team_name] = members
+        else:
+            self._indexed_members.pop(team_name, None)
+
+    def team_of(self, player_id):
+        player_teams = self._player_teams.get(int(player_id))
+        return next(iter(player_teams)) if player_teams else None
+
+    def teams_of(self, player_id):
+        return list(self._player_teams.get(int(player_id), ()))
+
+    def assigned_players(self):
+        # Set-like view of every player id that is on a team
+        return self._player_teams.keys()
+
+    # Indexed lookups, answered from the resident indexes
+
+    def find_pending(self, name, player_id, team_id):
+        return self._pending[name].get((int(player_id), team_id))
+
+    def pending_for_team(self, name, team_id):
+        return [self._db[name][record_id] for record_id in self._pending_by_team[name].get(team_id, ())]
+
+    def pending_players(self, name):
+        # Set-like view of (player id, team id) pairs with a pending record
+        return self._pending[name].keys()
+
+    def snapshot(self, *names):
+        # Copies of the given collections in their on-disk form, for a worker thread.
+        # Records are copied a chunk at a time under the mutation lock, so each is
+        # copied whole while the loop keeps applying mutations.
+        db = {}
+        for name in names:
+            records = self._db[self._names.get(name, name)]  # Names or file paths, like load()
+            with self._mutating:
+                keys = list(records)
+            copied = db[name] = {}
+            for start in range(0, len(keys), SNAPSHOT_CHUNK):
+                with self._mutating:
+                    for key in keys[start:start + SNAPSHOT_CHUNK]:
+                        record = records.get(key)
+                        if record is not None:
+                            copied[key] = record.to_dict() if isinstance(record, (Player, Team)) else copy.deepcopy(record)
+        return db
+
+    def archived(self, name):
+        # Resolved records from the archive, read back on demand
+        with perf.phase('storage_read'):
+            return self.backend.archived(name)
+
+    def flush(self):
+        # Writes everything on this thread, after any background flush still running
+        if self._flushing is not None:
+            concurrent.futures.wait([self._flushing])
+        with perf.phase('storage_write'):
+            self.backend.flush(self._db)
+
+    async def flush_in_background(self):
+        # The backend snapshots what to write on the loop and the rest runs in the flush thread
+        async with self._flush_lock:
+            await self._flush_in_background()
+
+    async def _flush_in_background(self):
+        with perf.phase('storage_write'):
+            write = self.backend.flush_later(self._db, self._mutating)
+            if write is None:
+                return
+            self._flushing = self._flush_thread.submit(contextvars.copy_context().run, write)
+            await asyncio.wrap_future(self._flushing)
+
+    def start_flusher(self):
+        if self._flusher is None:
+            atexit.register(self.flush)  # Write anything still pending on shutdown
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                async with perf.span('background:flush'):
+                    await self.flush_in_background()
+            except (OSError, sqlite3.Error) as e:
+                print(f'Data flush failed: {e}')
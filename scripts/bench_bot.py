@@ -0,0 +1,330 @@
+# Offline benchmark of the bot's handlers: generates a synthetic league, loads it the
+# way the bot does, and drives the real handlers (list_players, getTeamsList,
+# suggest_autofill, accept_member, the registration selects) through stub
+# ctx / interaction / guild objects. No Discord connection or token needed.
+#
+#   python scripts/bench_bot.py [--players 10000] [--teams 1000] [--iterations 200] [--backend json|sqlite] [--tracemalloc]
+#   python scripts/bench_bot.py --players 100000 --generate-only /tmp/league   # just write the data files
+#
+# Reports throughput, p50/p99 latency per handler and peak memory (RSS for the whole
+# run; with --tracemalloc also the peak Python allocations of each handler, which
+# slows everything down, so latencies from that run aren't comparable).
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERIOUSNESS = ['Noob', 'Casual', 'Serious', 'RaceTo99']
+COMP_SERIOUSNESS = ['Casual', 'Serious', 'Hardcore']
+TIMEZONES = ['EST', 'CST', 'MTN', 'PST', 'CET', 'GMT']
+AVAILABILITY = ['Evenings', 'Weekends', 'Anytime']
+FIRST_ID = 300000000000000000
+
+
+## SYNTHETIC LEAGUE
+
+def generate_league(data_dir, players, teams, team_size=6, seed=1):
+    # Writes the five data files (plus builds.json) for a league of the given size:
+    # most players on a team, the rest applying to or invited by a few teams
+    random.seed(seed)
+    with open(os.path.join(ROOT, 'data', 'ladderReset', 'builds.json')) as f:
+        builds = json.load(f)
+    classes = builds['classes']
+
+    player_data = {}
+    for n in range(players):
+        player_id = FIRST_ID + n
+        class_name = random.choice(list(classes))
+        player_data[str(player_id)] = {
+            'discord_id': str(player_id), 'username': f'player{n}', 'class': class_name,
+            'build': random.choice(classes[class_name]), 'seriousness': random.choice(SERIOUSNESS),
+            'timezone': random.choice(TIMEZONES), 'first_reset': False, 'experience': random.random() < 0.5,
+            'availability': random.choice(AVAILABILITY),
+        }
+
+    ids = [FIRST_ID + n for n in range(players)]
+    random.shuffle(ids)
+    team_data, comp_data = {}, {}
+    for t in range(min(teams, players)):
+        team_name = f'Team{t}'
+        members = ids[t * team_size:(t + 1) * team_size][:random.randint(1, team_size)]
+        if not members:
+            members = [ids[t]]
+        team_data[team_name] = {'team_name': team_name, 'captain_id': members[0], 'captain_name': player_data[str(members[0])]['username'], 'members': members}
+        roles = []
+        for _ in range(random.randint(4, 8)):
+            class_name = random.choice(list(classes))
+            roles.append({'class': class_name, 'build': random.choice(classes[class_name] + ['Any']), 'seriousness': random.choice(COMP_SERIOUSNESS)})
+        comp_data[team_name] = {'team_id': team_name, 'roles': roles}
+
+    assigned = {member_id for team in team_data.values() for member_id in team['members']}
+    free = [player_id for player_id in ids if player_id not in assigned]
+    applications, invitations = {}, {}
+    team_names = list(team_data)
+    for player_id in free:
+        if not team_names:
+            break
+        roll = random.random()
+        if roll < 0.5:
+            record_id = str(len(applications) + 1)
+            applications[record_id] = {'id': record_id, 'player_id': player_id, 'team_id': random.choice(team_names), 'status': 'Pending'}
+        elif roll < 0.7:
+            record_id = str(len(invitations) + 1)
+            invitations[record_id] = {'id': record_id, 'team_id': random.choice(team_names), 'player_id': player_id, 'status': 'Pending'}
+
+    os.makedirs(data_dir, exist_ok=True)
+    files = {'players.json': player_data, 'teams.json': team_data, 'team_compositions.json': comp_data,
+             'applications.json': applications, 'invitations.json': invitations}
+    for file_name, data in files.items():
+        with open(os.path.join(data_dir, file_name), 'w') as f:
+            json.dump(data, f)
+    shutil.copy(os.path.join(ROOT, 'data', 'ladderReset', 'builds.json'), os.path.join(data_dir, 'builds.json'))
+    return {file_name: len(data) for file_name, data in files.items()}
+
+
+## STUB DISCORD OBJECTS
+# Just enough of py-cord's surface for the handlers: everything they send is counted
+# and dropped.
+
+class Sink:
+    def __init__(self):
+        self.messages = 0
+
+    async def send(self, *args, **kwargs):
+        self.messages += 1
+
+
+class FakeMember(Sink):
+    def __init__(self, member_id, name):
+        super().__init__()
+        self.id = member_id
+        self.name = name
+        self.roles = []
+
+
+class FakeGuild:
+    def __init__(self, members):
+        self.id = 1
+        self.chunked = True  # Every member is "cached", like a guild chunked at startup
+        self._members = members
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+
+class FakeResponse:
+    def __init__(self, sink):
+        self._sink = sink
+
+    async def send_message(self, *args, **kwargs):
+        self._sink.messages += 1
+
+    async def edit_message(self, *args, **kwargs):
+        self._sink.messages += 1
+
+    async def send_modal(self, modal):
+        self._sink.messages += 1
+
+    async def defer(self, *args, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    def __init__(self, user, guild, sink, data=None):
+        self.user = user
+        self.guild = guild
+        self.data = data or {}
+        self.response = FakeResponse(sink)
+        self.followup = sink
+        self._sink = sink
+
+    async def edit_original_response(self, *args, **kwargs):
+        self._sink.messages += 1
+
+
+class FakeContext:
+    def __init__(self, user, guild, sink):
+        self.author = self.user = user
+        self.guild = guild
+        self.interaction = FakeInteraction(user, guild, sink)
+        self.followup = sink
+        self._sink = sink
+
+    async def send(self, *args, **kwargs):
+        self._sink.messages += 1
+
+    async def respond(self, *args, **kwargs):
+        self._sink.messages += 1
+
+    async def send_modal(self, modal):
+        self._sink.messages += 1
+
+    async def defer(self, *args, **kwargs):
+        pass
+
+
+## BENCHMARK
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def measure(name, run, iterations, trace):
+    # run(i) is one handler call; returns the result row for the report
+    latencies = []
+    peak = None
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(iterations):
+        start = time.perf_counter()
+        await run(i)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return name, iterations / elapsed, statistics.median(latencies), percentile(latencies, 0.99), peak
+
+
+async def run_benchmarks(lr, args):
+    players = lr.store.load(lr.PLAYERS_FILE)
+    teams = lr.store.load(lr.TEAMS_FILE)
+    members = {player_id: FakeMember(player_id, player['username']) for player_id, player in players.items()}
+    guild = FakeGuild(members)
+    sink = Sink()
+    lr.notifier.start()  # DMs go to the stub members
+
+    def ctx_for(user_id):
+        return FakeContext(members.get(user_id) or FakeMember(user_id, 'captain'), guild, sink)
+
+    team_names = [team_name for team_name in teams if team_name in lr.store.load(lr.TEAM_COMPS_FILE)]
+    pending = [application for team_name in teams for application in lr.store.pending_for_team('applications', team_name)]
+    random.seed(2)
+    random.shuffle(pending)
+    catalog = lr.builds()
+
+    async def finish_jobs():
+        # Handlers that run as jobs return once deferred; a call ends when its job does
+        await asyncio.gather(*(job.task for job in list(lr.jobs.active.values())))
+
+    async def list_players_cold(i):
+        lr.render_cache.clear()
+        await lr.list_players.callback(ctx_for(FIRST_ID), sort_by=lr.PLAYER_SORT_FIELDS[i % len(lr.PLAYER_SORT_FIELDS)])
+        await finish_jobs()
+
+    async def list_players_warm(i):
+        await lr.list_players.callback(ctx_for(FIRST_ID), sort_by='class')
+        await finish_jobs()
+
+    async def teams_list_cold(i):
+        lr.render_cache.clear()
+        lr.getTeamsList(True, i % 2 == 0).page(0)
+
+    async def suggest_autofill(i):
+        team_name = team_names[i % len(team_names)]
+        await lr.suggest_autofill.callback(ctx_for(teams[team_name]['captain_id']), team_name)
+        await finish_jobs()
+
+    async def accept_member(i):
+        application = pending[i]
+        player_id = int(application['player_id'])
+        await lr.accept_member.callback(ctx_for(teams[application['team_id']]['captain_id']), members[player_id], application['team_id'])
+
+    async def register_flow(i):
+        # The four select callbacks of one registration, for a new player
+        user = FakeMember(FIRST_ID * 2 + i, f'newplayer{i}')
+        lr.registrations.start(user.id, user.name)
+        class_name = catalog.class_names[i % len(catalog.class_names)]
+        build = catalog.build_names[catalog.class_builds[catalog.class_id(class_name)][0]]
+        for route, value in (('register_class', class_name), ('register_build', build),
+                             ('register_seriousness', SERIOUSNESS[i % 4]), ('register_timezone', TIMEZONES[i % 6])):
+            await lr.router.routes[route](FakeInteraction(user, guild, sink, {'values': [value]}))
+
+    benchmarks = [
+        ('list_players (cold)', list_players_cold, args.iterations),
+        ('list_players (cached)', list_players_warm, args.iterations),
+        ('getTeamsList (cold)', teams_list_cold, args.iterations),
+        ('suggest_autofill', suggest_autofill, min(args.iterations, len(team_names))),
+        ('accept_member', accept_member, min(args.iterations, len(pending))),
+        ('register selects x4', register_flow, args.iterations),
+    ]
+    rows = []
+    for name, run, iterations in benchmarks:
+        if iterations:
+            rows.append(await measure(name, run, iterations, args.tracemalloc))
+    return rows, sink.messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the ladder bot handlers')
+    parser.add_argument('--players', type=int, default=10000)
+    parser.add_argument('--teams', type=int, default=None, help='defaults to players / 10')
+    parser.add_argument('--team-size', type=int, default=6)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--tracemalloc', action='store_true', help='also report peak Python allocations per handler')
+    parser.add_argument('--generate-only', metavar='DIR', help='write the synthetic data files to DIR and exit')
+    args = parser.parse_args()
+    teams = args.teams if args.teams is not None else max(1, args.players // 10)
+
+    if args.generate_only:
+        counts = generate_league(args.generate_only, args.players, teams, args.team_size)
+        print(', '.join(f'{count} in {file_name}' for file_name, count in counts.items()))
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='ladder-bench-')
+    try:
+        started = time.perf_counter()
+        counts = generate_league(os.path.join(work_dir, 'data', 'ladderReset'), args.players, teams, args.team_size)
+        generated = time.perf_counter() - started
+
+        # The bot keeps its data under ./data/ladderReset; importing it doesn't connect
+        os.chdir(work_dir)
+        os.environ['LADDER_STORAGE'] = args.backend
+        sys.path.insert(0, ROOT)
+        started = time.perf_counter()
+        import ladderReset as lr
+        imported = time.perf_counter() - started
+
+        async def load_and_run():
+            # Loaded in a worker thread and then used from the loop, like start_ladder() does
+            started = time.perf_counter()
+            await asyncio.to_thread(lr.load_ladder_data)
+            loaded = time.perf_counter() - started
+            load_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return loaded, load_rss, await run_benchmarks(lr, args)
+
+        loaded, load_rss, (rows, messages) = asyncio.run(load_and_run())
+        lr.store.flush()
+
+        print(f"{args.players} players, {counts['teams.json']} teams, {counts['applications.json']} applications, "
+              f"{counts['invitations.json']} invitations ({args.backend} backend)")
+        print(f'generate {generated:.2f}s, import {imported:.2f}s, load {loaded:.2f}s, {messages} messages sent')
+        header = f"{'handler':<24} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9}" + (f" {'peak KiB':>9}" if args.tracemalloc else '')
+        print(header)
+        print('-' * len(header))
+        for name, throughput, p50, p99, peak in rows:
+            line = f'{name:<24} {throughput:>9.1f} {p50 * 1000:>9.3f} {p99 * 1000:>9.3f}'
+            if peak is not None:
+                line += f' {peak / 1024:>9.0f}'
+            print(line)
+        print(f'peak RSS: {load_rss / 1024:.0f} MiB after load, {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB at the end')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Event loop lag while the data store flushes: a synthetic league is loaded, a crowd
+# of simulated users keep applying mutations, the store flushes every second, and a
+# probe measures how late the loop wakes it up. Run once per flush mode:
+#
+#   inline   the old flusher: every changed file encoded (indent=4) and written on the loop
+#   pretty / compact / fast   flush_in_background() with that codec (see ladderCodecs.py)
+#
+#   python scripts/bench_loop_lag.py [--players 100000] [--seconds 10] [--users 50] [--think 0.1] [--modes inline,pretty,compact,fast]
+#
+# Afterwards each run reloads the data from disk (files + journal) and checks it
+# matches what is in memory, so a flush racing the mutations can't go unnoticed.
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_bot import SERIOUSNESS, TIMEZONES, generate_league
+from ladderBackends import JsonBackend, data_files
+from ladderCodecs import CODECS, get_codec
+from ladderStore import DataStore
+
+PROBE_INTERVAL = 0.005  # seconds the probe sleeps between wake-ups
+FLUSH_INTERVAL = 1.0
+
+
+def make_store(data_dir, codec):
+    files = data_files(data_dir)
+    store = DataStore(files, JsonBackend(files, os.path.join(data_dir, 'journal.jsonl'), codec=codec))
+    store.load_all()
+    return store
+
+
+async def probe(lags, stop):
+    # How much later than asked each sleep returns: time the loop was busy elsewhere
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def user(store, players, applications, think, latencies, stop):
+    # A user's interactions: a pause of `think` seconds on average, then one mutation
+    while not stop.is_set():
+        pause = random.expovariate(1 / think)
+        start = time.perf_counter()
+        await asyncio.sleep(pause)
+        if applications and random.random() < 0.2:
+            store.apply('decline_member', application_id=applications.pop())
+        else:
+            player_id = random.choice(players)
+            store.apply('set_player_field', player_id=player_id, field=random.choice(['seriousness', 'timezone']),
+                        value=random.choice(SERIOUSNESS + TIMEZONES))
+        latencies.append(time.perf_counter() - start - pause)
+
+
+async def flusher(store, mode, flushes, stop):
+    while not stop.is_set():
+        await asyncio.sleep(FLUSH_INTERVAL)
+        start = time.perf_counter()
+        if mode == 'inline':
+            store.flush()
+        else:
+            await store.flush_in_background()
+        flushes.append(time.perf_counter() - start)
+
+
+async def run(store, mode, seconds, users, think):
+    players = list(store.load('players'))
+    applications = list(store.load('applications'))
+    random.shuffle(applications)
+    lags, latencies, flushes = [], [], []
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(probe(lags, stop)), asyncio.create_task(flusher(store, mode, flushes, stop))]
+    tasks += [asyncio.create_task(user(store, players, applications, think, latencies, stop)) for _ in range(users)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return lags, latencies, flushes
+
+
+def consistent(store, data_dir, codec):
+    # A fresh store loaded from disk (last snapshot + journal) must hold the same data
+    reloaded = make_store(data_dir, codec)
+    try:
+        for name in ('players', 'teams', 'applications', 'invitations'):
+            if b''.join(codec.iterencode(store.load(name))) != b''.join(codec.iterencode(reloaded.load(name))):
+                return False
+        return store.archived('applications').keys() == reloaded.archived('applications').keys()
+    finally:
+        reloaded.backend.close()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Event loop lag while the data store flushes')
+    parser.add_argument('--players', type=int, default=100000)
+    parser.add_argument('--teams', type=int, default=None, help='defaults to players / 10')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=50, help='simulated users applying mutations at once')
+    parser.add_argument('--think', type=float, default=0.1, help="mean seconds between one user's mutations")
+    parser.add_argument('--modes', default='inline,pretty,compact,fast')
+    args = parser.parse_args()
+    teams = args.teams if args.teams is not None else max(1, args.players // 10)
+
+    work_dir = tempfile.mkdtemp(prefix='ladder-lag-')
+    try:
+        source_dir = os.path.join(work_dir, 'league')
+        generate_league(source_dir, args.players, teams)
+        print(f'{args.players} players, {teams} teams, {args.users} users, flush every {FLUSH_INTERVAL:.0f}s for {args.seconds:.0f}s per mode')
+        header = f"{'mode':<8} {'flushes':>7} {'flush ms':>9} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} {'ops/s':>7} {'op p99':>7}  on disk"
+        print(header)
+        print('-' * len(header))
+        for mode in args.modes.split(','):
+            data_dir = os.path.join(work_dir, mode)
+            shutil.copytree(source_dir, data_dir)
+            codec = CODECS['pretty'] if mode == 'inline' else get_codec(mode)
+            store = make_store(data_dir, codec)
+            lags, latencies, flushes = asyncio.run(run(store, mode, args.seconds, args.users, args.think))
+            ok = consistent(store, data_dir, codec)
+            store.flush()
+            store.backend.close()
+            print(f'{mode:<8} {len(flushes):>7} {statistics.mean(flushes) * 1000 if flushes else 0:>9.0f} '
+                  f'{percentile(lags, 0.5) * 1000:>8.1f} {percentile(lags, 0.99) * 1000:>8.1f} {max(lags) * 1000:>8.1f} '
+                  f'{len(latencies) / args.seconds:>7.0f} {percentile(latencies, 0.99) * 1000:>7.1f}  {"consistent" if ok else "MISMATCH"}')
+        print("lag: ms the loop was late waking a 5 ms sleep; op: ms from a user's wake-up falling due to its mutation being applied")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
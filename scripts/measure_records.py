@@ -0,0 +1,70 @@
+# Memory used by the resident player and team records: JSON-loaded dicts (what the
+# store used to keep) against the slotted records from ladderModels.py.
+#
+#   python scripts/measure_records.py [--players 10000] [--teams 1000]
+
+import argparse
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ladderModels import adopt
+
+CLASSES = {
+    'Sorceress': ['Light', 'Fire', 'Cold', 'Tele', 'Static', 'Meteorb', 'Blizzard'],
+    'Paladin': ['Hdin', 'Auradin', 'FOHer', 'Zealot', 'Smiter', 'Templar'],
+    'Barbarian': ['BO', 'WW', 'Frenzy', 'Zerker', 'Conc'],
+    'Necromancer': ['Summon', 'Bone', 'pNova', 'cExpload'],
+}
+SERIOUSNESS = ['Noob', 'Casual', 'Serious', 'RaceTo99']
+TIMEZONES = ['EST', 'CST', 'MTN', 'PST', 'CET', 'GMT']
+
+
+def synthetic_json(players, teams):
+    # The data files as they are on disk
+    random.seed(5)
+    player_data = {}
+    for n in range(players):
+        player_id = 100000000000000000 + n
+        class_name = random.choice(list(CLASSES))
+        player_data[str(player_id)] = {
+            'discord_id': str(player_id), 'username': f'player{n}', 'class': class_name,
+            'build': random.choice(CLASSES[class_name]), 'seriousness': random.choice(SERIOUSNESS),
+            'timezone': random.choice(TIMEZONES), 'first_reset': False, 'experience': random.random() < 0.5,
+            'availability': random.choice(['Evenings', 'Weekends', 'Anytime']),
+        }
+    ids = [int(player_id) for player_id in player_data]
+    team_data = {}
+    for t in range(teams):
+        members = random.sample(ids, 8)
+        team_data[f'Team{t}'] = {'team_name': f'Team{t}', 'captain_id': members[0], 'captain_name': 'captain', 'members': members}
+    return json.dumps(player_data), json.dumps(team_data)
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    value = build()
+    used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+    tracemalloc.stop()
+    return value, used
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=10000)
+    parser.add_argument('--teams', type=int, default=1000)
+    args = parser.parse_args()
+
+    players_json, teams_json = synthetic_json(args.players, args.teams)
+    _, dict_bytes = measure(lambda: {'players': json.loads(players_json), 'teams': json.loads(teams_json)})
+    db, record_bytes = measure(lambda: adopt({'players': json.loads(players_json), 'teams': json.loads(teams_json)}))
+
+    print(f'{args.players} players, {args.teams} teams')
+    print(f'  dicts:   {dict_bytes / 1024:8.0f} KiB  ({dict_bytes / args.players:.0f} bytes per player)')
+    print(f'  records: {record_bytes / 1024:8.0f} KiB  ({record_bytes / args.players:.0f} bytes per player)')
+    print(f'  saved {100 * (1 - record_bytes / dict_bytes):.0f}%')
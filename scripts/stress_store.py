@@ -0,0 +1,148 @@
+# Stress test for the data store locking: fires thousands of simulated interactions
+# at once and checks that no update was lost.
+#
+#   python scripts/stress_store.py [--players 2000] [--teams 50] [--team-size 8] [--backend json|sqlite] [--no-locks]
+#
+# --no-locks runs the same load without the per-entity locks, to show what goes wrong.
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ladderBackends import JsonBackend, SqliteBackend, data_files
+from ladderStore import DataStore
+
+CLASSES = ['Sorceress', 'Paladin', 'Barbarian', 'Amazon', 'Necromancer', 'Druid', 'Assassin']
+SERIOUSNESS = ['Noob', 'Casual', 'Serious', 'RaceTo99']
+TIMEZONES = ['EST', 'CST', 'MTN', 'PST', 'CET', 'GMT']
+
+
+def make_store(data_dir, backend_name):
+    files = data_files(data_dir)
+    if backend_name == 'sqlite':
+        backend = SqliteBackend(os.path.join(data_dir, 'ladder.db'))
+    else:
+        backend = JsonBackend(files, os.path.join(data_dir, 'journal.jsonl'))
+    store = DataStore(files, backend)
+    store.load_all()
+    return store
+
+
+async def interaction_delay():
+    # Stand-in for the Discord API calls a handler awaits between reading and writing
+    await asyncio.sleep(random.random() * 0.002)
+
+
+async def register_wizard(store, locked, player_id, expected):
+    async with locked(('player', player_id)):
+        store.apply('register', player_id=player_id, username=f'player{player_id}')
+    for field, value in [('class', random.choice(CLASSES)), ('build', f'build{player_id % 5}'),
+                         ('seriousness', random.choice(SERIOUSNESS)), ('timezone', random.choice(TIMEZONES))]:
+        await interaction_delay()
+        async with locked(('player', player_id)):
+            players = store.load(store.files['players'])
+            if player_id in players:
+                await interaction_delay()
+                store.apply('set_player_field', player_id=player_id, field=field, value=value)
+                expected[player_id][field] = value
+
+
+async def apply_and_accept(store, locked, player_id, team_name, team_size):
+    async with locked(('player', player_id), ('team', team_name)):
+        application_id = store.next_id('applications')
+        store.apply('apply', application_id=application_id, player_id=player_id, team_id=team_name)
+
+    await interaction_delay()
+
+    # The captain's accept: check there is room, talk to Discord, then add the member
+    async with locked(('player', player_id), ('team', team_name)):
+        members = store.load(store.files['teams'])[team_name]['members']
+        if len(members) >= team_size or player_id in members:
+            await interaction_delay()
+            store.apply('decline_member', application_id=application_id)
+            return
+        await interaction_delay()
+        store.apply('accept_member', application_id=application_id, team_name=team_name, player_id=player_id)
+
+
+async def run(args):
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = make_store(data_dir, args.backend)
+        locked = _nolock if args.no_locks else store.locked
+
+        team_names = [f'Team{t}' for t in range(args.teams)]
+        for team_name in team_names:
+            store.apply('create_team', team_name=team_name, captain_id=0, captain_name='captain', members=[])
+
+        expected = {player_id: {} for player_id in range(1, args.players + 1)}
+        tasks = []
+        for player_id in expected:
+            tasks.append(register_wizard(store, locked, player_id, expected))
+            for team_name in random.sample(team_names, min(3, len(team_names))):
+                tasks.append(apply_and_accept(store, locked, player_id, team_name, args.team_size))
+        random.shuffle(tasks)
+
+        print(f'Running {len(tasks)} concurrent interactions on {args.backend} ({"no locks" if args.no_locks else "per-entity locks"})')
+        await asyncio.gather(*tasks)
+
+        db = {name: store.load(path) for name, path in store.files.items()}
+        db['applications'] = {**store.archived('applications'), **db['applications']}  # Resolved ones are archived
+        errors = check(db, expected, args.team_size)
+        if len(store.locked):
+            errors.append(f'{len(store.locked)} lock entries were never released')
+
+        # Everything must also survive a restart: snapshot + journal replay
+        reloaded = make_store(data_dir, args.backend)
+        for name, path in store.files.items():
+            if reloaded.load(path) != store.load(path):
+                errors.append(f'{name} differs after reload')
+        if reloaded.archived('applications') != store.archived('applications'):
+            errors.append('archived applications differ after reload')
+
+        for error in errors[:20]:
+            print(f'  {error}')
+        print(f'{len(errors)} problems found')
+        return 1 if errors else 0
+
+
+@contextlib.asynccontextmanager
+async def _nolock(*keys):
+    yield
+
+
+def check(db, expected, team_size):
+    errors = []
+    for player_id, fields in expected.items():
+        player = db['players'][player_id]
+        for field, value in fields.items():
+            if player[field] != value:
+                errors.append(f'player {player_id} {field} is {player[field]!r}, expected {value!r}')
+
+    accepted = {}
+    for app in db['applications'].values():
+        if app['status'] == 'Accepted':
+            accepted.setdefault(app['team_id'], set()).add(app['player_id'])
+    for team_name, team in db['teams'].items():
+        if len(team['members']) > team_size:
+            errors.append(f'{team_name} has {len(team["members"])} members, more than {team_size}')
+        if set(team['members']) != accepted.get(team_name, set()):
+            errors.append(f'{team_name} members do not match its accepted applications')
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--teams', type=int, default=50)
+    parser.add_argument('--team-size', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=9)
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--no-locks', action='store_true')
+    sys.exit(asyncio.run(run(parser.parse_args())))